@@ -1,22 +1,49 @@
-﻿import ttkbootstrap as tb
+﻿import marketing_wizard_startup as startup
+import ttkbootstrap as tb
 from ttkbootstrap.constants import *
 from ttkbootstrap.widgets import ToastNotification
 from tkinter import messagebox, scrolledtext, filedialog
-import threading
 import time
-from google import genai
-from google.genai import types
-from PIL import Image, ImageTk, ImageDraw, ImageFont
+import asyncio
+from collections import deque
 import io
 from datetime import datetime
 import json
 import os
+from marketing_wizard_providers import ProviderLoop, AsyncProviders, join_prompt, model_for
+from marketing_wizard_cache import ResponseCache, DEFAULT_TTL_HOURS, DEFAULT_MAX_MB, make_key
+from marketing_wizard_hedge import HedgedRouter
+import marketing_wizard_prompts as wizard_prompts
+import marketing_wizard_structured as wizard_structured
+from marketing_wizard_graph import StepGraph, usable_output
+from marketing_wizard_prefetch import PrefetchTracker, prefetch_target
+from marketing_wizard_render import TextRenderer
+from marketing_wizard_dispatch import UiDispatcher
+from marketing_wizard_scheduler import (
+    RequestScheduler, DEFAULT_MAX_INFLIGHT, PRIORITY_INTERACTIVE, PRIORITY_IMAGE_PROMPT, PRIORITY_BACKGROUND
+)
 
-# Configure Gemini Client - Initially None, will be set after loading config
-client = None
-claude_client = None
 CONFIG_FILE = "config.json"
 
+# Seconds before an in-flight generation is aborted (override via config.json "step_deadlines")
+DEFAULT_STEP_DEADLINES = {
+    "customer": 90,
+    "character": 120,
+    "synopsis": 150,
+    "draft": 240,
+    "final_script": 420,
+    "image": 60
+}
+
+# Step key -> output box it renders into
+STEP_OUTPUT_WIDGETS = {
+    "customer": "txt_out1",
+    "character": "txt_out2",
+    "synopsis": "txt_out3",
+    "draft": "txt_out4",
+    "final_script": "txt_out5"
+}
+
 class MarketingWizardApp:
     def __init__(self, root):
         self.root = root
@@ -34,20 +61,60 @@ class MarketingWizardApp:
             "synopsis": "",
             "draft": "",
             "final_script": "",
-            "persona_style": "Friendly",
+            "persona_style": wizard_prompts.PERSONA_STYLES[0],
             "story_strategy": "Standard",
             "persona_md": "",
             "writing_rules_md": "",
             "api_provider": "google",
-            "claude_api_key": ""
+            "claude_api_key": "",
+            "stream_mode": True,
+            "hedge_mode": False,
+            "speculative_mode": False,
+            "structured_mode": False,
+            "max_inflight": DEFAULT_MAX_INFLIGHT,
+            "cache_enabled": True,
+            "cache_ttl_hours": DEFAULT_TTL_HOURS,
+            "cache_max_mb": DEFAULT_MAX_MB,
+            "step_deadlines": dict(DEFAULT_STEP_DEADLINES)
         }
+
+        # Per-step timings (time-to-first-token / total) of the latest run
+        self.step_metrics = {}
+
+        # Single-flight registry: flight key (step / image box) -> latest run
+        self.inflight = {}
+
+        # Input/output hashes of each step's last completed run (stale tracking)
+        self.graph = StepGraph()
+
+        # Background runs of the next step (opt-in speculative mode)
+        self.prefetch = PrefetchTracker()
+
+        # Output panes are written once per frame (streaming and typewriter)
+        self.renderer = TextRenderer(self.root)
+        # Worker -> Tk updates go through a queue the main loop drains
+        self.dispatcher = UiDispatcher(self.root)
         
-        # API Key management
+        # Async provider layer: one event loop thread shared by every request
+        self.provider_loop = ProviderLoop()
+        self.providers = AsyncProviders()
+
+        # API Key management. Keys are known at once; building the SDK clients
+        # (importing google.genai / anthropic) waits until the window is up.
         self.api_key = self.load_config()
-        self.init_genai_client()
-        self.init_claude_client()
+        self.init_response_cache()
+        self.providers.set_keys(self.api_key, self.data.get("claude_api_key", ""))
+        startup.after_first_paint(self.root, self.init_clients)
+
+        # Central executor: caps in-flight requests and orders them by priority
+        self.scheduler = RequestScheduler(self.data.get("max_inflight", DEFAULT_MAX_INFLIGHT))
+        # Hedging / failover across both providers (opt-in from the settings tab);
+        # the hedge shares run_gemini's scheduler slot
+        self.router = HedgedRouter(self.providers)
         
         self.create_widgets()
+        self.dispatcher.start()
+        self.update_queue_status()
         
     def create_widgets(self):
         # 1. Main Header Area
@@ -61,11 +128,21 @@ class MarketingWizardApp:
         subtitle = tb.Label(header_frame, text="초등학생도 따라하는 '무자동' 블로그/스피치 완성 시스템 (빈칸으로 두면 AI가 알아서 해줍니다)", font=("Segoe UI", 11), bootstyle="secondary")
         subtitle.pack(anchor="w", pady=(5, 0))
 
+        self.lbl_queue_status = tb.Label(header_frame, text="", font=("Segoe UI", 9), bootstyle="secondary")
+        self.lbl_queue_status.pack(anchor="e")
+
+        refresh_row = tb.Frame(header_frame)
+        refresh_row.pack(anchor="e", pady=(5, 0))
+        self.lbl_stale_status = tb.Label(refresh_row, text="", font=("Segoe UI", 9), bootstyle="warning")
+        self.lbl_stale_status.pack(side="left", padx=(0, 10))
+        tb.Button(refresh_row, text="🔄 변경된 단계만 다시 생성", command=self.refresh_stale_steps, bootstyle="warning-outline").pack(side="left")
+
         # 2. Notebook (Tabs)
         self.notebook = tb.Notebook(self.root, bootstyle="primary")
         self.notebook.pack(fill=BOTH, expand=True, padx=20, pady=20)
         
-        # Create Tabs
+        # Create Tabs (content is built when a tab is first shown)
+        self.tab_builders = {}
         self.tab1 = self.create_step_tab(
             "1단계: 꿈의 고객 찾기", 
             "내가 도와줄 '단 한 사람'은 누구일까요?",
@@ -104,9 +181,34 @@ class MarketingWizardApp:
         self.notebook.add(self.tab5, text="Step 5. 최종완성")
         self.notebook.add(self.tab_settings, text="⚙️ 설정")
 
+        self.step_tabs = {
+            "customer": (self.tab1, "Step 1. 꿈의 고객"),
+            "character": (self.tab2, "Step 2. 캐릭터"),
+            "synopsis": (self.tab3, "Step 3. 드라마"),
+            "draft": (self.tab4, "Step 4. 연금술"),
+            "final_script": (self.tab5, "Step 5. 최종완성")
+        }
+
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.build_tab(self.notebook.nametowidget(self.notebook.select()))
+
     def create_step_tab(self, title, subtitle, build_func):
+        # Empty page for now; build_tab fills it on first visit. Until then the
+        # prompt logic reads the step's defaults (collect_inputs/collect_outputs).
         frame = tb.Frame(self.notebook)
-        
+        self.tab_builders[frame] = (title, subtitle, build_func)
+        return frame
+
+    def on_tab_changed(self, event):
+        self.build_tab(self.notebook.nametowidget(self.notebook.select()))
+
+    def build_tab(self, frame):
+        builder = self.tab_builders.pop(frame, None)
+        if builder is None:
+            return
+        title, subtitle, build_func = builder
+        started = time.perf_counter()
+
         canvas = tb.Canvas(frame)
         scrollbar = tb.Scrollbar(frame, orient="vertical", command=canvas.yview)
         scroll_frame = tb.Frame(canvas, padding=20)
@@ -128,8 +230,7 @@ class MarketingWizardApp:
         tb.Label(card, text=subtitle, font=("Segoe UI", 11), bootstyle="secondary").pack(anchor="w", pady=(0, 20))
         
         build_func(card)
-        
-        return frame
+        print(f"DEBUG: Built tab '{title}' in {time.perf_counter() - started:.2f}s")
 
     # --- UI Builders ---
 
@@ -148,8 +249,10 @@ class MarketingWizardApp:
     def create_action_button(self, parent, text, command, style="primary"):
         btn = tb.Button(parent, text=text, command=command, bootstyle=f"{style}-outline", cursor="hand2", padding=15)
         btn.pack(fill=X, pady=20)
+        # Shift+Click: regenerate without reading the response cache
+        btn.bind("<Shift-Button-1>", lambda e: (command(use_cache=False), "break")[1])
         
-    def create_output_area(self, parent, label_text, var_name):
+    def create_output_area(self, parent, label_text, var_name, flight_key=None):
         if label_text:
             tb.Label(parent, text=label_text, font=("Segoe UI", 11, "bold"), bootstyle="secondary").pack(anchor="w", pady=(10, 5))
         
@@ -163,6 +266,8 @@ class MarketingWizardApp:
         
         tb.Button(btn_frame, text="💾 저장하기", command=lambda: self.save_to_file(txt), bootstyle="info-outline").pack(side="right", padx=5)
         tb.Button(btn_frame, text="📋 복사하기", command=lambda: self.copy_to_clip(txt), bootstyle="secondary-link").pack(side="right")
+        if flight_key:
+            tb.Button(btn_frame, text="⏹ 생성 취소", command=lambda: self.cancel_flight(flight_key), bootstyle="danger-link").pack(side="left")
 
     def load_md_file(self, target_widget, data_key, button_widget):
         filename = filedialog.askopenfilename(
@@ -232,11 +337,11 @@ class MarketingWizardApp:
             "entry_pain")
 
         self.create_action_button(left_frame, "🔮 AI 캡틴에게 '꿈의 고객' 찾아달라고 하기", 
-            lambda: self.run_step1(), "primary")
+            lambda use_cache=True: self.run_step1(use_cache), "primary")
         
         output_group = tb.Labelframe(right_frame, text="AI가 분석한 '꿈의 고객 프로필'", padding=15, bootstyle="default")
         output_group.pack(fill=BOTH, expand=True)
-        self.create_output_area(output_group, None, "txt_out1")
+        self.create_output_area(output_group, None, "txt_out1", "customer")
         
         # Image Area for Step 1
         tb.Label(right_frame, text="▼ [Nano Banana] 꿈의 고객 상상도", font=("Segoe UI", 11, "bold"), bootstyle="secondary").pack(anchor="w", pady=(20, 5))
@@ -275,16 +380,16 @@ class MarketingWizardApp:
 
         # Persona Style Selection
         tb.Label(left_frame, text="🎭 어떤 분위기의 캐릭터를 원하시나요?", font=("Segoe UI", 12, "bold"), bootstyle="inverse-dark", padding=5).pack(anchor="w", pady=(10, 0))
-        self.combo_persona = tb.Combobox(left_frame, values=["옵션 A: 친절한 옆집 언니 (부드러운 공감)", "옵션 B: 냉철한 데이터 분석가 (팩트와 숫자)", "옵션 C: 열정적인 동기부여가 (에너지와 확신)"], state="readonly")
+        self.combo_persona = tb.Combobox(left_frame, values=wizard_prompts.PERSONA_STYLES, state="readonly")
         self.combo_persona.current(0)
         self.combo_persona.pack(fill=X, pady=5)
             
         self.create_action_button(left_frame, "🎭 매력적인 캐릭터 조각하기", 
-            lambda: self.run_gemini(self.prompt_step2, self.txt_out2, "character"), "info")
+            lambda use_cache=True: self.run_gemini(self.prompt_step2, self.txt_out2, "character", use_cache), "info")
             
         output_group = tb.Labelframe(right_frame, text="AI가 만든 '캐릭터 프로필'", padding=15, bootstyle="default")
         output_group.pack(fill=BOTH, expand=True)
-        self.create_output_area(output_group, None, "txt_out2")
+        self.create_output_area(output_group, None, "txt_out2", "character")
 
     # --- Step 3: UI ---
     def build_step3_ui(self, parent):
@@ -326,11 +431,11 @@ class MarketingWizardApp:
         tb.Radiobutton(left_frame, text="연속적 솝 오페라 (미끄럼틀 설계: 매회 새로운 문제 발견)", variable=self.story_var, value="Soap", bootstyle="warning").pack(anchor="w", pady=2)
             
         self.create_action_button(left_frame, "🎬 4부작 드라마 기획안 & 포스터 만들기",
-            lambda: self.run_gemini(self.prompt_step3, self.txt_out3, "synopsis"), "warning")
+            lambda use_cache=True: self.run_gemini(self.prompt_step3, self.txt_out3, "synopsis", use_cache), "warning")
             
         output_group = tb.Labelframe(right_frame, text="[드라마 작가] 4부작 시리즈 기획안", padding=15, bootstyle="default")
         output_group.pack(fill=BOTH, expand=True)
-        self.create_output_area(output_group, None, "txt_out3")
+        self.create_output_area(output_group, None, "txt_out3", "synopsis")
 
         # Image Area for Step 3
         tb.Label(right_frame, text="▼ [Nano Banana] 시리즈 공식 포스터 (Netflix Style)", font=("Segoe UI", 11, "bold"), bootstyle="secondary").pack(anchor="w", pady=(20, 5))
@@ -369,11 +474,22 @@ class MarketingWizardApp:
             "entry_detail_inner")
             
         self.create_action_button(left_frame, "🧪 글 짓는 연금술 실행",
-            lambda: self.run_gemini(self.prompt_step4, self.txt_out4, "draft"), "success")
+            lambda use_cache=True: self.run_gemini(self.prompt_step4, self.txt_out4, "draft", use_cache), "success")
+        self.create_action_button(left_frame, "🧪 4화 전체 동시 작성 (3단계 기획표 기준)",
+            lambda use_cache=True: self.run_all_episodes(use_cache), "success")
             
         output_group = tb.Labelframe(right_frame, text="작성된 초안", padding=15, bootstyle="default")
         output_group.pack(fill=BOTH, expand=True)
-        self.create_output_area(output_group, None, "txt_out4")
+        self.create_output_area(output_group, None, "txt_out4", "draft")
+
+        # One pane per episode for the "all episodes" mode
+        tb.Label(right_frame, text="▼ 4화 전체 초안", font=("Segoe UI", 11, "bold"), bootstyle="secondary").pack(anchor="w", pady=(20, 5))
+        self.episode_notebook = tb.Notebook(right_frame, bootstyle="success")
+        self.episode_notebook.pack(fill=BOTH, expand=True)
+        for i in range(1, 5):
+            tab = tb.Frame(self.episode_notebook, padding=10)
+            self.episode_notebook.add(tab, text=f"{i}화")
+            self.create_output_area(tab, None, f"txt_ep{i}", f"draft:{i}")
 
     # --- Step 5: UI ---
     def build_step5_ui(self, parent):
@@ -430,11 +546,11 @@ class MarketingWizardApp:
         self.update_file_button(self.txt_rules_file, "writing_rules_md", self.btn_rules_file)
 
         self.create_action_button(left_frame, "🚀 마케팅 캡틴: 최종 완성본 출력",
-            lambda: self.run_gemini(self.prompt_step5, self.txt_out5, "final_script"), "dark")
+            lambda use_cache=True: self.run_gemini(self.prompt_step5, self.txt_out5, "final_script", use_cache), "dark")
             
         output_group = tb.Labelframe(right_frame, text="[최종] 블로그 글 & 섹션별 이미지", padding=15, bootstyle="default")
         output_group.pack(fill=BOTH, expand=True, pady=(30, 0))
-        self.create_output_area(output_group, None, "txt_out5")
+        self.create_output_area(output_group, None, "txt_out5", "final_script")
         output_group.pack_propagate(False)
         output_group.configure(width=900, height=700)
         self.txt_out5.configure(height=12)
@@ -494,6 +610,30 @@ class MarketingWizardApp:
         tb.Radiobutton(provider_frame, text="Google (Gemini)", variable=self.provider_var, value="google", bootstyle="info").pack(anchor="w", pady=2)
         tb.Radiobutton(provider_frame, text="Claude (claude-sonnet-4.0)", variable=self.provider_var, value="claude", bootstyle="info").pack(anchor="w", pady=2)
 
+        self.stream_var = tb.BooleanVar(value=self.data.get("stream_mode", True))
+        tb.Checkbutton(provider_frame, text="실시간 스트리밍 출력 (생성되는 글자를 바로 표시)", variable=self.stream_var, bootstyle="info-round-toggle").pack(anchor="w", pady=(10, 2))
+
+        self.hedge_var = tb.BooleanVar(value=self.data.get("hedge_mode", False))
+        tb.Checkbutton(provider_frame, text="자동 우회 모드 (응답이 늦거나 오류 시 다른 API로 동시 요청, 두 키 모두 필요)", variable=self.hedge_var, bootstyle="info-round-toggle").pack(anchor="w", pady=(10, 2))
+
+        self.speculative_var = tb.BooleanVar(value=self.data.get("speculative_mode", False))
+        tb.Checkbutton(provider_frame, text="다음 단계 미리 생성 (결과를 읽는 동안 다음 단계를 백그라운드에서 생성, 입력을 바꾸면 폐기 · 토큰 추가 사용)", variable=self.speculative_var, bootstyle="info-round-toggle").pack(anchor="w", pady=(10, 2))
+
+        self.structured_var = tb.BooleanVar(value=self.data.get("structured_mode", False))
+        tb.Checkbutton(provider_frame, text="5단계 구조화 출력 (JSON 필드로 생성해 섹션별로 바로 표시, 이미지 프롬프트 변환 생략)", variable=self.structured_var, bootstyle="info-round-toggle").pack(anchor="w", pady=(10, 2))
+
+        inflight_row = tb.Frame(provider_frame)
+        inflight_row.pack(anchor="w", pady=(10, 2))
+        tb.Label(inflight_row, text="동시 요청 최대 개수", font=("Segoe UI", 10)).pack(side="left")
+        self.max_inflight_var = tb.IntVar(value=self.data.get("max_inflight", DEFAULT_MAX_INFLIGHT))
+        tb.Spinbox(inflight_row, from_=1, to=16, width=5, textvariable=self.max_inflight_var).pack(side="left", padx=(10, 0))
+
+        cache_row = tb.Frame(provider_frame)
+        cache_row.pack(anchor="w", pady=(10, 2))
+        self.cache_var = tb.BooleanVar(value=self.data.get("cache_enabled", True))
+        tb.Checkbutton(cache_row, text="응답 캐시 사용 (같은 입력은 저장된 결과 재사용, Shift+클릭 시 새로 생성)", variable=self.cache_var, bootstyle="info-round-toggle").pack(side="left")
+        tb.Button(cache_row, text="캐시 비우기", command=self.clear_response_cache, bootstyle="secondary-link").pack(side="left", padx=(10, 0))
+
         tb.Label(container, text="Google Gemini API Key", font=("Segoe UI", 11, "bold"), bootstyle="secondary").pack(anchor="w", pady=(10, 5))
         self.entry_google_key = tb.Entry(container, font=("Segoe UI", 12), show="*")
         self.entry_google_key.pack(fill=X, pady=5)
@@ -526,13 +666,32 @@ class MarketingWizardApp:
         self.api_key = google_key
         self.data["claude_api_key"] = claude_key
         self.data["api_provider"] = provider
+        self.data["stream_mode"] = bool(self.stream_var.get())
+        self.data["hedge_mode"] = bool(self.hedge_var.get())
+        self.data["speculative_mode"] = bool(self.speculative_var.get())
+        self.data["structured_mode"] = bool(self.structured_var.get())
+        try:
+            self.data["max_inflight"] = max(1, int(self.max_inflight_var.get()))
+        except Exception:
+            self.data["max_inflight"] = DEFAULT_MAX_INFLIGHT
         self.save_config({
             "api_key": google_key,
             "claude_api_key": claude_key,
-            "api_provider": provider
+            "api_provider": provider,
+            "stream_mode": self.data["stream_mode"],
+            "hedge_mode": self.data["hedge_mode"],
+            "speculative_mode": self.data["speculative_mode"],
+            "structured_mode": self.data["structured_mode"],
+            "max_inflight": self.data["max_inflight"],
+            "cache_enabled": bool(self.cache_var.get()),
+            "cache_ttl_hours": self.data.get("cache_ttl_hours", DEFAULT_TTL_HOURS),
+            "cache_max_mb": self.data.get("cache_max_mb", DEFAULT_MAX_MB),
+            "step_deadlines": self.data.get("step_deadlines", DEFAULT_STEP_DEADLINES)
         })
-        self.init_genai_client()
-        self.init_claude_client()
+        self.data["cache_enabled"] = bool(self.cache_var.get())
+        self.init_response_cache()
+        self.provider_loop.loop.call_soon_threadsafe(self.scheduler.set_limit, self.data["max_inflight"])
+        self.init_clients()
         messagebox.showinfo("설정 완료", "API 키가 성공적으로 저장되었습니다.\n이제 마케팅 캡틴을 사용하실 수 있습니다.")
 
     def load_config(self):
@@ -542,6 +701,15 @@ class MarketingWizardApp:
                     config = json.load(f)
                     self.data["claude_api_key"] = config.get("claude_api_key", "")
                     self.data["api_provider"] = config.get("api_provider", "google")
+                    self.data["stream_mode"] = config.get("stream_mode", True)
+                    self.data["hedge_mode"] = config.get("hedge_mode", False)
+                    self.data["speculative_mode"] = config.get("speculative_mode", False)
+                    self.data["structured_mode"] = config.get("structured_mode", False)
+                    self.data["max_inflight"] = config.get("max_inflight", DEFAULT_MAX_INFLIGHT)
+                    self.data["cache_enabled"] = config.get("cache_enabled", True)
+                    self.data["cache_ttl_hours"] = config.get("cache_ttl_hours", DEFAULT_TTL_HOURS)
+                    self.data["cache_max_mb"] = config.get("cache_max_mb", DEFAULT_MAX_MB)
+                    self.data["step_deadlines"].update(config.get("step_deadlines", {}))
                     return config.get("api_key", "")
             except:
                  pass
@@ -554,171 +722,444 @@ class MarketingWizardApp:
             else:
                 json.dump({"api_key": payload}, f, indent=4)
 
-    def init_genai_client(self):
-        global client
-        if self.api_key:
-            try:
-                client = genai.Client(api_key=self.api_key)
-            except Exception as e:
-                print(f"Client Init Error: {e}")
-                client = None
-        else:
-            client = None
+    def init_clients(self):
+        # Client construction and connection warm-up run on the provider loop,
+        # so neither startup nor save_api_key blocks the Tk thread.
+        self.providers.set_keys(self.api_key, self.data.get("claude_api_key", ""))
+        self.provider_loop.submit(self.providers.connect())
 
-    def init_claude_client(self):
-        global claude_client
-        claude_key = self.data.get("claude_api_key", "")
-        if not claude_key:
-            claude_client = None
+    def init_response_cache(self):
+        if not self.data.get("cache_enabled", True):
+            self.providers.cache = None
+            return
+        if self.providers.cache is not None:
             return
         try:
-            from anthropic import Anthropic
-            claude_client = Anthropic(api_key=claude_key)
+            self.providers.cache = ResponseCache(
+                ttl_hours=self.data.get("cache_ttl_hours", DEFAULT_TTL_HOURS),
+                max_mb=self.data.get("cache_max_mb", DEFAULT_MAX_MB)
+            )
         except Exception as e:
-            print(f"Claude Init Error: {e}")
-            claude_client = None
+            print(f"Cache Init Error: {e}")
+            self.providers.cache = None
+
+    def clear_response_cache(self):
+        if self.providers.cache is not None:
+            self.providers.cache.clear()
+        messagebox.showinfo("캐시", "저장된 응답 캐시를 비웠습니다.")
+
+    def call_in_ui(self, func, *args, coalesce=None):
+        # Bridge from the provider loop thread back onto the Tk mainloop; no
+        # Tcl call happens on the calling thread. A newer post with the same
+        # coalesce key replaces one that has not run yet.
+        self.dispatcher.post(func, *args, coalesce=coalesce)
+
+    # --- Single-flight ---
+    def start_flight(self, flight_key, fingerprint, make_task, deadline=None, on_cancel=None, parent=None):
+        # Identical request already running -> join it; changed request ->
+        # cancel the older run so its stale output is never rendered.
+        current = self.inflight.get(flight_key)
+        if current and not current["future"].done():
+            if current["fingerprint"] == fingerprint:
+                print(f"DEBUG: Joining in-flight run for {flight_key}")
+                return None
+            print(f"DEBUG: Superseding in-flight run for {flight_key}")
+            self.cancel_flight(flight_key, "superseded")
+        token = object()
+        entry = {"fingerprint": fingerprint, "token": token, "future": None, "on_cancel": on_cancel, "children": []}
+        self.inflight[flight_key] = entry
+        if parent in self.inflight:
+            self.inflight[parent]["children"].append(flight_key)
+        entry["future"] = self.provider_loop.submit(make_task(token))
+        if deadline:
+            self.root.after(int(deadline * 1000), self.expire_flight, flight_key, token, deadline)
+        return token
+
+    def cancel_flight(self, flight_key, reason="user"):
+        # Cancelling the asyncio task closes its HTTP stream and releases its
+        # scheduler slot at once; dependent image-prompt work goes with it.
+        entry = self.inflight.pop(flight_key, None)
+        if entry is None:
+            return
+        print(f"DEBUG: Cancelling {flight_key} ({reason})")
+        if entry["future"] is not None:
+            entry["future"].cancel()
+        for child in entry["children"]:
+            self.cancel_flight(child, reason)
+        if entry["on_cancel"] and reason != "superseded":
+            entry["on_cancel"](reason)
+
+    def expire_flight(self, flight_key, token, deadline):
+        if self.is_current(flight_key, token):
+            self.cancel_flight(flight_key, f"deadline {deadline}s")
+
+    def is_current(self, flight_key, token):
+        current = self.inflight.get(flight_key)
+        return current is not None and current["token"] is token
+
+    def run_if_current(self, flight_key, token, func, *args):
+        if self.is_current(flight_key, token):
+            func(*args)
+
+    def finish_flight(self, flight_key, token):
+        if self.is_current(flight_key, token):
+            del self.inflight[flight_key]
+
+    def step_deadline(self, key):
+        # Sub-runs such as "draft:2" share their step's deadline
+        key = key.split(":")[0]
+        return self.data.get("step_deadlines", DEFAULT_STEP_DEADLINES).get(key, DEFAULT_STEP_DEADLINES.get(key))
+
+    def cancel_message(self, reason):
+        if reason.startswith("deadline"):
+            return f"[시간 초과] 제한 시간({reason.split()[-1]}) 안에 완료되지 않아 생성을 중단했습니다."
+        return "[취소됨] 생성을 중단했습니다."
+
+    def update_queue_status(self):
+        stats = self.scheduler.stats()
+        retries = sum(p["retries"] for p in list(self.providers.retry.stats.values()))
+        status = f"진행 {stats['inflight']}/{stats['max_inflight']} · 대기 {stats['queued']} · 평균 대기 {stats['avg_wait']:.1f}s · 재시도 {retries}"
+        if self.data.get("hedge_mode"):
+            status += f" · 우회 {self.router.stats['hedges'] + self.router.stats['failovers']}"
+        if self.data.get("speculative_mode"):
+            status += f" · 미리 생성 적중 {self.prefetch.stats['hits']}/{self.prefetch.stats['started']} ({self.prefetch.hit_rate():.0%})"
+        self.lbl_queue_status.configure(text=status)
+        self.update_stale_status()
+        self.root.after(1000, self.update_queue_status)
+
+    # --- Incremental recompute ---
+    def stale_steps(self):
+        return self.graph.stale_steps(self.step_inputs, self.collect_outputs())
+
+    def update_stale_status(self):
+        stale = self.stale_steps()
+        for key, (tab, title) in self.step_tabs.items():
+            self.notebook.tab(tab, text=f"{title} 🔄" if key in stale else title)
+        if stale:
+            names = ", ".join(self.step_tabs[key][1].split(".")[0] for key in stale)
+            self.lbl_stale_status.configure(text=f"입력이 바뀐 단계: {names}")
+        else:
+            self.lbl_stale_status.configure(text="")
+
+    def refresh_stale_steps(self, use_cache=True, chained=False):
+        # Recompute stale steps one at a time, upstream first. The plan is
+        # re-evaluated after each step, so a step whose new output is unchanged
+        # (e.g. a cache hit) does not drag its downstream steps along.
+        running = [key for key in wizard_prompts.STEP_KEYS if key in self.inflight]
+        if running:
+            if not chained:
+                messagebox.showinfo("다시 생성", "진행 중인 생성이 끝난 뒤 다시 눌러주세요.")
+            return
+        stale = self.stale_steps()
+        if not stale:
+            if not chained:
+                messagebox.showinfo("다시 생성", "모든 단계가 최신 상태입니다.")
+            return
+        key = next(iter(stale))
+        print(f"DEBUG: Refreshing stale step {key} (changed: {', '.join(stale[key])})")
+        self.run_step(key, use_cache, on_done=lambda: self.root.after(0, self.refresh_stale_steps, use_cache, True))
+
+    def run_all_episodes(self, use_cache=True):
+        # Parse the Step 3 table and draft every episode at once; each run is
+        # its own flight and stream, and the shared scheduler caps concurrency.
+        synopsis = self.collect_outputs()["synopsis"]
+        if not synopsis:
+            messagebox.showwarning("3단계 필요", "먼저 3단계에서 4부작 드라마 기획안을 만들어주세요.")
+            return
+        episodes = wizard_prompts.parse_episodes(synopsis)
+        print(f"DEBUG: Drafting {len(episodes)} episodes concurrently")
+        for i, episode in enumerate(episodes, start=1):
+            self.run_gemini(
+                lambda episode=episode: self.prompt_step4(episode),
+                getattr(self, f"txt_ep{i}"),
+                f"draft:{i}",
+                use_cache
+            )
+
+    def run_step(self, key, use_cache=True, on_done=None):
+        # The run writes to the step's widgets, so its tab must exist
+        self.build_tab(self.step_tabs[key][0])
+        if key == "customer":
+            self.run_step1(use_cache, on_done)
+            return
+        prompt_funcs = {
+            "character": self.prompt_step2,
+            "synopsis": self.prompt_step3,
+            "draft": self.prompt_step4,
+            "final_script": self.prompt_step5
+        }
+        self.run_gemini(prompt_funcs[key], getattr(self, STEP_OUTPUT_WIDGETS[key]), key, use_cache, on_done)
+
+    def complete_step(self, key, signature, result, on_done=None):
+        self.data[key] = result
+        if signature is not None:
+            self.graph.record(key, signature, result)
+        if on_done:
+            on_done()
+        elif key in STEP_OUTPUT_WIDGETS and self.data.get("speculative_mode"):
+            self.start_prefetch(key)
+
+    def start_prefetch(self, key):
+        # Generate the next step at background priority while the user reads
+        # this one; run_gemini reuses it only if its request is identical.
+        step = prefetch_target(key, self.collect_inputs())
+        provider = self.data.get("api_provider", "google")
+        if step is None or step in self.inflight or not self.providers.is_ready(provider):
+            return
+        # build_prompt rather than prompt_stepN: those record persona/strategy choices
+        structured = step == "final_script" and self.data.get("structured_mode", False)
+        prompt = wizard_prompts.build_prompt(step, self.step_inputs(step), self.collect_outputs(), structured)
+        schema = wizard_structured.STEP5_SCHEMA if structured else None
+        entry = self.prefetch.add(step, make_key(provider, model_for(provider), join_prompt(prompt), 0.7, 8000, schema))
+        print(f"DEBUG: Prefetching {step} after {key}")
+
+        async def task():
+            cached = await self.providers.cache_lookup(provider, prompt, schema=schema)
+            if cached is not None:
+                return cached
+            usage = {}
+            async with self.scheduler.slot(PRIORITY_BACKGROUND, f"prefetch:{step}"):
+                self.call_in_ui(self.prefetch.mark_running, entry)
+                result = await self.providers.generate(provider, prompt, usage=usage, schema=schema)
+            await self.providers.cache_store(usage.get("provider", provider), prompt, result, schema=schema)
+            self.call_in_ui(self.prefetch.record_tokens, entry, usage)
+            return result
+
+        entry["future"] = self.provider_loop.submit(task())
 
     # --- Logic ---
     
-    def get_input(self, entry_widget, default_msg):
-        val = self.get_widget_text(entry_widget)
-        if not val:
-            return f"(User Skipped: AI MUST invent a creative, specific detail for this based on context. {default_msg})"
-        return val
-
     def get_widget_text(self, widget):
         if isinstance(widget, scrolledtext.ScrolledText):
             return widget.get("1.0", END).strip()
         return widget.get().strip()
 
     # --- Typewriter Animation ---
-    def stream_text(self, widget, text, index=0):
-        # 3000 chars is a safeguard limit to prevent UI freezing on super long texts during animation
-        # But we want to show everything. We can speed up for longer text.
-        
-        if index == 0:
-            widget.delete("1.0", END)
-        
-        if index < len(text):
-            chunk = text[index:index+5] # Detailed speed control: +5 chars per tick
-            widget.insert(END, chunk)
-            widget.see(END)
-            # Dynamic speed: faster for long texts
-            speed = 10 if len(text) < 500 else 2 
-            self.root.after(speed, self.stream_text, widget, text, index+5)
-        else:
-            # Animation Done
-            pass
+    def stream_text(self, widget, text, animate=True):
+        # Typed out over a few frames; long or cached results appear at once
+        self.renderer.show(widget, text, animate)
+
+    # --- Live Streaming ---
+    def append_stream_delta(self, widget, delta, first=False):
+        # Coalesced with the other pending deltas and written on the next frame
+        self.renderer.append(widget, delta, clear=first)
+
+    def replace_widget_text(self, widget, text):
+        self.renderer.show(widget, text, animate=False)
+
+    def record_step_metric(self, key, started, first_token_at, result, usage=None, cached=False, finished=None):
+        finished = finished or time.perf_counter()
+        usage = usage or {}
+        metric = {
+            "ttft": (first_token_at - started) if first_token_at else None,
+            "total": finished - started,
+            "chars": len(result or ""),
+            "cached": cached,
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "cache_read_tokens": usage.get("cache_read_tokens", 0),
+            "cache_creation_tokens": usage.get("cache_creation_tokens", 0),
+            "retries": usage.get("retries", 0),
+        }
+        self.step_metrics[key] = metric
+        ttft = f"{metric['ttft']:.2f}s" if metric["ttft"] is not None else "n/a"
+        print(
+            f"DEBUG: [{key}] TTFT={ttft} total={metric['total']:.2f}s chars={metric['chars']} "
+            f"in={metric['input_tokens']} out={metric['output_tokens']} "
+            f"prompt_cache_read={metric['cache_read_tokens']} prompt_cache_write={metric['cache_creation_tokens']} "
+            f"retries={metric['retries']}"
+        )
 
-    def run_step1(self):
+    def run_step1(self, use_cache=True, on_done=None):
         # Validation
         if not self.get_widget_text(self.entry_product):
             messagebox.showwarning("필수 입력", "Q1. 누구를 도와주고 싶나요? (상품/서비스) 항목은 필수입니다.")
             return
         
         # 1. Text Generation
-        self.run_gemini(self.prompt_step1, self.txt_out1, "customer")
+        self.run_gemini(self.prompt_step1, self.txt_out1, "customer", use_cache, on_done)
         
         # 2. Image Generation (Chained)
         product = self.get_widget_text(self.entry_product)
         pain = self.get_widget_text(self.entry_pain)
-        # Added instruction for English text only
-        img_prompt = f"A photorealistic portrait of a korean person who is worrying about {pain} related to {product}. High quality, emotional, detailed face, cinematic lighting, 8k. (Important: If there is any text in the image, it must be in English only. Do NOT use Korean text.)"
-        self.run_prompt_gen(img_prompt, self.lbl_img_step1)
+        img_prompt = wizard_prompts.portrait_image_prompt(product, pain)
+        self.run_prompt_gen(img_prompt, self.lbl_img_step1, use_cache, parent="customer")
 
-    def run_gemini(self, prompt_func, widget, key):
+    def run_gemini(self, prompt_func, widget, key, use_cache=True, on_done=None):
         provider = self.data.get("api_provider", "google")
-        if provider == "google" and not client:
+        if provider == "google" and not self.providers.is_ready("google"):
             messagebox.showwarning("설정 필요", "먼저 '설정' 탭에서 Google API Key를 입력하고 저장해주세요.")
             self.notebook.select(self.tab_settings)
             return
-        if provider == "claude" and not claude_client:
+        if provider == "claude" and not self.providers.is_ready("claude"):
             messagebox.showwarning("설정 필요", "먼저 '설정' 탭에서 Claude API Key를 입력하고 저장해주세요.")
             self.notebook.select(self.tab_settings)
             return
 
-        # Hook for Step 5 Image Generation
-        if key == "synopsis":
-             # Step 3 Series Poster Logic
-             product = self.get_widget_text(self.entry_product)
-             # Build a descriptive prompt for the poster
-             img_prompt = f"A dramatic Netflix movie poster for a series titled '{product}'. Cinematic lighting, high quality 8k, emotional atmosphere, professional design, text-free. (Important: The image MUST NOT contain any text or letters.)"
-             self.run_prompt_gen(img_prompt, self.lbl_img_step3)
-
-        if key == "final_script":
-             # We will extract prompts from the generated text instead of a single fixed prompt
-             pass
-
+        # Snapshot what this run reads so a later edit marks the step stale
+        signature = self.graph.signature(key, self.step_inputs(key), self.collect_outputs()) if key in STEP_OUTPUT_WIDGETS else None
         prompt = prompt_func()
-        widget.delete("1.0", END)
-        widget.insert("1.0", "⏳ AI 캡틴이 열심히 글을 쓰고 있습니다... (잠시만 기다려주세요)")
-        
-        def task():
+        stream_mode = self.data.get("stream_mode", True)
+        hedge_mode = self.data.get("hedge_mode", False)
+        # Structured mode: Step 5 arrives as JSON fields, rendered to markdown here
+        structured = key == "final_script" and self.data.get("structured_mode", False)
+        schema = wizard_structured.STEP5_SCHEMA if structured else None
+        fingerprint = (make_key(provider, model_for(provider), join_prompt(prompt), 0.7, 8000, schema), use_cache, hedge_mode)
+        # Shift+click (no cache) always generates afresh
+        prefetched = self.prefetch.claim(key, fingerprint[0] if use_cache else None) if key in STEP_OUTPUT_WIDGETS else None
+        if prefetched is not None:
+            print(f"DEBUG: Prefetch hit for {key}; {self.prefetch.summary()}")
+        elif key in STEP_OUTPUT_WIDGETS and self.data.get("speculative_mode"):
+            print(f"DEBUG: No usable prefetch for {key}; {self.prefetch.summary()}")
+
+        async def task(token):
+            def ui(func, *args, coalesce=None):
+                # Only the latest run for this step may touch the widgets
+                self.call_in_ui(self.run_if_current, key, token, func, *args,
+                                coalesce=None if coalesce is None else (key, token, coalesce))
+
+            started = time.perf_counter()
+            first_token_at = None
+            streamed = False
+            usage = {}
+            parser = wizard_structured.StreamParser() if structured else None
+            shown = []  # structured mode: markdown rendered so far
+            # Streamed text waiting for the main loop; every delta that arrived
+            # since the last drain goes to the pane in one append
+            pending_text = deque()
+            painted = []
+
+            def show_pending():
+                parts = []
+                while pending_text:
+                    parts.append(pending_text.popleft())
+                if parts:
+                    self.append_stream_delta(widget, "".join(parts), not painted)
+                    painted.append(True)
+
+            def push_text(text):
+                pending_text.append(text)
+                ui(show_pending, coalesce="stream")
+
             try:
-                if provider == "google":
-                    # NEW SDK usage: client.models.generate_content
-                    print(f"DEBUG: Calling Gemini for {key}...")
-                    response = client.models.generate_content(
-                        model='gemini-2.5-flash',
-                        contents=prompt,
-                        config=types.GenerateContentConfig(
-                            max_output_tokens=8000, # Increased limit to prevent truncation while stopping infinite loops
-                            temperature=0.7
-                        )
-                    )
-                    print(f"DEBUG: Gemini Response received for {key}")
-                    result = response.text
+                cached = None
+                if prefetched is not None:
+                    # Speculative result for exactly this request (may still be finishing)
+                    try:
+                        cached = await asyncio.wrap_future(prefetched["future"])
+                    except Exception as e:
+                        print(f"DEBUG: Prefetch for {key} failed ({e}); generating now")
+                if cached is None and use_cache:
+                    cached = await self.providers.cache_lookup(provider, prompt, schema=schema)
+                if cached is not None:
+                    print(f"DEBUG: Cache hit for {key}")
+                    result = cached
+                    first_token_at = time.perf_counter()
                 else:
-                    print(f"DEBUG: Calling Claude for {key}...")
-                    response = claude_client.messages.create(
-                        model="claude-sonnet-4-20250514",
-                        max_tokens=8000,
-                        temperature=0.7,
-                        messages=[{"role": "user", "content": prompt}]
-                    )
-                    print(f"DEBUG: Claude Response received for {key}")
-                    result = response.content[0].text if response.content else ""
+                    async with self.scheduler.slot(PRIORITY_INTERACTIVE, key):
+                        if stream_mode or hedge_mode:
+                            # Real streaming: append deltas to the widget as they arrive
+                            # (hedging always streams, since it races on the first token)
+                            print(f"DEBUG: Streaming {provider} for {key}{' (hedged)' if hedge_mode else ''}...")
+                            if hedge_mode:
+                                source = self.router.stream(provider, prompt, usage=usage, schema=schema)
+                            else:
+                                source = self.providers.stream(provider, prompt, usage=usage, schema=schema)
+                            parts = []
+                            async for delta in source:
+                                if first_token_at is None:
+                                    first_token_at = time.perf_counter()
+                                    print(f"DEBUG: First token for {key} after {first_token_at - started:.2f}s")
+                                parts.append(delta)
+                                if not stream_mode:
+                                    continue
+                                if parser is None:
+                                    push_text(delta)
+                                    continue
+                                # Show each field/section as soon as its JSON value closes
+                                for event in parser.feed(delta):
+                                    if event[0] == "item" and event[1] == "sections" and isinstance(event[3], dict):
+                                        index, section = event[2], event[3]
+                                        text = wizard_structured.render_section(section, index)
+                                        if index < len(self.step5_img_labels):
+                                            ui(self.run_image_gen, wizard_structured.style_image_prompt(section.get("image_prompt")), self.step5_img_labels[index], coalesce=f"image{index}")
+                                    elif event[0] == "field" and event[1] != "sections":
+                                        text = wizard_structured.render_part(event[1], event[2])
+                                    else:
+                                        continue
+                                    push_text(text)
+                                    shown.append(text)
+                            result = "".join(parts)
+                            streamed = stream_mode and first_token_at is not None
+                        else:
+                            print(f"DEBUG: Calling {provider} for {key}...")
+                            result = await self.providers.generate(provider, prompt, usage=usage, schema=schema)
+                            print(f"DEBUG: {provider} Response received for {key}")
+                            first_token_at = time.perf_counter()
+                    await self.providers.cache_store(usage.get("provider", provider), prompt, result, schema=schema)
+                post = wizard_structured.parse_post(result) if structured else None
+                if post:
+                    missing = wizard_structured.missing_fields(post)
+                    if missing:
+                        print(f"DEBUG: Structured {key} is missing {', '.join(missing)}")
+                    result = wizard_structured.render_markdown(post)
+                    if streamed and result != "".join(shown).strip():
+                        # Fields arrived out of order or the stream was cut short
+                        ui(self.replace_widget_text, widget, result, coalesce="text")
+                elif streamed and structured:
+                    # Not JSON after all; show the raw text
+                    ui(self.replace_widget_text, widget, result, coalesce="text")
                 if not result:
                      print("DEBUG: Result is empty/None")
                      result = "(AI가 반환한 내용이 없습니다. 안전 필터나 기타 이유일 수 있습니다.)"
                 
-                print(f"DEBUG: Streaming result len={len(result)}")
-                self.root.after(0, lambda: self.stream_text(widget, result))
+                self.call_in_ui(self.record_step_metric, key, started, first_token_at, result, usage, cached is not None, time.perf_counter())
+                if streamed:
+                    print(f"DEBUG: Stream complete len={len(result)}")
+                else:
+                    print(f"DEBUG: Streaming result len={len(result)}")
+                    ui(self.stream_text, widget, result, cached is None, coalesce="text")
                 
-                if key == "final_script":
+                if post:
+                    # Section prompts come from the schema, already in English
+                    prompts = wizard_structured.section_image_prompts(post)
+                    for i, lbl in enumerate(self.step5_img_labels):
+                        if not (streamed and i < len(prompts)):
+                            ui(self.run_image_gen, prompts[i] if i < len(prompts) else wizard_prompts.NO_IMAGE_PROMPT, lbl, coalesce=f"image{i}")
+                elif key == "final_script":
                     # Extraction logic for sectional images
-                    import re
-                    # Look for markers like **[Image Prompt for Nano Banana]**: ...
-                    prompts = re.findall(r"\*\*\[Image Prompt for Nano Banana\]\*\*:\s*(.*?)(?:\n|$)", result)
-                    if not prompts:
-                        prompts = re.findall(r"(?:Image Prompt for Nano Banana|Image Prompt)\s*[:\-]\s*(.*?)(?:\n|$)", result, re.IGNORECASE)
-                    if not prompts:
-                        prompts = re.findall(r"\[Image Prompt.*?\]\s*[:\-]?\s*(.*?)(?:\n|$)", result, re.IGNORECASE)
-                    
+                    prompts = wizard_prompts.extract_image_prompts(result)
                     if not prompts:
-                        for lbl in self.step5_img_labels:
-                            self.run_image_gen("(프롬프트 없음 - 출력 형식 확인 필요)", lbl)
+                        for i, lbl in enumerate(self.step5_img_labels):
+                            ui(self.run_image_gen, wizard_prompts.NO_IMAGE_PROMPT, lbl, coalesce=f"image{i}")
                     else:
-                        for i, p in enumerate(prompts):
-                            if i < len(self.step5_img_labels):
-                                # Clean prompt and run
-                                clean_p = p.strip()
-                                if clean_p:
-                                    # Add base styling if not present to ensure quality
-                                    if "Pixar" not in clean_p:
-                                         clean_p += ", 3D Pixar animation style, high quality render"
-                                    
-                                    print(f"DEBUG: Triggering image gen for Step 5 section {i+1}: {clean_p[:50]}...")
-                                    self.run_image_gen(clean_p, self.step5_img_labels[i])
+                        print(f"DEBUG: Rewriting {len(prompts)} Step 5 section prompts in one call")
+                        ui(self.run_prompt_batch_gen, prompts, self.step5_img_labels[:len(prompts)], use_cache, key)
 
                 if key:
-                    self.data[key] = result
+                    ui(self.complete_step, key, signature, result, on_done)
                     
             except Exception as e:
                 error_msg = str(e)
-                self.root.after(0, lambda: widget.insert(END, f"\n\n[Error]: {error_msg}"))
+                ui(self.renderer.append, widget, f"\n\n[Error]: {error_msg}")
+            finally:
+                self.call_in_ui(self.finish_flight, key, token)
         
-        threading.Thread(target=task, daemon=True).start()
+        def on_cancel(reason):
+            # Queued after any text still pending for the pane
+            self.renderer.append(widget, f"\n\n{self.cancel_message(reason)}")
+
+        if self.start_flight(key, fingerprint, task, self.step_deadline(key), on_cancel) is None:
+            return
+        self.renderer.show(widget, "⏳ AI 캡틴이 열심히 글을 쓰고 있습니다... (잠시만 기다려주세요)", animate=False)
+
+        # Hook for the Step 3 poster image (Step 5 prompts come from the generated text)
+        if key == "synopsis":
+             # Step 3 Series Poster Logic
+             product = self.field_text("entry_product")
+             # Build a descriptive prompt for the poster
+             img_prompt = wizard_prompts.poster_image_prompt(product)
+             self.run_prompt_gen(img_prompt, self.lbl_img_step3, use_cache, parent=key)
 
     def run_image_gen(self, prompt, label_widget):
         # 2026-01-22: Image generation disabled; prompt-only output.
@@ -739,10 +1180,49 @@ class MarketingWizardApp:
                 justify="left",
             )
 
-    def run_prompt_gen(self, prompt, label_widget):
-        if not client:
+    def run_prompt_gen(self, prompt, label_widget, use_cache=True, parent=None):
+        if not self.providers.is_ready("google"):
+            return
+
+        rewrite_prompt = wizard_prompts.image_rewrite_prompt(prompt)
+        flight_key = f"image:{label_widget}"
+        fingerprint = (make_key("google", model_for("google"), rewrite_prompt, 0.6, 800), use_cache)
+
+        async def task(token):
+            def ui(func, *args, coalesce=None):
+                self.call_in_ui(self.run_if_current, flight_key, token, func, *args,
+                                coalesce=None if coalesce is None else (flight_key, token, coalesce))
+
+            try:
+                result = None
+                if use_cache:
+                    result = await self.providers.cache_lookup("google", rewrite_prompt, max_tokens=800, temperature=0.6)
+                if result is None:
+                    async with self.scheduler.slot(PRIORITY_IMAGE_PROMPT, "image_prompt"):
+                        result = await self.providers.generate(
+                            "google",
+                            rewrite_prompt,
+                            max_tokens=800,
+                            temperature=0.6
+                        )
+                    await self.providers.cache_store("google", rewrite_prompt, result, max_tokens=800, temperature=0.6)
+                result = (result or "").strip()
+                if not result:
+                    result = "(empty prompt)"
+                ui(self.run_image_gen, result, label_widget, coalesce="label")
+            except Exception as e:
+                ui(self.run_image_gen, f"[Error] {e}", label_widget, coalesce="label")
+            finally:
+                self.call_in_ui(self.finish_flight, flight_key, token)
+
+        def on_cancel(reason):
+            self.run_image_gen(self.cancel_message(reason), label_widget)
+
+        if self.start_flight(flight_key, fingerprint, task, self.step_deadline("image"), on_cancel, parent) is None:
             return
+        self.show_prompt_pending(label_widget)
 
+    def show_prompt_pending(self, label_widget):
         if isinstance(label_widget, scrolledtext.ScrolledText):
             label_widget.configure(state="normal")
             label_widget.delete("1.0", END)
@@ -751,31 +1231,70 @@ class MarketingWizardApp:
         else:
             label_widget.configure(text="프롬프트 생성 중...", image="")
 
-        def task():
+    def run_prompt_batch_gen(self, prompts, label_widgets, use_cache=True, parent=None):
+        # Step 5 sections: one structured (JSON) call rewrites every prompt;
+        # any item the reply does not cover falls back to its own rewrite.
+        targets = [(prompt, label) for prompt, label in zip(prompts, label_widgets) if prompt]
+        if not targets:
+            return
+        if not self.providers.is_ready("google"):
+            for prompt, label in targets:
+                self.run_image_gen(prompt, label)
+            return
+
+        count = len(targets)
+        rewrite_prompt = wizard_prompts.image_rewrite_batch_prompt([prompt for prompt, _ in targets])
+        max_tokens = 800 * count
+        schema = wizard_prompts.image_rewrites_schema(count)
+        flight_key = "image:step5"
+        fingerprint = (make_key("google", model_for("google"), rewrite_prompt, 0.6, max_tokens, schema), use_cache)
+
+        async def task(token):
+            def ui(func, *args, coalesce=None):
+                self.call_in_ui(self.run_if_current, flight_key, token, func, *args,
+                                coalesce=None if coalesce is None else (flight_key, token, coalesce))
+
             try:
-                response = client.models.generate_content(
-                    model='gemini-2.5-flash',
-                    contents=(
-                        "Rewrite the following into a single English-only image prompt. "
-                        "No Korean, no quotes, no markdown, no extra commentary:\n"
-                        f"{prompt}"
-                    ),
-                    config=types.GenerateContentConfig(
-                        max_output_tokens=800,
-                        temperature=0.6
-                    )
-                )
-                result = (response.text or "").strip()
-                if not result:
-                    result = "(empty prompt)"
-                self.root.after(0, lambda: self.run_image_gen(result, label_widget))
-            except Exception as e:
-                err = str(e)
-                self.root.after(0, lambda: self.run_image_gen(f"[Error] {err}", label_widget))
+                try:
+                    result = None
+                    if use_cache:
+                        result = await self.providers.cache_lookup("google", rewrite_prompt, max_tokens=max_tokens, temperature=0.6, schema=schema)
+                    cached = result is not None
+                    if not cached:
+                        async with self.scheduler.slot(PRIORITY_IMAGE_PROMPT, "image_prompt_batch"):
+                            result = await self.providers.generate(
+                                "google",
+                                rewrite_prompt,
+                                max_tokens=max_tokens,
+                                temperature=0.6,
+                                schema=schema
+                            )
+                    rewrites = wizard_prompts.parse_image_rewrites(result, count)
+                    if not cached and None not in rewrites:
+                        await self.providers.cache_store("google", rewrite_prompt, result, max_tokens=max_tokens, temperature=0.6, schema=schema)
+                except Exception as e:
+                    print(f"DEBUG: Batched image-prompt rewrite failed: {e}")
+                    rewrites = [None] * count
+                for (prompt, label), rewrite in zip(targets, rewrites):
+                    if rewrite:
+                        ui(self.run_image_gen, rewrite, label, coalesce=str(label))
+                    else:
+                        print(f"DEBUG: No usable rewrite for {prompt[:50]}...; rewriting it alone")
+                        ui(self.run_prompt_gen, prompt, label, use_cache, parent)
+            finally:
+                self.call_in_ui(self.finish_flight, flight_key, token)
 
-        threading.Thread(target=task, daemon=True).start()
+        def on_cancel(reason):
+            for _, label in targets:
+                self.run_image_gen(self.cancel_message(reason), label)
+
+        if self.start_flight(flight_key, fingerprint, task, self.step_deadline("image"), on_cancel, parent) is None:
+            return
+        for _, label in targets:
+            self.show_prompt_pending(label)
 
     def create_placeholder_image(self, label, text):
+        from PIL import Image, ImageTk, ImageDraw
         img = Image.new('RGB', (400, 300), color=(52, 152, 219))
         d = ImageDraw.Draw(img)
         try:
@@ -829,259 +1348,87 @@ class MarketingWizardApp:
                 messagebox.showerror("오류", f"저장 중 오류가 발생했습니다: {e}")
 
     # --- Prompts ---
+    # Prompt text lives in marketing_wizard_prompts (shared with the headless
+    # pipeline); these wrappers only collect the widget values.
+    def field_text(self, var_name):
+        # Widgets of a tab that was never opened do not exist yet: blank answer
+        widget = getattr(self, var_name, None)
+        return self.get_widget_text(widget) if widget is not None else ""
+
+    def collect_inputs(self):
+        return {
+            "product": self.field_text("entry_product"),
+            "pain": self.field_text("entry_pain"),
+            "role": self.field_text("entry_role"),
+            "flaw": self.field_text("entry_flaw"),
+            "backstory": self.field_text("entry_backstory"),
+            "persona_style": self.combo_persona.get() if hasattr(self, "combo_persona") else wizard_prompts.PERSONA_STYLES[0],
+            "secret": self.field_text("entry_secret"),
+            "wall": self.field_text("entry_wall"),
+            "epiphany": self.field_text("entry_epiphany"),
+            "cta": self.field_text("entry_cta"),
+            "story_strategy": self.story_var.get() if hasattr(self, "story_var") else "Standard",
+            "episode": self.field_text("entry_episode"),
+            "scene": self.field_text("entry_detail_scene"),
+            "inner": self.field_text("entry_detail_inner"),
+            "nickname": self.field_text("entry_nickname"),
+            "facts": self.field_text("entry_facts"),
+            "persona_md": self.data.get("persona_md", ""),
+            "writing_rules_md": self.data.get("writing_rules_md", "")
+        }
+
+    def collect_outputs(self):
+        # Box text (including the user's own edits) unless the box is showing an
+        # in-progress stream or reveal, placeholder, error or cancel notice;
+        # then fall back to the step's last completed result.
+        outputs = {}
+        for key, var_name in STEP_OUTPUT_WIDGETS.items():
+            widget = getattr(self, var_name, None)
+            text = widget.get("1.0", END).strip() if widget is not None else ""
+            if key in self.inflight or (widget is not None and self.renderer.busy(widget)) or not usable_output(text):
+                text = self.data.get(key, "").strip() if usable_output(self.data.get(key, "")) else ""
+            outputs[key] = text
+        return outputs
+
+    def step_inputs(self, key):
+        inputs = self.collect_inputs()
+        if key == "final_script":
+            # Step 5 follows the persona/strategy in effect when Steps 2/3 last ran
+            inputs["persona_style"] = self.data.get("persona_style", wizard_prompts.PERSONA_STYLES[0])
+            inputs["story_strategy"] = self.data.get("story_strategy", "Standard")
+        return inputs
+
     def prompt_step1(self):
-        product = self.get_input(self.entry_product, "판매할 상품을 상상해서 제안해주세요")
-        pain = self.get_input(self.entry_pain, "이 상품을 필요로 하는 사람의 고통을 상상해주세요")
-        return f"""
-        # Goal: Step 1. Define Dream Customer
-        # Input Data:
-        - Product: {product}
-        - Pain: {pain}
-        # Task:
-        1. Identify the most desperate target audience.
-        2. Define their Persona (Age, Job, Situation, Deepest Desire).
-        3. Write in Korean, friendly and clear.
-        
-        **Output strictly in Markdown.**
-        Structure:
-        - **Target Audience**: ...
-        - **Demographics**: ...
-        - **Psychographics (Desire/Pain)**: ...
-        """
+        return wizard_prompts.prompt_step1(self.collect_inputs())
 
     def prompt_step2(self):
-        # Link Logic: Read Step 1 output
-        customer_profile = self.txt_out1.get("1.0", END).strip()
-        
-        role = self.get_input(self.entry_role, "고객에게 신뢰를 줄 수 있는 역할을 추천해주세요")
-        flaw = self.get_input(self.entry_flaw, "인간미가 느껴지는 작은 결점을 만들어주세요")
-        back = self.get_input(self.entry_backstory, "공감을 얻을 수 있는 실패 경험담을 만들어주세요")
-        
-        persona = self.combo_persona.get()
-        self.data["persona_style"] = persona
-        
-        return f"""
-        # Goal: Step 2. Define Attractive Character
-        # Context (Target Audience):
-        {customer_profile}
-        
-        # Identity Style (Strictly Follow This):
-        - Style: {persona}
-        
-        # Input Data:
-        - Role: {role}
-        - Flaw: {flaw}
-        - Backstory: {back}
-        # Task:
-        1. Create a character profile that is the PERFECT GUIDE for the Target Audience above.
-        2. Body tone and voice must perfectly match the chosen Style: '{persona}'.
-        3. Format clearly. Language: Korean.
-        
-        **Output strictly in Markdown.**
-        Structure:
-        - **Name/Title**: ...
-        - **Style/Vibe**: ...
-        - **Role (Identity)**: ...
-        - **Flaw (Vulnerability)**: ...
-        - **Backstory**: ...
-        """
+        inputs = self.collect_inputs()
+        self.data["persona_style"] = inputs["persona_style"]
+        return wizard_prompts.prompt_step2(inputs, self.collect_outputs())
 
     def prompt_step3(self):
-        customer = self.txt_out1.get("1.0", END).strip()
-        character = self.txt_out2.get("1.0", END).strip()
-        
-        secret = self.get_input(self.entry_secret, "사람들이 아직 모르는 특별한 기회나 비밀을 상상해주세요")
-        wall = self.get_input(self.entry_wall, "가장 좌절했던 순간의 구체적인 감정을 묘사해주세요")
-        epiphany = self.get_input(self.entry_epiphany, "모든 상황을 반전시킨 결정적 깨달음을 상상해주세요")
-        cta = self.get_input(self.entry_cta, "삶의 변화와 독자에게 줄 가치 있는 제안을 만들어주세요")
-        
-        strategy = self.story_var.get()
-        self.data["story_strategy"] = strategy
-        
-        strategy_instruction = ""
-        if strategy == "Soap":
-            strategy_instruction = """
-            [Strategy: Sequential Soap Opera (The Slide)]
-            - Each episode must follow Russell Brunson's Slide strategy.
-            - Ep 1 leads to Problem A, solved by epiphany, but discovers New Problem B.
-            - Ep 2 solves Problem B, but discovers New Problem C.
-            - Ep 3 solves Problem C, leading to the grand vision.
-            - Ep 4 presents the Final Offer as the ultimate solution for everything.
-            - High tension and constant 'What's next?' hooks.
-            """
-        else:
-            strategy_instruction = """
-            [Strategy: Standard 4-part Synopsis]
-            - Classic narrative arc: Hook -> Struggle -> Epiphany -> Result.
-            - Focus on a single coherent story divided into 4 parts.
-            """
-
-        return f"""
-        # Role: Series Planning Lead Author (Soap Opera Specialist)
-        # Goal: Plan a 4-part Blog Series using Russell Brunson's Sequence & 2026 Naver SEO logic.
-        
-        # Context Data:
-        - Hero (Character): {character}
-        - Audience (Dream Customer): {customer}
-        
-        # Strategy Choice:
-        {strategy_instruction}
-        
-        # Input Data:
-        1. Secret/Opportunity: {secret}
-        2. The Wall (Failure): {wall}
-        3. The Epiphany (Solution): {epiphany}
-        4. Transformation/CTA: {cta}
-            
-        # [Strategy Guidelines - 2026 Naver SEO]
-        1. **Avoid AI Summary**: Focus on unique human 'Experience' and emotional narrative.
-        2. **Home Feed Strategy**: Use curiosity-driven titles and strong hooks.
-        3. **Maximize Dwell Time**: Use 'Open Loops' at the end of each episode to encourage reading the next one.
-        
-        # [Task]
-        Create a 4-part synopsis based on the '{strategy}' strategy.
-        
-        # [Output Format]
-        Create a **[4-part Series Planning Table]** in Markdown:
-        - [Episode #]
-        - [Naver Home Feed Title] (Keyword + Clickable Copy)
-        - [Core Content] (Experience-focused summary)
-        - [Open Loop] (Ending sentence to hook into next episode)
-        
-        Language: Korean.
-        """
+        inputs = self.collect_inputs()
+        self.data["story_strategy"] = inputs["story_strategy"]
+        return wizard_prompts.prompt_step3(inputs, self.collect_outputs())
 
-        
-    def prompt_step4(self):
-        synopsis = self.txt_out3.get("1.0", END).strip()
-        character = self.txt_out2.get("1.0", END).strip()
-        episode = self.get_input(self.entry_episode, "제1화를 작성해주세요")
-        scene = self.get_input(self.entry_detail_scene, "비참하거나 극적인 현장 분위기를 묘사해주세요")
-        inner = self.get_input(self.entry_detail_inner, "절망적이거나 간절한 속마음을 묘사해주세요")
-        
-        return f"""
-        # Goal: Step 4. Write Content Draft (Story Alchemist)
-        # Target Episode: {episode}
-        # Deep Details:
-        - Scene Sensory: {scene}
-        - Inner Voice: {inner}
-        # Context:
-        - Synopsis: {synopsis}
-        - Character: {character}
-        # Task:
-        # Task:
-        Write a high-immersion blog post draft.
-        **Output strictly in Markdown.**
-        
-        Structure:
-        - **Scene Setting**: (Sensory details)
-        - **Inner Monologue**: (Character's thoughts)
-        - **Dialogue**: (Conversation)
-        - **Action**: (What happens)
-        """
+    def prompt_step4(self, episode=None):
+        inputs = self.collect_inputs()
+        if episode:
+            inputs["episode"] = episode
+        return wizard_prompts.prompt_step4(inputs, self.collect_outputs())
 
     def prompt_step5(self):
-        # 데이터 수집 (Step 1~4 결과물)
-        customer = self.txt_out1.get("1.0", END).strip() 
-        synopsis = self.txt_out3.get("1.0", END).strip() 
-        draft = self.txt_out4.get("1.0", END).strip()
-        
-        # UI 입력값
-        product = self.get_widget_text(self.entry_product) 
-        nickname = self.get_input(self.entry_nickname, "신뢰감 있는 마케팅 전문가 닉네임")
-        facts = self.get_input(self.entry_facts, "관련된 최신 통계나 트렌드를 하나 가상으로 인용해주세요")
-        
-        # Persona & Strategy from data store
-        persona_style = self.data.get("persona_style", "Friendly")
-        story_strategy = self.data.get("story_strategy", "Standard")
-        persona_md = self.data.get("persona_md", "").strip()
-        writing_rules_md = self.data.get("writing_rules_md", "").strip()
-
-        external_blocks = ""
-        external_notice = ""
-        if persona_md or writing_rules_md:
-            external_notice = "\n# External Inputs\n- Follow these external rules strictly if provided; otherwise follow default rules.\n"
-        if persona_md:
-            external_blocks += f"\n# External Persona (from file)\n{persona_md}\n"
-        if writing_rules_md:
-            external_blocks += f"\n# External Writing Rules (from file)\n{writing_rules_md}\n"
-        
-        return f"""
-        # Role: Marketing Captain (Storytelling & Visual Director)
-        # Goal: Write a High-Retention Blog Post with Image Prompts for Each Section
-        {external_notice}
-        {external_blocks}
-        
-        # Identity (Persona):
-        - Name: {nickname}
-        - Selected Style: {persona_style} (STRICTLY match this tone)
-        - Voice: Use the tone of '{persona_style}'.
-        - Rule: NEVER mention you are an AI. Act strictly as the human expert '{nickname}'.
-        
-        # Context Data (Integrate these naturally):
-        - Story Strategy: {story_strategy}
-        - Product/Topic: {product}
-        - Target Customer: {customer} (Address them as 'you')
-        - Key Fact/Trend: {facts} (Use this to validate the problem in 'The Wall' section)
-        - Story Draft: {draft} (Expand this into the full narrative)
-        - Synopsis: {synopsis}
-        
-        # [Writing Guidelines]
-        1. **Mobile First**: Short paragraphs (2-3 sentences max). Use line breaks frequently.
-        2. **Visual Thinking**: For every section, provide a specific image prompt for 'Nano Banana' (AI Artist).
-        3. **SEO**: Mention '{product}' naturally 5+ times.
-        
-        ---
-        # [Output Format - Strictly Follow This Structure]
-        
-        ## 1. Title Options
-        - Provide 3 viral titles. (Mix curiosity & benefit).
-        
-        ## 2. Blog Post Body
-        
-        **[TL;DR Summary]**
-        - Start with "요약:" followed by 2 sentences summarizing the problem and solution.
-        
-        **(Line Break)**
-        
-        **[Intro: The Hook]**
-        - Start with a strong immersive scene or question from the draft.
-        - Empathize with the customer's pain immediately.
-        - **[Image Prompt for Nano Banana]**: Describe a high-quality 3D Pixar-style image depicting the tension or hook scene. (English description)
-        
-        **[Body 1: The Wall (Problem Deep Dive)]**
-        - Describe the failure of the 'Old Way'. Why didn't it work?
-        - Use '{facts}' here to show this is a common problem.
-        - **[Image Prompt for Nano Banana]**: Describe a 3D Pixar-style image showing the frustration or the specific problem situation. (English description)
-        
-        **[Body 2: The Epiphany (The Solution)]**
-        - The turning point. How did you discover the solution?
-        - Focus on the 'Aha!' moment and the new perspective.
-        - **[Image Prompt for Nano Banana]**: Describe a 3D Pixar-style image showing the moment of discovery, the 'magic tool', or the solution in action. (English description)
-        
-        **[Body 3: The Offer (Benefit & Result)]**
-        - How '{product}' solves the problem specifically.
-        - Focus on the user's benefit and the happy result.
-        - **[Image Prompt for Nano Banana]**: Describe a 3D Pixar-style image showing the happy result, success, or the character enjoying the benefit. (English description)
-        
-        **[Conclusion & CTA]**
-        - Summarize the main value.
-        - **Strong Call To Action**: Tell them exactly what to do next (e.g., "Click the link", "Add neighbor").
-        
-        ## 3. Recommended Hashtags (10 Tags)
-        - Extract essential morphemes/keywords from:
-          1. Main Topic ({product})
-          2. Subheadings used above
-          3. Key content words
-        - Format: #Keyword1 #Keyword2 ... (Total 10)
-        
-        ---
-        **Language:** Korean for the blog post. **English** for the Image Prompts.
-        """
+        return wizard_prompts.prompt_step5(
+            self.step_inputs("final_script"), self.collect_outputs(), self.data.get("structured_mode", False)
+        )
 
+startup.mark("imports")
 
 if __name__ == "__main__":
     # Theme: Cosmo (Modern Blue/White)
     root = tb.Window(themename="cosmo") 
+    startup.mark("window")
     app = MarketingWizardApp(root)
+    startup.mark("app")
+    startup.report_after_paint(root)
     root.mainloop()
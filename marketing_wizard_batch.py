@@ -0,0 +1,692 @@
+# Offline bulk generation through the provider batch APIs.
+# For non-urgent campaigns latency does not matter but cost and rate limits
+# do: batch requests are billed at half price and do not count against the
+# per-minute limits of the interactive path. Every pending prompt of one step
+# across all items is packed into Anthropic Message Batches or Gemini batch
+# jobs (one "wave" per step, since each step reads the previous step's
+# output), the jobs are polled with backoff, and results are mapped back to
+# their items by custom id. Completed steps are checkpointed per item and
+# submitted batch ids are kept in the campaign directory, so re-running the
+# same command resumes polling instead of paying for the batch again.
+#
+# The stand-in server speaks the same REST shapes with fake replies, so the
+# exact same code path can be exercised without keys:
+#
+#   python marketing_wizard_batch.py run products.csv --out campaign/ --provider claude
+#   python marketing_wizard_batch.py run products.csv --out demo/ --standin
+#   python marketing_wizard_batch.py standin --port 8766
+#   python marketing_wizard_batch.py run products.csv --out demo/ --base-url http://127.0.0.1:8766
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+import uuid
+
+import marketing_wizard_prompts as wizard_prompts
+from marketing_wizard_cache import ResponseCache, make_key, DEFAULT_TTL_HOURS, DEFAULT_MAX_MB
+from marketing_wizard_campaign import CheckpointStore, load_json, write_json_atomic
+from marketing_wizard_pipeline import (
+    CONFIG_FILE, RecordWriter, load_settings, normalize_item, read_items, read_text_file
+)
+from marketing_wizard_providers import (
+    FakeProviders, GEMINI_MODEL, build_http_client, claude_request, gemini_schema, join_prompt, model_for, split_prompt
+)
+from marketing_wizard_server import HttpError, JobServer, parse_json
+
+ANTHROPIC_BASE_URL = "https://api.anthropic.com"
+GEMINI_BASE_URL = "https://generativelanguage.googleapis.com"
+ANTHROPIC_VERSION = "2023-06-01"
+
+BATCH_STATE_FILE = "batches.json"
+# Per-job limits, kept below the providers' caps (Anthropic 100k requests /
+# 256 MB; Gemini inline requests 20 MB)
+MAX_BATCH_REQUESTS = {"claude": 10000, "google": 1000}
+MAX_BATCH_BYTES = {"claude": 200 * 1024 * 1024, "google": 16 * 1024 * 1024}
+POLL_MIN_SECONDS = 30
+POLL_MAX_SECONDS = 600
+POLL_BACKOFF = 1.5
+MAX_POLL_ERRORS = 5
+
+STEP_MAX_TOKENS, STEP_TEMPERATURE = 8000, 0.7
+IMAGE_MAX_TOKENS, IMAGE_TEMPERATURE = 800, 0.6
+
+GEMINI_FAILED_STATES = ("FAILED", "CANCELLED", "EXPIRED")
+
+
+def gemini_request(prompt, max_tokens=STEP_MAX_TOKENS, temperature=STEP_TEMPERATURE, schema=None):
+    # generateContent REST body (the static prefix becomes the system instruction)
+    prefix, tail = split_prompt(prompt)
+    request = {
+        "contents": [{"role": "user", "parts": [{"text": tail}]}],
+        "generationConfig": {"maxOutputTokens": max_tokens, "temperature": temperature},
+    }
+    if schema is not None:
+        request["generationConfig"]["responseMimeType"] = "application/json"
+        request["generationConfig"]["responseSchema"] = gemini_schema(schema)
+    if prefix:
+        request["systemInstruction"] = {"parts": [{"text": prefix}]}
+    return request
+
+
+def chunk_requests(provider, requests):
+    # Split [(custom_id, body)] into jobs that stay under the per-job limits
+    chunk, size = [], 0
+    for custom_id, body in requests:
+        body_size = len(json.dumps(body, ensure_ascii=False).encode("utf-8"))
+        if chunk and (len(chunk) >= MAX_BATCH_REQUESTS[provider] or size + body_size > MAX_BATCH_BYTES[provider]):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append((custom_id, body))
+        size += body_size
+    if chunk:
+        yield chunk
+
+
+class ClaudeBatchBackend:
+    provider = "claude"
+
+    def __init__(self, http, api_key, base_url=ANTHROPIC_BASE_URL):
+        self.http = http
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"x-api-key": api_key, "anthropic-version": ANTHROPIC_VERSION}
+
+    def body(self, prompt, max_tokens, temperature, schema=None):
+        return claude_request(prompt, max_tokens, temperature, schema)
+
+    async def submit(self, requests):
+        response = await self.http.post(
+            f"{self.base_url}/v1/messages/batches",
+            json={"requests": [{"custom_id": custom_id, "params": body} for custom_id, body in requests]},
+            headers=self.headers
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    async def status(self, batch_id):
+        response = await self.http.get(f"{self.base_url}/v1/messages/batches/{batch_id}", headers=self.headers)
+        response.raise_for_status()
+        data = response.json()
+        counts = data.get("request_counts", {})
+        finished = sum(counts.get(k, 0) for k in ("succeeded", "errored", "canceled", "expired"))
+        return {
+            "done": data.get("processing_status") == "ended",
+            "ok": True,
+            "progress": f"{finished}/{finished + counts.get('processing', 0)}",
+            "results_url": data.get("results_url"),
+        }
+
+    async def results(self, batch_id, status, custom_ids):
+        # {custom_id: (text, usage, error)}
+        url = status.get("results_url") or f"{self.base_url}/v1/messages/batches/{batch_id}/results"
+        response = await self.http.get(url, headers=self.headers)
+        response.raise_for_status()
+        results = {}
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            result = entry.get("result", {})
+            if result.get("type") != "succeeded":
+                error = result.get("error", {})
+                message = error.get("error", {}).get("message") or error.get("message") or result.get("type", "unknown")
+                results[entry["custom_id"]] = ("", {}, f"batch request {message}")
+                continue
+            message = result["message"]
+            content = message.get("content", [])
+            tool_inputs = [block.get("input") for block in content if block.get("type") == "tool_use"]
+            if tool_inputs:
+                # Structured requests answer through the forced tool call
+                text = json.dumps(tool_inputs[0], ensure_ascii=False)
+            else:
+                text = "".join(block.get("text", "") for block in content if block.get("type") == "text")
+            usage = message.get("usage", {})
+            results[entry["custom_id"]] = (text, {
+                "input_tokens": usage.get("input_tokens", 0) or 0,
+                "output_tokens": usage.get("output_tokens", 0) or 0,
+                "cache_read_tokens": usage.get("cache_read_input_tokens", 0) or 0,
+                "cache_creation_tokens": usage.get("cache_creation_input_tokens", 0) or 0,
+            }, None)
+        return results
+
+
+class GeminiBatchBackend:
+    provider = "google"
+
+    def __init__(self, http, api_key, base_url=GEMINI_BASE_URL):
+        self.http = http
+        self.base_url = base_url.rstrip("/")
+        self.headers = {"x-goog-api-key": api_key}
+
+    def body(self, prompt, max_tokens, temperature, schema=None):
+        return gemini_request(prompt, max_tokens, temperature, schema)
+
+    async def submit(self, requests):
+        response = await self.http.post(
+            f"{self.base_url}/v1beta/models/{GEMINI_MODEL}:batchGenerateContent",
+            json={"batch": {
+                "display_name": f"marketing-wizard-{uuid.uuid4().hex[:8]}",
+                "input_config": {"requests": {"requests": [
+                    {"request": body, "metadata": {"key": custom_id}} for custom_id, body in requests
+                ]}},
+            }},
+            headers=self.headers
+        )
+        response.raise_for_status()
+        return response.json()["name"]
+
+    async def status(self, name):
+        response = await self.http.get(f"{self.base_url}/v1beta/{name}", headers=self.headers)
+        response.raise_for_status()
+        data = response.json()
+        state = data.get("metadata", {}).get("state", "")
+        failed = state.endswith(GEMINI_FAILED_STATES) or "error" in data
+        return {
+            "done": bool(data.get("done")) or state.endswith("SUCCEEDED") or failed,
+            "ok": not failed,
+            "progress": state.rsplit("_", 1)[-1].lower() or "pending",
+            "error": data.get("error", {}).get("message") or state,
+            "response": data.get("response", {}),
+        }
+
+    async def results(self, name, status, custom_ids):
+        output = status["response"]
+        if output.get("responsesFile"):
+            response = await self.http.get(
+                f"{self.base_url}/download/v1beta/{output['responsesFile']}:download",
+                params={"alt": "media"},
+                headers=self.headers
+            )
+            response.raise_for_status()
+            entries = [json.loads(line) for line in response.text.splitlines() if line.strip()]
+        else:
+            entries = output.get("inlinedResponses", [])
+            if isinstance(entries, dict):
+                entries = entries.get("inlinedResponses", [])
+        results = {}
+        for index, entry in enumerate(entries):
+            # Responses come back in request order; the metadata key is echoed when present
+            custom_id = entry.get("metadata", {}).get("key") or entry.get("key")
+            if custom_id is None and index < len(custom_ids):
+                custom_id = custom_ids[index]
+            if "error" in entry:
+                results[custom_id] = ("", {}, f"batch request {entry['error'].get('message', 'failed')}")
+                continue
+            response = entry.get("response", {})
+            candidates = response.get("candidates") or [{}]
+            parts = candidates[0].get("content", {}).get("parts", [])
+            usage = response.get("usageMetadata", {})
+            results[custom_id] = ("".join(part.get("text", "") for part in parts), {
+                "input_tokens": usage.get("promptTokenCount", 0) or 0,
+                "output_tokens": usage.get("candidatesTokenCount", 0) or 0,
+                "cache_read_tokens": usage.get("cachedContentTokenCount", 0) or 0,
+                "cache_creation_tokens": 0,
+            }, None)
+        return results
+
+
+class BatchRunner:
+    def __init__(self, backends, provider, out_dir, cache=None, image_prompts=True,
+                 poll_min=POLL_MIN_SECONDS, poll_max=POLL_MAX_SECONDS):
+        self.backends = backends
+        self.provider = provider
+        self.cache = cache
+        self.image_prompts = image_prompts
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self.store = CheckpointStore(out_dir)
+        self.writer = RecordWriter(out_dir)
+        self.state_path = os.path.join(self.store.dir, BATCH_STATE_FILE)
+        self.state = load_json(self.state_path) or {"batches": []}
+        self.records = {}
+        self.stats = {"submitted": 0, "cached": 0, "succeeded": 0, "errored": 0}
+
+    def save_state(self):
+        write_json_atomic(self.state_path, self.state)
+
+    async def run(self, items):
+        started = time.perf_counter()
+        for item in items:
+            if self.store.finished(item["id"]):
+                continue
+            checkpoint = self.store.load(item["id"]) or {}
+            self.records[item["id"]] = (item, {
+                "id": item["id"],
+                "inputs": {k: v for k, v in item["inputs"].items() if k not in ("persona_md", "writing_rules_md")},
+                "outputs": checkpoint.get("outputs", {}),
+                "image_prompts": checkpoint.get("image_prompts", {}),
+                "metrics": checkpoint.get("metrics", {}),
+                "error": None,
+            })
+        skipped = len(items) - len(self.records)
+        print(f"Batch: {len(self.records)} items to process, {skipped} already finished", file=sys.stderr)
+
+        # Batches submitted by an interrupted run are collected before anything new is sent
+        if self.state["batches"]:
+            print(f"Resuming {len(self.state['batches'])} submitted batch(es)", file=sys.stderr)
+            await asyncio.gather(*(self.collect(batch) for batch in list(self.state["batches"])))
+
+        for step in wizard_prompts.STEP_KEYS:
+            targets = []
+            for item, record in self.records.values():
+                if record["error"] or step in record["outputs"]:
+                    continue
+                if step == "customer" and not item["inputs"].get("product", "").strip():
+                    record["error"] = "customer: product is required"
+                    continue
+                prompt = wizard_prompts.build_prompt(step, item["inputs"], record["outputs"])
+                targets.append((item["id"], step, prompt, STEP_MAX_TOKENS, STEP_TEMPERATURE, None))
+            await self.run_wave(step, self.backends[self.provider], targets)
+
+        if self.image_prompts and "google" in self.backends:
+            targets = []
+            for item, record in self.records.values():
+                if record["error"]:
+                    continue
+                for name, raw in self.image_sources(item["inputs"], record["outputs"]).items():
+                    if name not in record["image_prompts"]:
+                        prompt = wizard_prompts.image_rewrite_prompt(raw)
+                        targets.append((item["id"], f"image:{name}", prompt, IMAGE_MAX_TOKENS, IMAGE_TEMPERATURE, None))
+                # Step 5 section prompts are rewritten together in one structured request
+                sections = [raw for raw in self.section_sources(record) if raw.strip()]
+                if sections and "final_script" not in record["image_prompts"]:
+                    targets.append((
+                        item["id"], "image:final_script", wizard_prompts.image_rewrite_batch_prompt(sections),
+                        IMAGE_MAX_TOKENS * len(sections), IMAGE_TEMPERATURE, wizard_prompts.image_rewrites_schema(len(sections))
+                    ))
+            await self.run_wave("image", self.backends["google"], targets)
+
+            # Sections the batched reply did not cover are rewritten one by one
+            targets = []
+            for item, record in self.records.values():
+                rewrites = record["image_prompts"].get("final_script") or []
+                sections = self.section_sources(record)
+                for i, rewrite in enumerate(rewrites):
+                    if rewrite is None:
+                        prompt = wizard_prompts.image_rewrite_prompt(sections[i])
+                        targets.append((item["id"], f"image:final_script:{i}", prompt, IMAGE_MAX_TOKENS, IMAGE_TEMPERATURE, None))
+            await self.run_wave("image-fallback", self.backends["google"], targets)
+
+        failed = 0
+        for item, record in self.records.values():
+            if "final_script" in record["outputs"]:
+                # Without a Gemini key the extracted prompts are kept as they are
+                rewrites = record["image_prompts"].get("final_script")
+                if rewrites is None:
+                    rewrites = self.section_sources(record)
+                record["image_prompts"]["final_script"] = [rewrite or "" for rewrite in rewrites]
+            record["seconds"] = round(time.perf_counter() - started, 3)
+            if record["error"]:
+                failed += 1
+                self.store.save(record)
+                print(f"FAILED {record['id']}: {record['error']}", file=sys.stderr)
+            else:
+                self.writer.write(record)
+                self.store.clear(record["id"])
+        s = self.stats
+        print(
+            f"Batch done: {len(self.records) - failed} ok, {failed} failed · {s['submitted']} requests batched "
+            f"({s['succeeded']} succeeded, {s['errored']} errored), {s['cached']} from cache",
+            file=sys.stderr
+        )
+        return failed
+
+    def image_sources(self, inputs, outputs):
+        sources = {}
+        if "customer" in outputs:
+            sources["customer"] = wizard_prompts.portrait_image_prompt(inputs.get("product", ""), inputs.get("pain", ""))
+        if "synopsis" in outputs:
+            sources["synopsis"] = wizard_prompts.poster_image_prompt(inputs.get("product", ""))
+        return sources
+
+    def section_sources(self, record):
+        if "final_script" not in record["outputs"]:
+            return []
+        return wizard_prompts.extract_image_prompts(record["outputs"]["final_script"])
+
+    def section_rewrites(self, record, text, error):
+        # Same mapping as Pipeline.run_image_prompts: blank sections stay
+        # empty, None marks a section left for the one-by-one fallback
+        sections = self.section_sources(record)
+        targets = [i for i, raw in enumerate(sections) if raw.strip()]
+        parsed = [None] * len(targets) if error else wizard_prompts.parse_image_rewrites(text, len(targets))
+        rewrites = ["" for _ in sections]
+        for i, rewrite in zip(targets, parsed):
+            rewrites[i] = rewrite
+        return rewrites
+
+    def cache_key(self, provider, prompt, max_tokens, temperature, schema=None):
+        return make_key(provider, model_for(provider), join_prompt(prompt), temperature, max_tokens, schema)
+
+    async def run_wave(self, name, backend, targets):
+        # targets: [(item_id, step, prompt, max_tokens, temperature, schema)]
+        requests = []
+        for n, (item_id, step, prompt, max_tokens, temperature, schema) in enumerate(targets):
+            key = self.cache_key(backend.provider, prompt, max_tokens, temperature, schema)
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is not None:
+                self.stats["cached"] += 1
+                self.apply(item_id, step, cached, {"cached": True}, None)
+                continue
+            # Custom ids must match [a-zA-Z0-9_-]{1,64}; the state file maps them back
+            custom_id = f"{re.sub(r'[^a-zA-Z0-9_-]', '-', step)}-{n:06d}"
+            requests.append((custom_id, item_id, step, key, backend.body(prompt, max_tokens, temperature, schema)))
+        if not requests:
+            return
+        batches = []
+        targets_by_id = {custom_id: [item_id, step] for custom_id, item_id, step, _, _ in requests}
+        keys_by_id = {custom_id: key for custom_id, _, _, key, _ in requests}
+        for chunk in chunk_requests(backend.provider, [(custom_id, body) for custom_id, _, _, _, body in requests]):
+            batch_id = await backend.submit(chunk)
+            batch = {
+                "id": batch_id,
+                "provider": backend.provider,
+                "wave": name,
+                "targets": {custom_id: targets_by_id[custom_id] for custom_id, _ in chunk},
+                # Cache keys travel with the batch so a resumed run can still cache the results
+                "cache_keys": {custom_id: keys_by_id[custom_id] for custom_id, _ in chunk},
+                "submitted": time.time(),
+            }
+            # Saved right away: a crash after submit must not lose a paid batch
+            self.state["batches"].append(batch)
+            self.save_state()
+            self.stats["submitted"] += len(chunk)
+            batches.append(batch)
+            print(f"Submitted {name} batch {batch_id} ({len(chunk)} requests, {backend.provider})", file=sys.stderr)
+        await asyncio.gather(*(self.collect(batch) for batch in batches))
+
+    async def wait(self, backend, batch):
+        delay = self.poll_min
+        errors = 0
+        while True:
+            try:
+                status = await backend.status(batch["id"])
+                errors = 0
+            except Exception as e:
+                # Polls are cheap to repeat; only give up after repeated failures
+                errors += 1
+                if errors >= MAX_POLL_ERRORS:
+                    raise
+                print(f"DEBUG: Poll of {batch['id']} failed ({e}); retrying", file=sys.stderr)
+                status = None
+            if status is not None:
+                if status["done"]:
+                    return status
+                print(f"{batch['wave']} batch {batch['id']}: {status['progress']}", file=sys.stderr)
+            await asyncio.sleep(delay)
+            delay = min(self.poll_max, delay * POLL_BACKOFF)
+
+    async def collect(self, batch):
+        backend = self.backends.get(batch["provider"])
+        if backend is None:
+            print(f"Batch {batch['id']} needs a {batch['provider']} key; leaving it for a later run", file=sys.stderr)
+            return
+        status = await self.wait(backend, batch)
+        custom_ids = list(batch["targets"])
+        if status["ok"]:
+            results = await backend.results(batch["id"], status, custom_ids)
+        else:
+            results = {}
+        for custom_id, (item_id, step) in batch["targets"].items():
+            text, usage, error = results.get(custom_id, ("", {}, f"batch {batch['id']} {status.get('error') or 'returned no result'}"))
+            if error:
+                self.stats["errored"] += 1
+            else:
+                self.stats["succeeded"] += 1
+                usage["batch"] = batch["id"]
+            usable = self.apply(item_id, step, text, usage, error)
+            key = batch.get("cache_keys", {}).get(custom_id)
+            if usable and key and self.cache is not None and text:
+                self.cache.put(key, batch["provider"], model_for(batch["provider"]), text)
+        self.state["batches"] = [b for b in self.state["batches"] if b["id"] != batch["id"]]
+        self.save_state()
+
+    def apply(self, item_id, step, text, usage, error):
+        # Returns whether the result is complete enough to cache
+        usable = not error
+        if item_id not in self.records:
+            return usable
+        record = self.records[item_id][1]
+        if step == "image:final_script":
+            rewrites = self.section_rewrites(record, text, error)
+            record["image_prompts"]["final_script"] = rewrites
+            record["metrics"][step] = usage
+            usable = usable and None not in rewrites
+        elif step.startswith("image:final_script:"):
+            index = int(step.rsplit(":", 1)[1])
+            record["image_prompts"]["final_script"][index] = "" if error else text.strip()
+        elif step.startswith("image:"):
+            # A failed image-prompt rewrite leaves the prompt empty, as in the pipeline
+            record["image_prompts"][step.split(":", 1)[1]] = "" if error else text.strip()
+            record["metrics"][step] = usage
+        elif error:
+            record["error"] = f"{step}: {error}"
+        else:
+            record["outputs"][step] = text
+            record["metrics"][step] = usage
+        self.store.save(record)
+        return usable
+
+
+# --- Local stand-in batch server ---
+class StandinBatchServer(JobServer):
+    # Minimal Message Batches + Gemini batch endpoints with fake replies.
+    # Batches end `delay` seconds after submission.
+    max_body = 512 * 1024 * 1024
+
+    def __init__(self, delay=2.0):
+        self.cors_origin = None
+        self.delay = delay
+        self.fake = FakeProviders()
+        self.batches = {}
+        self.routes = [
+            ("POST", re.compile(r"/v1/messages/batches"), self.post_claude_batch),
+            ("GET", re.compile(r"/v1/messages/batches/([\w-]+)"), self.get_claude_batch),
+            ("GET", re.compile(r"/v1/messages/batches/([\w-]+)/results"), self.get_claude_results),
+            ("POST", re.compile(r"/v1beta/models/([\w.-]+):batchGenerateContent"), self.post_gemini_batch),
+            ("GET", re.compile(r"/v1beta/batches/([\w-]+)"), self.get_gemini_batch),
+        ]
+
+    def create(self, provider, requests):
+        batch_id = f"{'msgbatch' if provider == 'claude' else 'batch'}_{uuid.uuid4().hex[:16]}"
+        self.batches[batch_id] = {"provider": provider, "requests": requests, "created": time.time()}
+        print(f"DEBUG: Stand-in {provider} batch {batch_id} with {len(requests)} requests", file=sys.stderr)
+        return batch_id
+
+    def lookup(self, batch_id, provider):
+        batch = self.batches.get(batch_id)
+        if batch is None or batch["provider"] != provider:
+            raise HttpError(404, f"no batch {batch_id}")
+        return batch, time.time() - batch["created"] >= self.delay
+
+    def fake_result(self, provider, prompt, schema=None):
+        text = self.fake.reply(provider, prompt) if schema is None else self.fake.reply_json(provider, prompt, schema)
+        usage = {}
+        self.fake._fake_usage(prompt, text, usage)
+        return text, usage
+
+    def claude_batch(self, batch_id, request):
+        batch, ended = self.lookup(batch_id, "claude")
+        total = len(batch["requests"])
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {"processing": 0 if ended else total, "succeeded": total if ended else 0,
+                               "errored": 0, "canceled": 0, "expired": 0},
+            "results_url": f"http://{request['headers'].get('host', '')}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    async def post_claude_batch(self, request):
+        body = parse_json(request["body"])
+        return 200, self.claude_batch(self.create("claude", body.get("requests", [])), request)
+
+    async def get_claude_batch(self, request, batch_id):
+        return 200, self.claude_batch(batch_id, request)
+
+    async def get_claude_results(self, request, batch_id):
+        batch, ended = self.lookup(batch_id, "claude")
+        if not ended:
+            raise HttpError(409, f"batch {batch_id} is still processing")
+        lines = []
+        for entry in batch["requests"]:
+            params = entry["params"]
+            system = "".join(block["text"] for block in params.get("system", []))
+            tools = params.get("tools") or [{}]
+            schema = tools[0].get("input_schema")
+            text, usage = self.fake_result("claude", (system, params["messages"][0]["content"]), schema)
+            if schema is None:
+                content = [{"type": "text", "text": text}]
+            else:
+                content = [{"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:16]}",
+                            "name": tools[0]["name"], "input": json.loads(text)}]
+            lines.append(json.dumps({"custom_id": entry["custom_id"], "result": {"type": "succeeded", "message": {
+                "type": "message", "role": "assistant", "model": params.get("model"),
+                "content": content,
+                "usage": {"input_tokens": usage["input_tokens"], "output_tokens": usage["output_tokens"]},
+            }}}, ensure_ascii=False))
+        body = ("\n".join(lines) + "\n").encode("utf-8")
+        writer = request["writer"]
+        writer.write((
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: application/binary\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("latin-1") + body)
+        await writer.drain()
+        return None
+
+    async def post_gemini_batch(self, request, model):
+        body = parse_json(request["body"]).get("batch", {})
+        requests = body.get("input_config", {}).get("requests", {}).get("requests", [])
+        batch_id = self.create("google", requests)
+        return 200, {"name": f"batches/{batch_id}", "metadata": {"model": f"models/{model}", "state": "BATCH_STATE_PENDING"}}
+
+    async def get_gemini_batch(self, request, batch_id):
+        batch, ended = self.lookup(batch_id, "google")
+        operation = {"name": f"batches/{batch_id}", "metadata": {"state": "BATCH_STATE_RUNNING"}, "done": False}
+        if not ended:
+            return 200, operation
+        responses = []
+        for entry in batch["requests"]:
+            body = entry["request"]
+            system = "".join(part["text"] for part in body.get("systemInstruction", {}).get("parts", []))
+            tail = "".join(part["text"] for part in body["contents"][0]["parts"])
+            schema = body.get("generationConfig", {}).get("responseSchema")
+            text, usage = self.fake_result("google", (system, tail), schema)
+            responses.append({"metadata": entry.get("metadata", {}), "response": {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+                "usageMetadata": {"promptTokenCount": usage["input_tokens"], "candidatesTokenCount": usage["output_tokens"]},
+            }})
+        operation.update({
+            "metadata": {"state": "BATCH_STATE_SUCCEEDED"},
+            "done": True,
+            "response": {"inlinedResponses": {"inlinedResponses": responses}},
+        })
+        return 200, operation
+
+
+async def start_standin(host="127.0.0.1", port=0, delay=2.0):
+    # Returns (server, base_url); port 0 picks a free port
+    server = await asyncio.start_server(StandinBatchServer(delay).handle, host, port)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://{host}:{port}"
+
+
+async def run_batch(args):
+    settings = load_settings(args.config)
+    provider = args.provider or settings.get("api_provider", "google")
+    standin = None
+    base_url = args.base_url
+    if args.standin:
+        standin, base_url = await start_standin(delay=args.standin_delay)
+        print(f"Using the local stand-in batch server at {base_url}", file=sys.stderr)
+    keys = {"google": settings.get("api_key", ""), "claude": settings.get("claude_api_key", "")}
+    if base_url:
+        # The stand-in accepts any key
+        keys = {name: key or "standin" for name, key in keys.items()}
+    if not keys[provider]:
+        print(f"No API key configured for {provider} (config.json or environment).", file=sys.stderr)
+        return 2
+
+    base_dir = os.path.dirname(os.path.abspath(args.input))
+    persona_md = read_text_file(args.persona)
+    rules_md = read_text_file(args.rules)
+    items = [
+        normalize_item(row, i, base_dir, persona_md, rules_md)
+        for i, row in enumerate(read_items(args.input))
+    ]
+    cache = None
+    if not args.no_cache and settings.get("cache_enabled", True):
+        cache = ResponseCache(
+            ttl_hours=settings.get("cache_ttl_hours", DEFAULT_TTL_HOURS),
+            max_mb=settings.get("cache_max_mb", DEFAULT_MAX_MB)
+        )
+    poll_min = args.poll_seconds or (0.5 if base_url else POLL_MIN_SECONDS)
+    http = build_http_client()
+    try:
+        backends = {}
+        if keys["claude"]:
+            backends["claude"] = ClaudeBatchBackend(http, keys["claude"], base_url or ANTHROPIC_BASE_URL)
+        if keys["google"]:
+            backends["google"] = GeminiBatchBackend(http, keys["google"], base_url or GEMINI_BASE_URL)
+        runner = BatchRunner(backends, provider, args.out, cache, not args.no_image_prompts,
+                             poll_min, max(poll_min, args.poll_max))
+        failed = await runner.run(items)
+    finally:
+        await http.aclose()
+        if standin is not None:
+            standin.close()
+    return 1 if failed else 0
+
+
+async def serve_standin(args):
+    server, base_url = await start_standin(args.host, args.port, args.delay)
+    print(f"Stand-in batch server on {base_url} (batches end after {args.delay}s)", file=sys.stderr)
+    async with server:
+        await server.serve_forever()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run Marketing Captain campaigns through the provider batch APIs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="batch every step of every item (half price, no rate limits)")
+    run.add_argument("input", help="CSV or JSONL file with one item per row")
+    run.add_argument("--out", required=True, help="campaign directory (results + checkpoints); reuse it to resume")
+    run.add_argument("--provider", choices=["google", "claude"], help="default: api_provider from config.json")
+    run.add_argument("--persona", help="Persona .md file applied to every item")
+    run.add_argument("--rules", help="Writing Rules .md file applied to every item")
+    run.add_argument("--config", default=CONFIG_FILE)
+    run.add_argument("--no-cache", action="store_true", help="do not read or write the response cache")
+    run.add_argument("--no-image-prompts", action="store_true", help="skip the image-prompt rewrites")
+    run.add_argument("--poll-seconds", type=float, help=f"first poll interval (default {POLL_MIN_SECONDS}s, backs off)")
+    run.add_argument("--poll-max", type=float, default=POLL_MAX_SECONDS, help="longest poll interval")
+    run.add_argument("--base-url", help="send batches to this server instead of the providers (e.g. a stand-in)")
+    run.add_argument("--standin", action="store_true", help="start a local stand-in batch server (fake replies)")
+    run.add_argument("--standin-delay", type=float, default=2.0, help="seconds before stand-in batches end")
+
+    standin = commands.add_parser("standin", help="serve the local stand-in batch API")
+    standin.add_argument("--host", default="127.0.0.1")
+    standin.add_argument("--port", type=int, default=8766)
+    standin.add_argument("--delay", type=float, default=2.0, help="seconds before a batch ends")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        if args.command == "standin":
+            asyncio.run(serve_standin(args))
+            return 0
+        return asyncio.run(run_batch(args))
+    except KeyboardInterrupt:
+        if args.command == "run":
+            print("Interrupted; submitted batches are recorded. Re-run the same command to collect them.", file=sys.stderr)
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
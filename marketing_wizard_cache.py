@@ -0,0 +1,122 @@
+# Persistent, content-addressed cache for LLM responses.
+# Entries live in a SQLite database (WAL mode) keyed by a hash of provider,
+# model, normalized prompt, temperature, max tokens and, for structured
+# output, the response schema. Expired entries are
+# dropped on read/write and the least recently used ones are evicted once the
+# stored text exceeds max_bytes.
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+CACHE_FILE = "response_cache.sqlite3"
+DEFAULT_TTL_HOURS = 24 * 7
+DEFAULT_MAX_MB = 64
+
+_SKIPPED_RE = re.compile(r"\(User Skipped:[^)]*\)")
+
+
+def normalize_prompt(prompt):
+    # Drop f-string indentation and unify the get_input() skip placeholders so
+    # trivially different prompts share an entry. Everything else (spacing
+    # inside lines, blank lines) can be user content and is kept as is.
+    text = _SKIPPED_RE.sub("(User Skipped)", prompt or "")
+    return "\n".join(line.lstrip(" \t") for line in text.splitlines())
+
+
+def make_key(provider, model, prompt, temperature, max_tokens, schema=None):
+    # A schema-constrained reply (JSON) is not interchangeable with free text
+    parts = [provider, model, normalize_prompt(prompt), round(float(temperature), 3), int(max_tokens)]
+    if schema is not None:
+        parts.append(schema)
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=CACHE_FILE, ttl_hours=DEFAULT_TTL_HOURS, max_mb=DEFAULT_MAX_MB):
+        self.path = path
+        self.ttl = float(ttl_hours) * 3600
+        self.max_bytes = int(float(max_mb) * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " provider TEXT NOT NULL,"
+            " model TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl > 0 and now - row[1] > self.ttl):
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, provider, model, response):
+        if not response:
+            return
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, model, response, size, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, size, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        if self.ttl > 0:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        doomed = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return {"entries": count, "bytes": total, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
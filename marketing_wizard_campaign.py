@@ -0,0 +1,236 @@
+# Multi-process campaign runner over the headless pipeline.
+# The input file is sharded across worker processes, each with its own event
+# loop, provider clients and request scheduler. Every completed step is
+# checkpointed per item, so re-running the same command after a crash or
+# Ctrl-C resumes where it stopped instead of paying for the calls again.
+#
+#   python marketing_wizard_campaign.py products.csv --out campaign/ --workers 4
+#
+# Layout of --out:
+#   <id>.json / <id>.md          finished items (same format as the pipeline CLI)
+#   .checkpoints/<id>.json       unfinished or failed items (completed steps and image prompts so far)
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+from marketing_wizard_pipeline import (
+    CONFIG_FILE, Pipeline, RecordWriter, create_runtime, load_settings,
+    normalize_item, read_items, read_text_file, record_tokens, safe_name
+)
+
+CHECKPOINT_DIR = ".checkpoints"
+PROGRESS_SECONDS = 10
+
+
+def load_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json_atomic(path, payload):
+    # Write-then-rename so a kill mid-write never leaves a torn checkpoint
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+class CheckpointStore:
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self.dir = os.path.join(out_dir, CHECKPOINT_DIR)
+        os.makedirs(self.dir, exist_ok=True)
+
+    def finished(self, item_id):
+        record = load_json(os.path.join(self.out_dir, f"{safe_name(item_id)}.json"))
+        return record is not None and not record.get("error")
+
+    def load(self, item_id):
+        return load_json(os.path.join(self.dir, f"{safe_name(item_id)}.json"))
+
+    def save(self, record):
+        write_json_atomic(os.path.join(self.dir, f"{safe_name(record['id'])}.json"), record)
+
+    def clear(self, item_id):
+        try:
+            os.remove(os.path.join(self.dir, f"{safe_name(item_id)}.json"))
+        except FileNotFoundError:
+            pass
+
+
+async def run_shard(shard, items, options, events):
+    settings = load_settings(options["config"])
+    providers, scheduler = await create_runtime(settings, options["max_inflight"], options["use_cache"])
+    pipeline = Pipeline(providers, scheduler, options["provider"], options["use_cache"], options["image_prompts"])
+    store = CheckpointStore(options["out"])
+    writer = RecordWriter(options["out"])
+    gate = asyncio.Semaphore(max(1, options["concurrency"]))
+
+    async def save_step(step, record):
+        store.save(record)
+
+    async def process(item):
+        if store.finished(item["id"]):
+            events.put({"shard": shard, "id": item["id"], "status": "skipped"})
+            return
+        checkpoint = store.load(item["id"]) or {}
+        done_steps = checkpoint.get("outputs", {})
+        async with gate:
+            record = await pipeline.run_item(item, outputs=done_steps, on_step=save_step,
+                                             image_prompts=checkpoint.get("image_prompts"))
+        tokens = record_tokens(record)
+        # Keep the metrics of steps finished in earlier runs
+        record["metrics"] = {**checkpoint.get("metrics", {}), **record["metrics"]}
+        if record["error"]:
+            store.save(record)
+        else:
+            writer.write(record)
+            store.clear(item["id"])
+        events.put({
+            "shard": shard,
+            "id": item["id"],
+            "status": "failed" if record["error"] else "done",
+            "error": record["error"],
+            "resumed": len(done_steps),
+            "tokens": tokens,
+            "seconds": record["seconds"],
+        })
+
+    await asyncio.gather(*(process(item) for item in items))
+
+
+def worker_main(shard, items, options, events):
+    try:
+        asyncio.run(run_shard(shard, items, options, events))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        events.put({"shard": shard, "status": "crashed", "error": f"{type(e).__name__}: {e}"})
+
+
+class Throughput:
+    def __init__(self, total):
+        self.total = total
+        self.started = time.monotonic()
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.tokens = 0
+
+    def update(self, event):
+        status = event["status"]
+        if status == "done":
+            self.done += 1
+        elif status == "failed":
+            self.failed += 1
+        elif status == "skipped":
+            self.skipped += 1
+        self.tokens += event.get("tokens", 0)
+
+    def summary(self):
+        minutes = max(1e-9, (time.monotonic() - self.started) / 60)
+        processed = self.done + self.failed
+        return (
+            f"{processed + self.skipped}/{self.total} items "
+            f"(done {self.done}, failed {self.failed}, already finished {self.skipped}) · "
+            f"{processed / minutes:.1f} items/min · {self.tokens / minutes:,.0f} tokens/min"
+        )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run a Marketing Captain campaign across worker processes with resume.")
+    parser.add_argument("input", help="CSV or JSONL file with one item per row")
+    parser.add_argument("--out", required=True, help="campaign directory (results + checkpoints); reuse it to resume")
+    parser.add_argument("--workers", type=int, default=max(1, min(4, os.cpu_count() or 1)))
+    parser.add_argument("--concurrency", type=int, default=4, help="items in progress per worker")
+    parser.add_argument("--max-inflight", type=int, help="provider requests in flight per worker")
+    parser.add_argument("--provider", choices=["google", "claude"], help="default: api_provider from config.json")
+    parser.add_argument("--persona", help="Persona .md file applied to every item")
+    parser.add_argument("--rules", help="Writing Rules .md file applied to every item")
+    parser.add_argument("--config", default=CONFIG_FILE)
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the response cache")
+    parser.add_argument("--no-image-prompts", action="store_true", help="skip the image-prompt rewrites")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    settings = load_settings(args.config)
+    provider = args.provider or settings.get("api_provider", "google")
+    key_name = "api_key" if provider == "google" else "claude_api_key"
+    if not settings.get(key_name):
+        print(f"No API key configured for {provider} (config.json or environment).", file=sys.stderr)
+        return 2
+
+    base_dir = os.path.dirname(os.path.abspath(args.input))
+    persona_md = read_text_file(args.persona)
+    rules_md = read_text_file(args.rules)
+    items = [
+        normalize_item(row, i, base_dir, persona_md, rules_md)
+        for i, row in enumerate(read_items(args.input))
+    ]
+    os.makedirs(os.path.join(args.out, CHECKPOINT_DIR), exist_ok=True)
+    options = {
+        "config": args.config,
+        "out": args.out,
+        "provider": provider,
+        "concurrency": args.concurrency,
+        "max_inflight": args.max_inflight,
+        "use_cache": not args.no_cache,
+        "image_prompts": not args.no_image_prompts,
+    }
+
+    workers = max(1, min(args.workers, len(items) or 1))
+    events = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker_main, args=(shard, items[shard::workers], options, events), daemon=True)
+        for shard in range(workers)
+    ]
+    throughput = Throughput(len(items))
+    print(f"Campaign: {len(items)} items across {workers} workers -> {args.out}", file=sys.stderr)
+    for process in processes:
+        process.start()
+
+    last_report = time.monotonic()
+    try:
+        while True:
+            try:
+                event = events.get(timeout=1)
+            except queue.Empty:
+                event = None
+            if event is not None:
+                throughput.update(event)
+                if event["status"] == "failed":
+                    print(f"FAILED {event['id']}: {event['error']}", file=sys.stderr)
+                elif event["status"] == "crashed":
+                    print(f"Worker {event['shard']} crashed: {event['error']}", file=sys.stderr)
+            elif not any(p.is_alive() for p in processes):
+                break
+            if time.monotonic() - last_report >= PROGRESS_SECONDS:
+                print(throughput.summary(), file=sys.stderr)
+                last_report = time.monotonic()
+    except KeyboardInterrupt:
+        print("Interrupted; completed steps are checkpointed. Re-run the same command to resume.", file=sys.stderr)
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        print(throughput.summary(), file=sys.stderr)
+        return 130
+
+    for process in processes:
+        process.join()
+    print(throughput.summary(), file=sys.stderr)
+    return 1 if throughput.failed or any(p.exitcode for p in processes) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
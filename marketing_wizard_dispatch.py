@@ -0,0 +1,67 @@
+# Worker -> Tk hand-off.
+# Provider work runs on the asyncio loop thread, and Tcl must only be called
+# from the thread that runs mainloop, so root.after() from a worker is not
+# safe either. Workers post UI mutations to a SimpleQueue (no Tcl involved)
+# and the main loop drains it on a short timer. Mutations posted with the
+# same coalesce key replace each other, so only the newest one of a batch
+# runs, at the position it was posted.
+import queue
+import sys
+import time
+
+DRAIN_MS = 16
+IDLE_DRAIN_MS = 50
+DRAIN_BUDGET_MS = 8
+
+
+class UiDispatcher:
+    def __init__(self, root, interval_ms=DRAIN_MS, idle_ms=IDLE_DRAIN_MS, budget_ms=DRAIN_BUDGET_MS):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.idle_ms = idle_ms
+        self.budget = budget_ms / 1000
+        self.queue = queue.SimpleQueue()
+        # Drained but not yet run (the previous drain ran out of budget)
+        self.backlog = []
+        self.stats = {"drains": 0, "run": 0, "coalesced": 0}
+
+    def post(self, func, *args, coalesce=None):
+        # Safe from any thread
+        self.queue.put((coalesce, func, args))
+
+    def start(self):
+        self.root.after(self.interval_ms, self._drain)
+
+    def _drain(self):
+        batch = self.backlog
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.stats["drains"] += 1
+            batch = self._coalesce(batch)
+        deadline = time.perf_counter() + self.budget
+        done = 0
+        for coalesce, func, args in batch:
+            if done and time.perf_counter() > deadline:
+                break
+            done += 1
+            try:
+                func(*args)
+            except Exception:
+                # Same reporting as an exception in a Tk callback
+                self.root.report_callback_exception(*sys.exc_info())
+        self.stats["run"] += done
+        self.backlog = batch[done:]
+        self.root.after(self.interval_ms if batch else self.idle_ms, self._drain)
+
+    def _coalesce(self, batch):
+        last = {}
+        for i, (coalesce, _, _) in enumerate(batch):
+            if coalesce is not None:
+                last[coalesce] = i
+        kept = [item for i, item in enumerate(batch) if item[0] is None or last[item[0]] == i]
+        self.stats["coalesced"] += len(batch) - len(kept)
+        return kept
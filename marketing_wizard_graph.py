@@ -0,0 +1,76 @@
+# Step dependency graph for incremental recompute.
+# Each completed step records a content hash of everything its prompt read:
+# its own input fields (from marketing_wizard_prompts.STEPS) and the text of
+# the upstream steps it embeds. A step is stale when any of those hashes no
+# longer match, or when an upstream step is itself stale.
+import hashlib
+import json
+
+from marketing_wizard_prompts import STEPS, STEP_KEYS
+
+# Upstream step outputs each step's prompt embeds
+STEP_DEPENDS = {
+    "customer": (),
+    "character": ("customer",),
+    "synopsis": ("customer", "character"),
+    "draft": ("character", "synopsis"),
+    "final_script": ("customer", "synopsis", "draft"),
+}
+
+# Text the app writes into output boxes that is not a real result
+PLACEHOLDER_PREFIXES = ("⏳", "(AI가 반환한 내용이 없습니다")
+FAILURE_MARKERS = ("[Error]:", "[취소됨]", "[시간 초과]")
+
+
+def usable_output(text):
+    text = (text or "").strip()
+    if not text or text.startswith(PLACEHOLDER_PREFIXES):
+        return False
+    return not any(marker in text for marker in FAILURE_MARKERS)
+
+
+def content_hash(value):
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class StepGraph:
+    def __init__(self):
+        self.fields = dict(STEPS)
+        self.records = {}
+
+    def signature(self, step, inputs, outputs):
+        return {
+            "fields": {f: content_hash((inputs.get(f) or "").strip()) for f in self.fields[step]},
+            "upstream": {u: content_hash((outputs.get(u) or "").strip()) for u in STEP_DEPENDS[step]},
+        }
+
+    def record(self, step, signature, output):
+        self.records[step] = {"signature": signature, "output": content_hash((output or "").strip())}
+
+    def forget(self, step):
+        self.records.pop(step, None)
+
+    def changes(self, step, inputs, outputs):
+        # Names of inputs/upstream steps that differ from the last run; None if never run
+        record = self.records.get(step)
+        if record is None:
+            return None
+        old, new = record["signature"], self.signature(step, inputs, outputs)
+        changed = [f for f in new["fields"] if old["fields"].get(f) != new["fields"][f]]
+        changed += [u for u in new["upstream"] if old["upstream"].get(u) != new["upstream"][u]]
+        return changed
+
+    def stale_steps(self, inputs_for, outputs):
+        # Ordered {step: reasons}; only steps that have run before can be stale.
+        # inputs_for(step) returns the input dict that step's prompt reads.
+        stale = {}
+        for step in STEP_KEYS:
+            changed = self.changes(step, inputs_for(step), outputs)
+            if changed is None:
+                continue
+            reasons = list(changed)
+            reasons += [f"{u} (stale)" for u in STEP_DEPENDS[step] if u in stale and u not in reasons]
+            if reasons:
+                stale[step] = reasons
+        return stale
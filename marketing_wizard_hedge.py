@@ -0,0 +1,198 @@
+# Hedged requests and failover between Gemini and Claude.
+# The primary provider streams as usual; if it has not produced a first token
+# within an adaptive threshold (recent p95 TTFT), the same prompt goes to the
+# other provider and whichever answers first wins. The loser is cancelled.
+# A per-provider circuit breaker routes around a provider that keeps failing.
+# The hedge runs inside the caller's scheduler slot: it is the same request,
+# and waiting for a second slot would only start it once the primary (which
+# holds the first one) has finished. max_inflight therefore counts logical
+# requests; a hedged one has two upstream calls open until the loser is
+# cancelled.
+import asyncio
+import time
+from collections import deque
+
+PROVIDERS = ("google", "claude")
+DEFAULT_HEDGE_SECONDS = 10.0
+MIN_HEDGE_SECONDS = 3.0
+MIN_SAMPLES = 5
+
+
+def other_provider(provider):
+    return "claude" if provider == "google" else "google"
+
+
+class LatencyTracker:
+    def __init__(self, size=50):
+        self.samples = deque(maxlen=size)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def p95(self):
+        if len(self.samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+
+class CircuitBreaker:
+    # closed -> open after `threshold` consecutive failures; after `cooldown`
+    # seconds one trial request is let through (half-open) and its outcome
+    # closes or re-opens the circuit.
+    def __init__(self, threshold=3, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        state = self.state
+        return state == "closed" or (state == "half-open" and not self.trial_in_flight)
+
+    def begin(self):
+        if self.state == "half-open":
+            self.trial_in_flight = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        # A half-open trial that was cancelled proved nothing either way
+        self.trial_in_flight = False
+
+
+class HedgedRouter:
+    def __init__(self, providers, min_hedge_seconds=MIN_HEDGE_SECONDS):
+        self.providers = providers
+        self.min_hedge_seconds = min_hedge_seconds
+        self.latency = {p: LatencyTracker() for p in PROVIDERS}
+        self.breakers = {p: CircuitBreaker() for p in PROVIDERS}
+        self.stats = {"hedges": 0, "hedge_wins": 0, "failovers": 0}
+
+    def hedge_threshold(self, provider):
+        p95 = self.latency[provider].p95()
+        if p95 is None:
+            return DEFAULT_HEDGE_SECONDS
+        return max(self.min_hedge_seconds, p95)
+
+    def route(self, preferred):
+        # Ordered candidates: preferred first unless its circuit is open
+        ready = [p for p in (preferred, other_provider(preferred)) if self.providers.is_ready(p)]
+        allowed = [p for p in ready if self.breakers[p].allow()]
+        if not allowed and ready:
+            # Everything is tripped; still try the preferred provider rather than fail blind
+            allowed = ready[:1]
+        if allowed and allowed[0] != preferred:
+            self.stats["failovers"] += 1
+            print(f"DEBUG: Circuit open for {preferred}; routing to {allowed[0]}")
+        return allowed
+
+    async def stream(self, provider, prompt, max_tokens=8000, temperature=0.7, usage=None, schema=None):
+        candidates = self.route(provider)
+        if not candidates:
+            raise RuntimeError(f"No configured provider available for {provider}")
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        tasks = {}
+        launched_at = {}
+        usages = {}
+        errors = {}
+        hedged = set()
+        winner = None
+
+        async def pump(name):
+            try:
+                async for delta in self.providers.stream(name, prompt, max_tokens, temperature, usage=usages[name], schema=schema):
+                    await queue.put(("delta", name, delta))
+                await queue.put(("done", name, None))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                await queue.put(("error", name, exc))
+
+        def launch(name, hedge=False):
+            usages[name] = {}
+            launched_at[name] = loop.time()
+            self.breakers[name].begin()
+            if hedge:
+                hedged.add(name)
+            tasks[name] = asyncio.create_task(pump(name))
+
+        def cancel_losers(keep):
+            for name, task in tasks.items():
+                if name != keep and not task.done():
+                    task.cancel()
+                    self.breakers[name].release_trial()
+
+        launch(candidates[0])
+        hedge_at = loop.time() + self.hedge_threshold(candidates[0])
+        try:
+            while True:
+                timeout = None
+                if winner is None and len(tasks) < len(candidates):
+                    timeout = max(0.0, hedge_at - loop.time())
+                try:
+                    kind, name, payload = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    hedge = candidates[len(tasks)]
+                    self.stats["hedges"] += 1
+                    print(f"DEBUG: No first token from {candidates[0]} after {self.hedge_threshold(candidates[0]):.1f}s; hedging to {hedge}")
+                    launch(hedge, hedge=True)
+                    continue
+                if winner is not None and name != winner:
+                    continue
+                if kind == "delta":
+                    if winner is None:
+                        winner = name
+                        self.latency[name].record(loop.time() - launched_at[name])
+                        if name in hedged:
+                            self.stats["hedge_wins"] += 1
+                        cancel_losers(name)
+                    yield payload
+                elif kind == "done":
+                    if winner is None:
+                        winner = name
+                        cancel_losers(name)
+                    self.breakers[name].record_success()
+                    if usage is not None:
+                        usage.update(usages[name])
+                        usage["provider"] = name
+                    return
+                else:
+                    self.breakers[name].record_failure()
+                    if winner == name:
+                        raise payload
+                    errors[name] = payload
+                    if len(tasks) < len(candidates):
+                        fallback = candidates[len(tasks)]
+                        self.stats["failovers"] += 1
+                        print(f"DEBUG: {name} failed ({type(payload).__name__}); failing over to {fallback}")
+                        launch(fallback)
+                        continue
+                    if len(errors) == len(tasks):
+                        raise errors[candidates[0]] if candidates[0] in errors else payload
+        finally:
+            # Also reached when the caller is cancelled (user cancel, deadline,
+            # supersede); a cancelled half-open trial must not keep its breaker shut
+            for name, task in tasks.items():
+                if not task.done():
+                    task.cancel()
+                    self.breakers[name].release_trial()
@@ -1,19 +1,15 @@
-﻿import ttkbootstrap as tb
+﻿import marketing_wizard_startup as startup
+import ttkbootstrap as tb
 from ttkbootstrap.constants import *
 from ttkbootstrap.widgets import ToastNotification
 from tkinter import messagebox, scrolledtext, filedialog
 import threading
 import time
-from google import genai
-from google.genai import types
-from PIL import Image, ImageTk, ImageDraw, ImageFont
 import io
 from datetime import datetime
 import json
 import os
 
-# Configure Gemini Client - Initially None, will be set after loading config
-client = None
 CONFIG_FILE = "config.json"
 
 class MarketingWizardApp:
@@ -28,7 +24,8 @@ class MarketingWizardApp:
         
         # API Key management
         self.api_key = self.load_config()
-        self.init_genai_client()
+        self.genai = startup.GenaiClientLoader(self.root)
+        startup.after_first_paint(self.root, self.init_genai_client)
         
         # Shared Data Store
         self.data = {
@@ -448,15 +445,7 @@ class MarketingWizardApp:
             json.dump({"api_key": api_key}, f, indent=4)
 
     def init_genai_client(self):
-        global client
-        if self.api_key:
-            try:
-                client = genai.Client(api_key=self.api_key)
-            except Exception as e:
-                print(f"Client Init Error: {e}")
-                client = None
-        else:
-            client = None
+        self.genai.start(self.api_key)
 
     # --- Logic ---
     
@@ -507,7 +496,11 @@ class MarketingWizardApp:
         self.run_prompt_gen(img_prompt, self.lbl_img_step1)
 
     def run_gemini(self, prompt_func, widget, key):
-        if not client:
+        if self.genai.defer(key, lambda: self.run_gemini(prompt_func, widget, key), self.api_key):
+            widget.delete("1.0", END)
+            widget.insert("1.0", "⏳ API 연결 중입니다... (잠시만 기다려주세요)")
+            return
+        if not self.genai.client:
             messagebox.showwarning("설정 필요", "먼저 '설정' 탭에서 API Key를 입력하고 저장해주세요.")
             self.notebook.select(self.tab_settings)
             return
@@ -532,10 +525,10 @@ class MarketingWizardApp:
             try:
                 # NEW SDK usage: client.models.generate_content
                 print(f"DEBUG: Calling Gemini for {key}...")
-                response = client.models.generate_content(
+                response = self.genai.client.models.generate_content(
                     model='gemini-2.5-flash',
                     contents=prompt,
-                    config=types.GenerateContentConfig(
+                    config=self.genai.types.GenerateContentConfig(
                         max_output_tokens=8000, # Increased limit to prevent truncation while stopping infinite loops
                         temperature=0.7
                     )
@@ -596,7 +589,9 @@ class MarketingWizardApp:
             )
 
     def run_prompt_gen(self, prompt, label_widget):
-        if not client:
+        if self.genai.defer(str(label_widget), lambda: self.run_prompt_gen(prompt, label_widget), self.api_key):
+            return
+        if not self.genai.client:
             return
 
         if isinstance(label_widget, scrolledtext.ScrolledText):
@@ -609,14 +604,14 @@ class MarketingWizardApp:
 
         def task():
             try:
-                response = client.models.generate_content(
+                response = self.genai.client.models.generate_content(
                     model='gemini-2.5-flash',
                     contents=(
                         "Rewrite the following into a single English-only image prompt. "
                         "No Korean, no quotes, no markdown, no extra commentary:\n"
                         f"{prompt}"
                     ),
-                    config=types.GenerateContentConfig(
+                    config=self.genai.types.GenerateContentConfig(
                         max_output_tokens=800,
                         temperature=0.6
                     )
@@ -632,6 +627,7 @@ class MarketingWizardApp:
         threading.Thread(target=task, daemon=True).start()
 
     def create_placeholder_image(self, label, text):
+        from PIL import Image, ImageTk, ImageDraw
         img = Image.new('RGB', (400, 300), color=(52, 152, 219))
         d = ImageDraw.Draw(img)
         try:
@@ -923,8 +919,13 @@ class MarketingWizardApp:
         """
 
 
+startup.mark("imports")
+
 if __name__ == "__main__":
     # Theme: Cosmo (Modern Blue/White)
     root = tb.Window(themename="cosmo") 
+    startup.mark("window")
     app = MarketingWizardApp(root)
+    startup.mark("app")
+    startup.report_after_paint(root)
     root.mainloop()
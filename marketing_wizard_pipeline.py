@@ -0,0 +1,376 @@
+# Headless Step 1-5 pipeline for Marketing Captain.
+# Runs the same prompts as the desktop app (marketing_wizard_prompts) over
+# items read from CSV or JSONL, without importing tkinter / ttkbootstrap, and
+# writes one JSON record per item to a directory or to stdout as JSONL.
+#
+#   python marketing_wizard_pipeline.py items.csv --out results/
+#   python marketing_wizard_pipeline.py items.jsonl --persona persona.md --rules rules.md > out.jsonl
+import argparse
+import asyncio
+import csv
+import json
+import os
+import re
+import sys
+import time
+
+import marketing_wizard_prompts as wizard_prompts
+import marketing_wizard_structured as wizard_structured
+from marketing_wizard_cache import ResponseCache, DEFAULT_TTL_HOURS, DEFAULT_MAX_MB
+from marketing_wizard_providers import AsyncProviders
+from marketing_wizard_scheduler import (
+    RequestScheduler, DEFAULT_MAX_INFLIGHT, PRIORITY_BACKGROUND, PRIORITY_IMAGE_PROMPT
+)
+
+CONFIG_FILE = "config.json"
+
+# Column aliases accepted in input files -> prompt input field
+FIELD_ALIASES = {
+    "products": "product",
+    "pains": "pain",
+    "roles": "role",
+    "flaws": "flaw",
+    "style": "persona_style",
+    "strategy": "story_strategy",
+    "detail_scene": "scene",
+    "detail_inner": "inner",
+}
+
+
+def load_settings(path=CONFIG_FILE):
+    # config.json written by the desktop app; environment variables win
+    config = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except Exception as e:
+            print(f"Config Load Error: {e}", file=sys.stderr)
+    config["api_key"] = os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY") or config.get("api_key", "")
+    config["claude_api_key"] = os.environ.get("ANTHROPIC_API_KEY") or config.get("claude_api_key", "")
+    return config
+
+
+def read_text_file(path, base_dir=""):
+    if not path:
+        return ""
+    if base_dir and not os.path.isabs(path) and not os.path.exists(path):
+        path = os.path.join(base_dir, path)
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def read_items(path):
+    if path == "-":
+        rows = [json.loads(line) for line in sys.stdin if line.strip()]
+    elif path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    return rows
+
+
+def normalize_item(row, index, base_dir="", persona_md="", writing_rules_md=""):
+    inputs = {}
+    for column, value in row.items():
+        if column is None:
+            continue
+        field = FIELD_ALIASES.get(column.strip().lower(), column.strip().lower())
+        inputs[field] = "" if value is None else str(value)
+    item_id = inputs.pop("id", "") or f"{index + 1:05d}"
+    # Per-item persona/rules files override the run-wide ones
+    persona_file = inputs.pop("persona_file", "")
+    rules_file = inputs.pop("rules_file", "")
+    inputs["persona_md"] = read_text_file(persona_file, base_dir) if persona_file else inputs.get("persona_md", persona_md)
+    inputs["writing_rules_md"] = read_text_file(rules_file, base_dir) if rules_file else inputs.get("writing_rules_md", writing_rules_md)
+    return {"id": item_id, "inputs": {field: inputs.get(field, "") for field in wizard_prompts.INPUT_FIELDS}}
+
+
+def safe_name(item_id):
+    return re.sub(r"[^\w\-.]+", "_", str(item_id)).strip("._") or "item"
+
+
+def record_tokens(record):
+    return sum(
+        m.get("input_tokens", 0) + m.get("output_tokens", 0)
+        for m in record.get("metrics", {}).values()
+    )
+
+
+class Pipeline:
+    def __init__(self, providers, scheduler, provider="google", use_cache=True, image_prompts=True,
+                 priority=PRIORITY_BACKGROUND, structured=False):
+        self.providers = providers
+        self.scheduler = scheduler
+        self.provider = provider
+        self.use_cache = use_cache
+        self.image_prompts = image_prompts
+        self.priority = priority
+        # Step 5 as schema-constrained JSON (marketing_wizard_structured)
+        self.structured = structured
+
+    async def call(self, prompt, priority, provider=None, max_tokens=8000, temperature=0.7, usage=None, on_delta=None,
+                   schema=None, validate=None):
+        # on_delta(text), if given, receives the response as it streams in;
+        # validate(text) -> bool keeps unusable replies out of the cache
+        provider = provider or self.provider
+        if self.use_cache:
+            cached = await self.providers.cache_lookup(provider, prompt, max_tokens, temperature, schema)
+            if cached is not None:
+                if usage is not None:
+                    usage["cached"] = True
+                if on_delta is not None:
+                    on_delta(cached)
+                return cached
+        async with self.scheduler.slot(priority):
+            if on_delta is None:
+                result = await self.providers.generate(provider, prompt, max_tokens, temperature, usage=usage, schema=schema)
+            else:
+                parts = []
+                async for delta in self.providers.stream(provider, prompt, max_tokens, temperature, usage=usage, schema=schema):
+                    parts.append(delta)
+                    on_delta(delta)
+                result = "".join(parts)
+        if validate is None or validate(result):
+            await self.providers.cache_store(provider, prompt, result, max_tokens, temperature, schema)
+        return result
+
+    async def run_step(self, step, inputs, outputs, usage=None, on_delta=None):
+        # In structured mode Step 5 returns (and streams) the raw JSON post
+        structured = self.structured and step == "final_script"
+        prompt = wizard_prompts.build_prompt(step, inputs, outputs, structured)
+        forward = None if on_delta is None else (lambda text: on_delta(step, text))
+        result = await self.call(
+            prompt, self.priority, usage=usage, on_delta=forward,
+            schema=wizard_structured.STEP5_SCHEMA if structured else None,
+            validate=(lambda text: bool(wizard_structured.parse_post(text))) if structured else None
+        )
+        return result or ""
+
+    async def run_image_prompt(self, raw_prompt, usage=None):
+        if not self.providers.is_ready("google"):
+            return ""
+        result = await self.call(
+            wizard_prompts.image_rewrite_prompt(raw_prompt),
+            max(self.priority, PRIORITY_IMAGE_PROMPT),
+            provider="google",
+            max_tokens=800,
+            temperature=0.6,
+            usage=usage
+        )
+        return (result or "").strip()
+
+    async def run_image_prompts(self, raw_prompts, usage=None):
+        # Rewrites every prompt in one structured call; items the reply does
+        # not cover usably are rewritten one by one
+        rewrites = ["" for _ in raw_prompts]
+        targets = [i for i, raw in enumerate(raw_prompts) if raw.strip()]
+        if not targets or not self.providers.is_ready("google"):
+            return rewrites
+        count = len(targets)
+        try:
+            result = await self.call(
+                wizard_prompts.image_rewrite_batch_prompt([raw_prompts[i] for i in targets]),
+                max(self.priority, PRIORITY_IMAGE_PROMPT),
+                provider="google",
+                max_tokens=800 * count,
+                temperature=0.6,
+                usage=usage,
+                schema=wizard_prompts.image_rewrites_schema(count),
+                validate=lambda text: None not in wizard_prompts.parse_image_rewrites(text, count)
+            )
+            parsed = wizard_prompts.parse_image_rewrites(result, count)
+        except Exception:
+            parsed = [None] * count
+        missing = []
+        for i, rewrite in zip(targets, parsed):
+            if rewrite is None:
+                missing.append(i)
+            else:
+                rewrites[i] = rewrite
+        fallbacks = await asyncio.gather(*(self.run_image_prompt(raw_prompts[i]) for i in missing), return_exceptions=True)
+        for i, fallback in zip(missing, fallbacks):
+            if isinstance(fallback, Exception):
+                # Successful rewrites are cached, so a retry only pays for this one
+                raise fallback
+            rewrites[i] = fallback
+        return rewrites
+
+    async def run_item(self, item, steps=None, outputs=None, on_step=None, on_delta=None, image_prompts=None):
+        # outputs / image_prompts may carry work already completed (resume);
+        # on_step(step, record) is awaited after each newly completed step and
+        # image-prompt rewrite ("image:<name>"); on_delta(step, text) receives
+        # step text as it streams.
+        steps = steps or wizard_prompts.STEP_KEYS
+        inputs = item["inputs"]
+        record = {
+            "id": item["id"],
+            "inputs": {k: v for k, v in inputs.items() if k not in ("persona_md", "writing_rules_md")},
+            "outputs": dict(outputs or {}),
+            "image_prompts": dict(image_prompts or {}),
+            "metrics": {},
+            "error": None,
+        }
+        started = time.perf_counter()
+        for step in steps:
+            if step in record["outputs"]:
+                continue
+            if step == "customer" and not inputs.get("product", "").strip():
+                record["error"] = "customer: product is required"
+                break
+            usage = {}
+            step_started = time.perf_counter()
+            try:
+                text = await self.run_step(step, inputs, record["outputs"], usage, on_delta)
+            except Exception as e:
+                record["error"] = f"{step}: {e}"
+                break
+            usage["seconds"] = round(time.perf_counter() - step_started, 3)
+            if self.structured and step == "final_script":
+                post = wizard_structured.parse_post(text)
+                if post:
+                    record["structured"] = {step: post}
+                    text = wizard_structured.render_markdown(post)
+                usage["missing_fields"] = wizard_structured.missing_fields(post)
+            record["outputs"][step] = text
+            record["metrics"][step] = usage
+            if on_step is not None:
+                await on_step(step, record)
+        if self.image_prompts and record["error"] is None:
+            await self.fill_image_prompts(inputs, record, on_step)
+        record["seconds"] = round(time.perf_counter() - started, 3)
+        return record
+
+    async def fill_image_prompts(self, inputs, record, on_step=None):
+        # Rewrites already in record["image_prompts"] (resume) are skipped. A
+        # failed rewrite is left out and fails the item, so a resume retries it.
+        outputs = record["outputs"]
+        done = record["image_prompts"]
+        raw = {}
+        if "customer" in outputs:
+            raw["customer"] = wizard_prompts.portrait_image_prompt(inputs.get("product", ""), inputs.get("pain", ""))
+        if "synopsis" in outputs:
+            raw["synopsis"] = wizard_prompts.poster_image_prompt(inputs.get("product", ""))
+
+        async def rewrite(name, call):
+            usage = {}
+            try:
+                done[name] = await call(usage)
+            except Exception as e:
+                usage["error"] = f"{type(e).__name__}: {e}"
+                if record["error"] is None:
+                    record["error"] = f"image:{name}: {e}"
+            record["metrics"][f"image:{name}"] = usage
+            if on_step is not None:
+                await on_step(f"image:{name}", record)
+
+        calls = [
+            rewrite(name, lambda usage, prompt=prompt: self.run_image_prompt(prompt, usage))
+            for name, prompt in raw.items() if name not in done
+        ]
+        post = record.get("structured", {}).get("final_script")
+        if post:
+            # The schema already asks for English section prompts; no rewrite
+            done["final_script"] = wizard_structured.section_image_prompts(post)
+        elif "final_script" in outputs and "final_script" not in done:
+            # Step 5 section prompts are rewritten together in one call
+            sections = wizard_prompts.extract_image_prompts(outputs["final_script"])
+            calls.append(rewrite("final_script", lambda usage: self.run_image_prompts(sections, usage)))
+        await asyncio.gather(*calls)
+
+
+async def create_runtime(settings, max_inflight=None, use_cache=True):
+    cache = None
+    if use_cache and settings.get("cache_enabled", True):
+        cache = ResponseCache(
+            ttl_hours=settings.get("cache_ttl_hours", DEFAULT_TTL_HOURS),
+            max_mb=settings.get("cache_max_mb", DEFAULT_MAX_MB)
+        )
+    providers = AsyncProviders(cache=cache)
+    providers.set_keys(settings.get("api_key", ""), settings.get("claude_api_key", ""))
+    await providers.connect()
+    scheduler = RequestScheduler(max_inflight or settings.get("max_inflight", DEFAULT_MAX_INFLIGHT))
+    return providers, scheduler
+
+
+class RecordWriter:
+    def __init__(self, out_dir=None):
+        self.out_dir = out_dir
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+
+    def write(self, record):
+        if not self.out_dir:
+            sys.stdout.write(json.dumps(record, ensure_ascii=False) + "\n")
+            sys.stdout.flush()
+            return
+        name = safe_name(record["id"])
+        with open(os.path.join(self.out_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        final_script = record["outputs"].get("final_script")
+        if final_script:
+            with open(os.path.join(self.out_dir, f"{name}.md"), "w", encoding="utf-8") as f:
+                f.write(final_script)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run the Marketing Captain Step 1-5 pipeline without the GUI.")
+    parser.add_argument("input", help="CSV or JSONL file with one item per row ('-' reads JSONL from stdin)")
+    parser.add_argument("--out", help="output directory (default: JSONL on stdout)")
+    parser.add_argument("--provider", choices=["google", "claude"], help="default: api_provider from config.json")
+    parser.add_argument("--persona", help="Persona .md file applied to every item")
+    parser.add_argument("--rules", help="Writing Rules .md file applied to every item")
+    parser.add_argument("--config", default=CONFIG_FILE)
+    parser.add_argument("--concurrency", type=int, default=4, help="items processed in parallel")
+    parser.add_argument("--max-inflight", type=int, help="provider requests in flight (default from config.json)")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the response cache")
+    parser.add_argument("--no-image-prompts", action="store_true", help="skip the image-prompt rewrites")
+    parser.add_argument("--structured", action="store_true", help="generate Step 5 as schema-constrained JSON fields")
+    return parser
+
+
+async def run_batch(args):
+    settings = load_settings(args.config)
+    provider = args.provider or settings.get("api_provider", "google")
+    key_name = "api_key" if provider == "google" else "claude_api_key"
+    if not settings.get(key_name):
+        print(f"No API key configured for {provider} (config.json or environment).", file=sys.stderr)
+        return 2
+    base_dir = "" if args.input == "-" else os.path.dirname(os.path.abspath(args.input))
+    persona_md = read_text_file(args.persona)
+    rules_md = read_text_file(args.rules)
+    items = [
+        normalize_item(row, i, base_dir, persona_md, rules_md)
+        for i, row in enumerate(read_items(args.input))
+    ]
+    providers, scheduler = await create_runtime(settings, args.max_inflight, not args.no_cache)
+    pipeline = Pipeline(providers, scheduler, provider, not args.no_cache, not args.no_image_prompts,
+                        structured=args.structured)
+    writer = RecordWriter(args.out)
+    gate = asyncio.Semaphore(max(1, args.concurrency))
+    failed = 0
+    done = 0
+
+    async def process(item):
+        nonlocal failed, done
+        async with gate:
+            record = await pipeline.run_item(item)
+        writer.write(record)
+        done += 1
+        if record["error"]:
+            failed += 1
+        print(f"[{done}/{len(items)}] {record['id']} {'FAILED: ' + record['error'] if record['error'] else 'ok'} ({record['seconds']}s)", file=sys.stderr)
+
+    await asyncio.gather(*(process(item) for item in items))
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return asyncio.run(run_batch(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
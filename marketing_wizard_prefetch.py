@@ -0,0 +1,104 @@
+# Speculative prefetch of the next step.
+# When a step completes and the user has left the next step's own questions
+# blank, the app can generate that step in the background at low priority
+# while the user reads the output. A prefetch is keyed by the exact request
+# (provider, model, prompt): clicking the step with nothing edited reuses it,
+# any edit to an input or an upstream output discards it. Hits, misses and
+# the tokens spent on prefetches nobody used are counted so the token cost
+# can be weighed against the saved waiting time.
+from marketing_wizard_prompts import STEP_KEYS
+
+# Free-text answers of each step; the step is only prefetched while these are
+# blank (the AI invents them). Choice fields always have a value.
+OPEN_FIELDS = {
+    "character": ("role", "flaw", "backstory"),
+    "synopsis": ("secret", "wall", "epiphany", "cta"),
+    "draft": ("episode", "scene", "inner"),
+    "final_script": ("nickname", "facts"),
+}
+
+
+def prefetch_target(step, inputs):
+    # Step to prefetch after `step` completes, or None
+    index = STEP_KEYS.index(step)
+    if index + 1 >= len(STEP_KEYS):
+        return None
+    target = STEP_KEYS[index + 1]
+    if any((inputs.get(field) or "").strip() for field in OPEN_FIELDS[target]):
+        return None
+    return target
+
+
+def usage_tokens(usage):
+    return usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+
+
+class PrefetchTracker:
+    # Only touched from the Tk thread; the provider loop reports back through
+    # call_in_ui.
+    def __init__(self):
+        self.entries = {}
+        self.stats = {
+            "started": 0,
+            "hits": 0,       # clicked with nothing changed
+            "discarded": 0,  # clicked after an input/output changed
+            "late": 0,       # clicked before the prefetch got a scheduler slot
+            "unused": 0,     # replaced by a newer prefetch without a click
+            "tokens": 0,
+            "wasted_tokens": 0,
+        }
+
+    def add(self, step, request_key):
+        self.drop(step, "unused")
+        entry = {"key": request_key, "future": None, "running": False, "tokens": 0, "state": "pending"}
+        self.entries[step] = entry
+        self.stats["started"] += 1
+        return entry
+
+    def mark_running(self, entry):
+        # The prefetch got its scheduler slot
+        entry["running"] = True
+
+    def record_tokens(self, entry, usage):
+        entry["tokens"] = usage_tokens(usage)
+        self.stats["tokens"] += entry["tokens"]
+        if entry["state"] not in ("pending", "hit"):
+            self.stats["wasted_tokens"] += entry["tokens"]
+
+    def drop(self, step, reason):
+        entry = self.entries.pop(step, None)
+        if entry is None:
+            return
+        entry["state"] = reason
+        self.stats[reason] += 1
+        self.stats["wasted_tokens"] += entry["tokens"]
+        if entry["future"] is not None:
+            entry["future"].cancel()
+
+    def claim(self, step, request_key):
+        # Entry to reuse for this request, or None (any old prefetch is dropped)
+        entry = self.entries.get(step)
+        if entry is None:
+            return None
+        if entry["key"] != request_key:
+            self.drop(step, "discarded")
+            return None
+        if not entry["running"] and not entry["future"].done():
+            # Still queued behind other work; the interactive run is faster
+            self.drop(step, "late")
+            return None
+        del self.entries[step]
+        entry["state"] = "hit"
+        self.stats["hits"] += 1
+        return entry
+
+    def hit_rate(self):
+        resolved = self.stats["hits"] + self.stats["discarded"] + self.stats["late"] + self.stats["unused"]
+        return self.stats["hits"] / resolved if resolved else 0.0
+
+    def summary(self):
+        s = self.stats
+        return (
+            f"prefetch hits={s['hits']} discarded={s['discarded']} late={s['late']} unused={s['unused']} "
+            f"hit_rate={self.hit_rate():.0%} tokens={s['tokens']} wasted_tokens={s['wasted_tokens']}"
+        )
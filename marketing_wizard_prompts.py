@@ -0,0 +1,460 @@
+# Prompt builders for the Step 1-5 pipeline.
+# Pure functions over plain dicts so the desktop app, the headless pipeline
+# and any other caller produce byte-identical prompts. `inputs` holds the
+# user's answers (keys in INPUT_FIELDS), `outputs` the previous steps' text
+# keyed by step name.
+import json
+import re
+
+# (step key, input fields the step reads)
+STEPS = [
+    ("customer", ("product", "pain")),
+    ("character", ("role", "flaw", "backstory", "persona_style")),
+    ("synopsis", ("secret", "wall", "epiphany", "cta", "story_strategy")),
+    ("draft", ("episode", "scene", "inner")),
+    ("final_script", ("product", "nickname", "facts", "persona_style", "story_strategy", "persona_md", "writing_rules_md")),
+]
+STEP_KEYS = [key for key, _ in STEPS]
+
+INPUT_FIELDS = [
+    "product", "pain",
+    "role", "flaw", "backstory", "persona_style",
+    "secret", "wall", "epiphany", "cta", "story_strategy",
+    "episode", "scene", "inner",
+    "nickname", "facts",
+    "persona_md", "writing_rules_md",
+]
+
+PERSONA_STYLES = [
+    "옵션 A: 친절한 옆집 언니 (부드러운 공감)",
+    "옵션 B: 냉철한 데이터 분석가 (팩트와 숫자)",
+    "옵션 C: 열정적인 동기부여가 (에너지와 확신)",
+]
+
+NO_IMAGE_PROMPT = "(프롬프트 없음 - 출력 형식 확인 필요)"
+
+
+def get_input(inputs, field, default_msg):
+    val = (inputs.get(field) or "").strip()
+    if not val:
+        return f"(User Skipped: AI MUST invent a creative, specific detail for this based on context. {default_msg})"
+    return val
+
+
+# --- Image prompts ---
+def portrait_image_prompt(product, pain):
+    # Added instruction for English text only
+    return f"A photorealistic portrait of a korean person who is worrying about {pain} related to {product}. High quality, emotional, detailed face, cinematic lighting, 8k. (Important: If there is any text in the image, it must be in English only. Do NOT use Korean text.)"
+
+
+def poster_image_prompt(product):
+    return f"A dramatic Netflix movie poster for a series titled '{product}'. Cinematic lighting, high quality 8k, emotional atmosphere, professional design, text-free. (Important: The image MUST NOT contain any text or letters.)"
+
+
+def image_rewrite_prompt(prompt):
+    return (
+        "Rewrite the following into a single English-only image prompt. "
+        "No Korean, no quotes, no markdown, no extra commentary:\n"
+        f"{prompt}"
+    )
+
+
+def image_rewrite_batch_prompt(prompts):
+    # One structured call for several rewrites; see parse_image_rewrites
+    numbered = "\n".join(f"{i}. {prompt}" for i, prompt in enumerate(prompts, start=1))
+    return (
+        f"Rewrite each of the following {len(prompts)} numbered image descriptions into a single English-only image prompt. "
+        "No Korean, no quotes, no markdown, no extra commentary inside the prompts. "
+        f"Reply with only a JSON array of exactly {len(prompts)} strings, in the same order:\n"
+        f"{numbered}"
+    )
+
+
+def image_rewrites_schema(count):
+    # JSON Schema for the image_rewrite_batch_prompt reply
+    return {"type": "array", "items": {"type": "string"}, "minItems": count, "maxItems": count}
+
+
+def parse_image_rewrites(text, count):
+    # One cleaned prompt per input, None for any item the reply does not
+    # provide usably (the caller rewrites those one by one)
+    text = (text or "").strip()
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text)
+    start, end = text.find("["), text.rfind("]")
+    items = []
+    if start != -1 and end > start:
+        try:
+            items = json.loads(text[start:end + 1])
+        except ValueError:
+            items = []
+    if not isinstance(items, list):
+        items = []
+    rewrites = []
+    for i in range(count):
+        item = items[i] if i < len(items) else None
+        if isinstance(item, dict):
+            item = item.get("prompt")
+        rewrites.append(item.strip() if isinstance(item, str) and item.strip() else None)
+    return rewrites
+
+
+def extract_image_prompts(result):
+    # Step 5 section prompts; look for markers like **[Image Prompt for Nano Banana]**: ...
+    prompts = re.findall(r"\*\*\[Image Prompt for Nano Banana\]\*\*:\s*(.*?)(?:\n|$)", result)
+    if not prompts:
+        prompts = re.findall(r"(?:Image Prompt for Nano Banana|Image Prompt)\s*[:\-]\s*(.*?)(?:\n|$)", result, re.IGNORECASE)
+    if not prompts:
+        prompts = re.findall(r"\[Image Prompt.*?\]\s*[:\-]?\s*(.*?)(?:\n|$)", result, re.IGNORECASE)
+    cleaned = []
+    for p in prompts[:4]:
+        clean_p = p.strip()
+        if clean_p and "Pixar" not in clean_p:
+            # Add base styling if not present to ensure quality
+            clean_p += ", 3D Pixar animation style, high quality render"
+        cleaned.append(clean_p)
+    return cleaned
+
+
+# --- Step 3 series table ---
+_EPISODE_RE = re.compile(r"^[\s#*>\-\[|]*(?:제\s*)?([1-4])\s*(?:화|부|편)|^[\s#*>\-\[|]*(?:Ep(?:isode)?\.?\s*)([1-4])\b", re.IGNORECASE)
+
+
+def _table_cells(line):
+    return [cell.strip().strip("*").strip() for cell in line.strip().strip("|").split("|")]
+
+
+def parse_episodes(synopsis, count=4):
+    # Split the Step 3 [4-part Series Planning Table] into one description per
+    # episode. Handles a Markdown table (one row per episode) or per-episode
+    # headings / bullets; falls back to bare episode numbers.
+    lines = (synopsis or "").splitlines()
+    rows = [line for line in lines if line.strip().startswith("|")]
+    rows = [row for row in rows if not re.fullmatch(r"[\s|:\-]+", row)]
+    if len(rows) >= 2:
+        header = _table_cells(rows[0])
+        episodes = []
+        for row in rows[1:count + 1]:
+            cells = _table_cells(row)
+            parts = [f"{h}: {c}" if h else c for h, c in zip(header, cells) if c]
+            episodes.append(" / ".join(parts))
+        if episodes:
+            return episodes
+
+    episodes = {}
+    current = None
+    for line in lines:
+        match = _EPISODE_RE.match(line)
+        if match:
+            current = int(match.group(1) or match.group(2))
+            if current in episodes:
+                current = None
+                continue
+            episodes[current] = []
+        if current is not None and line.strip():
+            episodes[current].append(line.strip())
+    if episodes:
+        return [" ".join(episodes[n]) for n in sorted(episodes)[:count]]
+    return [f"제{n}화" for n in range(1, count + 1)]
+
+
+# --- Step prompts ---
+def prompt_step1(inputs, outputs=None):
+    product = get_input(inputs, "product", "판매할 상품을 상상해서 제안해주세요")
+    pain = get_input(inputs, "pain", "이 상품을 필요로 하는 사람의 고통을 상상해주세요")
+    return f"""
+    # Goal: Step 1. Define Dream Customer
+    # Input Data:
+    - Product: {product}
+    - Pain: {pain}
+    # Task:
+    1. Identify the most desperate target audience.
+    2. Define their Persona (Age, Job, Situation, Deepest Desire).
+    3. Write in Korean, friendly and clear.
+
+    **Output strictly in Markdown.**
+    Structure:
+    - **Target Audience**: ...
+    - **Demographics**: ...
+    - **Psychographics (Desire/Pain)**: ...
+    """
+
+
+# Steps 2-5 return (static_prefix, variable_tail): the prefix holds the
+# instructions and output format (plus persona/rules files in Step 5) and
+# must not interpolate per-post values, so provider prompt caches can hit.
+def prompt_step2(inputs, outputs):
+    # Link Logic: Read Step 1 output
+    customer_profile = outputs.get("customer", "").strip()
+
+    role = get_input(inputs, "role", "고객에게 신뢰를 줄 수 있는 역할을 추천해주세요")
+    flaw = get_input(inputs, "flaw", "인간미가 느껴지는 작은 결점을 만들어주세요")
+    back = get_input(inputs, "backstory", "공감을 얻을 수 있는 실패 경험담을 만들어주세요")
+
+    persona = inputs.get("persona_style") or PERSONA_STYLES[0]
+
+    prefix = """
+    # Goal: Step 2. Define Attractive Character
+    # Task:
+    1. Create a character profile that is the PERFECT GUIDE for the Target Audience given below.
+    2. Body tone and voice must perfectly match the chosen Identity Style given below.
+    3. Format clearly. Language: Korean.
+
+    **Output strictly in Markdown.**
+    Structure:
+    - **Name/Title**: ...
+    - **Style/Vibe**: ...
+    - **Role (Identity)**: ...
+    - **Flaw (Vulnerability)**: ...
+    - **Backstory**: ...
+    """
+    tail = f"""
+    # Context (Target Audience):
+    {customer_profile}
+
+    # Identity Style (Strictly Follow This):
+    - Style: {persona}
+
+    # Input Data:
+    - Role: {role}
+    - Flaw: {flaw}
+    - Backstory: {back}
+    """
+    return prefix, tail
+
+
+def prompt_step3(inputs, outputs):
+    customer = outputs.get("customer", "").strip()
+    character = outputs.get("character", "").strip()
+
+    secret = get_input(inputs, "secret", "사람들이 아직 모르는 특별한 기회나 비밀을 상상해주세요")
+    wall = get_input(inputs, "wall", "가장 좌절했던 순간의 구체적인 감정을 묘사해주세요")
+    epiphany = get_input(inputs, "epiphany", "모든 상황을 반전시킨 결정적 깨달음을 상상해주세요")
+    cta = get_input(inputs, "cta", "삶의 변화와 독자에게 줄 가치 있는 제안을 만들어주세요")
+
+    strategy = inputs.get("story_strategy") or "Standard"
+
+    strategy_instruction = ""
+    if strategy == "Soap":
+        strategy_instruction = """
+        [Strategy: Sequential Soap Opera (The Slide)]
+        - Each episode must follow Russell Brunson's Slide strategy.
+        - Ep 1 leads to Problem A, solved by epiphany, but discovers New Problem B.
+        - Ep 2 solves Problem B, but discovers New Problem C.
+        - Ep 3 solves Problem C, leading to the grand vision.
+        - Ep 4 presents the Final Offer as the ultimate solution for everything.
+        - High tension and constant 'What's next?' hooks.
+        """
+    else:
+        strategy_instruction = """
+        [Strategy: Standard 4-part Synopsis]
+        - Classic narrative arc: Hook -> Struggle -> Epiphany -> Result.
+        - Focus on a single coherent story divided into 4 parts.
+        """
+
+    prefix = """
+    # Role: Series Planning Lead Author (Soap Opera Specialist)
+    # Goal: Plan a 4-part Blog Series using Russell Brunson's Sequence & 2026 Naver SEO logic.
+
+    # [Strategy Guidelines - 2026 Naver SEO]
+    1. **Avoid AI Summary**: Focus on unique human 'Experience' and emotional narrative.
+    2. **Home Feed Strategy**: Use curiosity-driven titles and strong hooks.
+    3. **Maximize Dwell Time**: Use 'Open Loops' at the end of each episode to encourage reading the next one.
+
+    # [Task]
+    Create a 4-part synopsis based on the Strategy Choice given below.
+
+    # [Output Format]
+    Create a **[4-part Series Planning Table]** in Markdown:
+    - [Episode #]
+    - [Naver Home Feed Title] (Keyword + Clickable Copy)
+    - [Core Content] (Experience-focused summary)
+    - [Open Loop] (Ending sentence to hook into next episode)
+
+    Language: Korean.
+    """
+    tail = f"""
+    # Context Data:
+    - Hero (Character): {character}
+    - Audience (Dream Customer): {customer}
+
+    # Strategy Choice: {strategy}
+    {strategy_instruction}
+
+    # Input Data:
+    1. Secret/Opportunity: {secret}
+    2. The Wall (Failure): {wall}
+    3. The Epiphany (Solution): {epiphany}
+    4. Transformation/CTA: {cta}
+    """
+    return prefix, tail
+
+
+def prompt_step4(inputs, outputs):
+    synopsis = outputs.get("synopsis", "").strip()
+    character = outputs.get("character", "").strip()
+    episode = get_input(inputs, "episode", "제1화를 작성해주세요")
+    scene = get_input(inputs, "scene", "비참하거나 극적인 현장 분위기를 묘사해주세요")
+    inner = get_input(inputs, "inner", "절망적이거나 간절한 속마음을 묘사해주세요")
+
+    prefix = """
+    # Goal: Step 4. Write Content Draft (Story Alchemist)
+    # Task:
+    Write a high-immersion blog post draft for the Target Episode given below.
+    **Output strictly in Markdown.**
+
+    Structure:
+    - **Scene Setting**: (Sensory details)
+    - **Inner Monologue**: (Character's thoughts)
+    - **Dialogue**: (Conversation)
+    - **Action**: (What happens)
+    """
+    tail = f"""
+    # Target Episode: {episode}
+    # Deep Details:
+    - Scene Sensory: {scene}
+    - Inner Voice: {inner}
+    # Context:
+    - Synopsis: {synopsis}
+    - Character: {character}
+    """
+    return prefix, tail
+
+
+# Step 5 output formats: the markdown layout the app has always used, and
+# the structured (JSON) layout described by marketing_wizard_structured.STEP5_SCHEMA
+STEP5_MARKDOWN_FORMAT = """    # [Output Format - Strictly Follow This Structure]
+
+    ## 1. Title Options
+    - Provide 3 viral titles. (Mix curiosity & benefit).
+
+    ## 2. Blog Post Body
+
+    **[TL;DR Summary]**
+    - Start with "요약:" followed by 2 sentences summarizing the problem and solution.
+
+    **(Line Break)**
+
+    **[Intro: The Hook]**
+    - Start with a strong immersive scene or question from the draft.
+    - Empathize with the customer's pain immediately.
+    - **[Image Prompt for Nano Banana]**: Describe a high-quality 3D Pixar-style image depicting the tension or hook scene. (English description)
+
+    **[Body 1: The Wall (Problem Deep Dive)]**
+    - Describe the failure of the 'Old Way'. Why didn't it work?
+    - Use the Key Fact/Trend here to show this is a common problem.
+    - **[Image Prompt for Nano Banana]**: Describe a 3D Pixar-style image showing the frustration or the specific problem situation. (English description)
+
+    **[Body 2: The Epiphany (The Solution)]**
+    - The turning point. How did you discover the solution?
+    - Focus on the 'Aha!' moment and the new perspective.
+    - **[Image Prompt for Nano Banana]**: Describe a 3D Pixar-style image showing the moment of discovery, the 'magic tool', or the solution in action. (English description)
+
+    **[Body 3: The Offer (Benefit & Result)]**
+    - How the Product/Topic solves the problem specifically.
+    - Focus on the user's benefit and the happy result.
+    - **[Image Prompt for Nano Banana]**: Describe a 3D Pixar-style image showing the happy result, success, or the character enjoying the benefit. (English description)
+
+    **[Conclusion & CTA]**
+    - Summarize the main value.
+    - **Strong Call To Action**: Tell them exactly what to do next (e.g., "Click the link", "Add neighbor").
+
+    ## 3. Recommended Hashtags (10 Tags)
+    - Extract essential morphemes/keywords from:
+      1. Main Topic (Product/Topic)
+      2. Subheadings used above
+      3. Key content words
+    - Format: #Keyword1 #Keyword2 ... (Total 10)
+"""
+
+STEP5_JSON_FORMAT = """    # [Output Format - JSON]
+    Return one JSON object with these fields (no markdown fences, no text outside the JSON):
+    - "titles": 3 viral titles. (Mix curiosity & benefit).
+    - "tldr": Start with "요약:" followed by 2 sentences summarizing the problem and solution.
+    - "sections": exactly 4 objects in this order, each with "key", "heading", "body" and "image_prompt":
+      1. key "intro" (The Hook): a strong immersive scene or question from the draft; empathize with the customer's pain immediately.
+      2. key "wall" (Problem Deep Dive): why the 'Old Way' failed; use the Key Fact/Trend here to show this is a common problem.
+      3. key "epiphany" (The Solution): the turning point, the 'Aha!' moment and the new perspective.
+      4. key "offer" (Benefit & Result): how the Product/Topic solves the problem specifically; the user's benefit and the happy result.
+      "body" is the section text (short paragraphs separated by blank lines). "image_prompt" describes a high-quality 3D Pixar-style image for 'Nano Banana' (AI Artist) showing that section's scene, in English.
+    - "conclusion": Summarize the main value and end with a **Strong Call To Action** (e.g., "Click the link", "Add neighbor").
+    - "hashtags": 10 hashtags ("#Keyword") built from essential morphemes/keywords of the Main Topic (Product/Topic), the section headings and key content words.
+"""
+
+
+def prompt_step5(inputs, outputs, structured=False):
+    # 데이터 수집 (Step 1~4 결과물)
+    customer = outputs.get("customer", "").strip() 
+    synopsis = outputs.get("synopsis", "").strip() 
+    draft = outputs.get("draft", "").strip()
+
+    # UI 입력값
+    product = inputs.get("product", "").strip() 
+    nickname = get_input(inputs, "nickname", "신뢰감 있는 마케팅 전문가 닉네임")
+    facts = get_input(inputs, "facts", "관련된 최신 통계나 트렌드를 하나 가상으로 인용해주세요")
+
+    output_format = STEP5_JSON_FORMAT if structured else STEP5_MARKDOWN_FORMAT
+
+    # Persona & Strategy chosen in Steps 2/3, persona/rules file contents
+    persona_style = inputs.get("persona_style") or PERSONA_STYLES[0]
+    story_strategy = inputs.get("story_strategy") or "Standard"
+    persona_md = (inputs.get("persona_md") or "").strip()
+    writing_rules_md = (inputs.get("writing_rules_md") or "").strip()
+
+    external_blocks = ""
+    external_notice = ""
+    if persona_md or writing_rules_md:
+        external_notice = "\n# External Inputs\n- Follow these external rules strictly if provided; otherwise follow default rules.\n"
+    if persona_md:
+        external_blocks += f"\n# External Persona (from file)\n{persona_md}\n"
+    if writing_rules_md:
+        external_blocks += f"\n# External Writing Rules (from file)\n{writing_rules_md}\n"
+
+    prefix = f"""
+    # Role: Marketing Captain (Storytelling & Visual Director)
+    # Goal: Write a High-Retention Blog Post with Image Prompts for Each Section
+    {external_notice}
+    {external_blocks}
+
+    # [Writing Guidelines]
+    1. **Mobile First**: Short paragraphs (2-3 sentences max). Use line breaks frequently.
+    2. **Visual Thinking**: For every section, provide a specific image prompt for 'Nano Banana' (AI Artist).
+    3. **SEO**: Mention the Product/Topic (from the Context Data below) naturally 5+ times.
+    4. **Identity**: STRICTLY match the Selected Style and act as the human expert named in the Identity below. NEVER mention you are an AI.
+
+    ---
+{output_format}
+    ---
+    **Language:** Korean for the blog post. **English** for the Image Prompts.
+    """
+    tail = f"""
+    # Identity (Persona):
+    - Name: {nickname}
+    - Selected Style: {persona_style} (STRICTLY match this tone)
+    - Voice: Use the tone of '{persona_style}'.
+    - Rule: NEVER mention you are an AI. Act strictly as the human expert '{nickname}'.
+
+    # Context Data (Integrate these naturally):
+    - Story Strategy: {story_strategy}
+    - Product/Topic: {product}
+    - Target Customer: {customer} (Address them as 'you')
+    - Key Fact/Trend: {facts} (Use this to validate the problem in 'The Wall' section)
+    - Story Draft: {draft} (Expand this into the full narrative)
+    - Synopsis: {synopsis}
+    """
+    return prefix, tail
+
+
+PROMPT_BUILDERS = {
+    "customer": prompt_step1,
+    "character": prompt_step2,
+    "synopsis": prompt_step3,
+    "draft": prompt_step4,
+    "final_script": prompt_step5,
+}
+
+
+def build_prompt(step, inputs, outputs, structured=False):
+    # structured only affects Step 5 (JSON output mode)
+    if structured and step == "final_script":
+        return prompt_step5(inputs, outputs, structured=True)
+    return PROMPT_BUILDERS[step](inputs, outputs)
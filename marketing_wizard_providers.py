@@ -0,0 +1,494 @@
+# Async provider layer for Marketing Captain.
+# One asyncio event loop runs on a background thread and multiplexes every
+# Gemini / Claude request; the Tk app submits coroutines and receives results
+# through callbacks scheduled back onto the Tk mainloop.
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from marketing_wizard_cache import make_key
+from marketing_wizard_retry import RetryController, note_retry
+
+GEMINI_MODEL = "gemini-2.5-flash"
+CLAUDE_MODEL = "claude-sonnet-4-20250514"
+
+
+# Gemini explicit context caches are only worth their storage cost for large
+# prefixes (persona/rules files); smaller prefixes rely on implicit caching.
+GEMINI_EXPLICIT_CACHE_MIN_CHARS = 8000
+GEMINI_EXPLICIT_CACHE_TTL = 3600
+
+# One pooled keep-alive HTTP client serves both SDKs. Long keep-alive lets the
+# connection opened by warm_up() survive until the first real request.
+HTTP_POOL_LIMITS = {"max_connections": 32, "max_keepalive_connections": 16, "keepalive_expiry": 300}
+HTTP_TIMEOUT = {"timeout": 600, "connect": 10}
+
+
+def build_http_client():
+    import httpx
+    try:
+        import h2  # noqa: F401 - enables HTTP/2 multiplexing when installed
+        http2 = True
+    except ImportError:
+        http2 = False
+    return httpx.AsyncClient(
+        limits=httpx.Limits(**HTTP_POOL_LIMITS),
+        timeout=httpx.Timeout(HTTP_TIMEOUT["timeout"], connect=HTTP_TIMEOUT["connect"]),
+        http2=http2
+    )
+
+
+def model_for(provider):
+    return GEMINI_MODEL if provider == "google" else CLAUDE_MODEL
+
+
+# Prompts are either a plain string or a (static_prefix, variable_tail) tuple.
+# The prefix is sent as the system instruction so it stays byte-identical
+# across calls and can be served from the provider's prompt cache.
+def split_prompt(prompt):
+    if isinstance(prompt, tuple):
+        return prompt
+    return "", prompt
+
+
+def join_prompt(prompt):
+    prefix, tail = split_prompt(prompt)
+    return f"{prefix}\n{tail}" if prefix else tail
+
+
+# Structured output: callers pass a JSON Schema (lowercase types). Gemini
+# takes it as response_schema in its own dialect; Claude is forced to call a
+# tool whose input is the schema, and the tool input JSON is the response.
+STRUCTURED_TOOL_NAME = "structured_output"
+_GEMINI_SCHEMA_KEYS = {"minItems": "min_items", "maxItems": "max_items"}
+
+
+def gemini_schema(schema):
+    converted = {}
+    for key, value in schema.items():
+        if key == "type":
+            value = value.upper()
+        elif key == "properties":
+            value = {name: gemini_schema(prop) for name, prop in value.items()}
+            converted["property_ordering"] = list(value)
+        elif key == "items":
+            value = gemini_schema(value)
+        converted[_GEMINI_SCHEMA_KEYS.get(key, key)] = value
+    return converted
+
+
+def claude_request(prompt, max_tokens=8000, temperature=0.7, schema=None):
+    # Messages API body; also used as the params of Message Batches requests
+    prefix, tail = split_prompt(prompt)
+    request = {
+        "model": CLAUDE_MODEL,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "messages": [{"role": "user", "content": tail}]
+    }
+    if prefix:
+        request["system"] = [{"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}}]
+    if schema is not None:
+        request["tools"] = [{
+            "name": STRUCTURED_TOOL_NAME,
+            "description": "Return the complete response as these structured fields.",
+            "input_schema": schema
+        }]
+        request["tool_choice"] = {"type": "tool", "name": STRUCTURED_TOOL_NAME}
+    return request
+
+
+class ProviderLoop:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="provider-loop", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        # Returns a concurrent.futures.Future usable from any thread
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def shutdown(self):
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=2)
+
+
+class AsyncProviders:
+    def __init__(self, cache=None):
+        self.gemini = None
+        self.claude = None
+        self.http = None
+        self.keys = {"google": "", "claude": ""}
+        self._clients_ready = None
+        # HTTP pool -> calls still running on it; a pool replaced by connect()
+        # is closed by the last of them
+        self._http_users = {}
+        self._retired_http = set()
+        # Optional ResponseCache; lookups run in a worker thread so SQLite I/O
+        # never blocks the event loop.
+        self.cache = cache
+        # prefix hash -> (cached content name or None, expires_at)
+        self._gemini_prefix_caches = {}
+        self._gemini_prefix_lock = None
+        # Retries live here (SDK-level retries are disabled) so one policy and
+        # one budget per provider govern every call.
+        self.retry = RetryController()
+
+    def set_keys(self, google_key, claude_key):
+        # Called from the UI thread; the clients themselves are built by connect()
+        self.keys = {"google": google_key or "", "claude": claude_key or ""}
+
+    async def connect(self, warm=True):
+        # Build the SDK clients on the provider loop (never on the Tk thread)
+        # around one shared HTTP client, then pre-open a connection to each
+        # configured provider so the first real request skips DNS/TLS setup.
+        self._clients_ready = asyncio.Event()
+        old_http = self.http
+        try:
+            self.http = build_http_client()
+        except Exception as e:
+            print(f"HTTP Client Init Error: {e}")
+            self.http = None
+        self.gemini = self._build_gemini(self.keys["google"])
+        self.claude = self._build_claude(self.keys["claude"])
+        self._gemini_prefix_caches = {}
+        self._clients_ready.set()
+        if old_http is not None:
+            if self._http_users.get(old_http):
+                # In-flight streams/prefetches still hold SDK clients on it
+                self._retired_http.add(old_http)
+            else:
+                await old_http.aclose()
+        if warm:
+            await self.warm_up()
+
+    def _build_gemini(self, api_key):
+        if not api_key:
+            return None
+        try:
+            from google import genai
+            from google.genai import types
+            http_options = None
+            if self.http is not None:
+                http_options = types.HttpOptions(httpx_async_client=self.http)
+            return genai.Client(api_key=api_key, http_options=http_options).aio
+        except Exception as e:
+            print(f"Client Init Error: {e}")
+            return None
+
+    def _build_claude(self, api_key):
+        if not api_key:
+            return None
+        try:
+            import anthropic
+            try:
+                return anthropic.AsyncAnthropic(api_key=api_key, max_retries=0, http_client=self.http)
+            except TypeError:
+                # SDK builds on its own httpx fork; give it an equally tuned pool
+                import httpx
+                http_client = anthropic.DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(**HTTP_POOL_LIMITS),
+                    timeout=httpx.Timeout(HTTP_TIMEOUT["timeout"], connect=HTTP_TIMEOUT["connect"])
+                )
+                return anthropic.AsyncAnthropic(api_key=api_key, max_retries=0, http_client=http_client)
+        except Exception as e:
+            print(f"Claude Init Error: {e}")
+            return None
+
+    async def warm_up(self):
+        # Cheap metadata calls (no tokens billed) through the pooled clients
+        async def warm(name, call):
+            started = time.perf_counter()
+            try:
+                await call()
+                print(f"DEBUG: Warmed {name} connection in {time.perf_counter() - started:.2f}s")
+            except Exception as e:
+                print(f"DEBUG: Warm-up for {name} failed: {e}")
+
+        calls = []
+        if self.gemini is not None:
+            calls.append(warm("google", lambda: self.gemini.models.get(model=GEMINI_MODEL)))
+        if self.claude is not None:
+            calls.append(warm("claude", lambda: self.claude.models.list(limit=1)))
+        if calls:
+            await asyncio.gather(*calls)
+
+    async def wait_ready(self):
+        if self._clients_ready is not None:
+            await self._clients_ready.wait()
+
+    @asynccontextmanager
+    async def _using_http(self):
+        # Pins the current pool (and the clients built on it) for one call
+        http = self.http
+        if http is not None:
+            self._http_users[http] = self._http_users.get(http, 0) + 1
+        try:
+            yield
+        finally:
+            if http is not None:
+                self._http_users[http] -= 1
+                if not self._http_users[http]:
+                    del self._http_users[http]
+                    if http in self._retired_http:
+                        self._retired_http.discard(http)
+                        await http.aclose()
+
+    def is_ready(self, provider):
+        # True once a key is configured; clients may still be connecting
+        return bool(self.keys.get(provider))
+
+    def _client(self, provider):
+        client = self.gemini if provider == "google" else self.claude
+        if client is None:
+            raise RuntimeError(f"{provider} client is not available (check the API key)")
+        return client
+
+    async def cache_lookup(self, provider, prompt, max_tokens=8000, temperature=0.7, schema=None):
+        if self.cache is None:
+            return None
+        key = make_key(provider, model_for(provider), join_prompt(prompt), temperature, max_tokens, schema)
+        return await asyncio.to_thread(self.cache.get, key)
+
+    async def cache_store(self, provider, prompt, result, max_tokens=8000, temperature=0.7, schema=None):
+        if self.cache is None or not result:
+            return
+        key = make_key(provider, model_for(provider), join_prompt(prompt), temperature, max_tokens, schema)
+        await asyncio.to_thread(self.cache.put, key, provider, model_for(provider), result)
+
+    async def _gemini_prefix_cache(self, prefix):
+        # Explicit context cache for a large static prefix, reused until it expires
+        if len(prefix) < GEMINI_EXPLICIT_CACHE_MIN_CHARS:
+            return None
+        if self._gemini_prefix_lock is None:
+            self._gemini_prefix_lock = asyncio.Lock()
+        digest = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        async with self._gemini_prefix_lock:
+            entry = self._gemini_prefix_caches.get(digest)
+            if entry and entry[1] > time.monotonic():
+                return entry[0]
+            from google.genai import types
+            try:
+                cached = await self.gemini.caches.create(
+                    model=GEMINI_MODEL,
+                    config=types.CreateCachedContentConfig(
+                        system_instruction=prefix,
+                        ttl=f"{GEMINI_EXPLICIT_CACHE_TTL}s",
+                        display_name=f"marketing-wizard-{digest[:12]}"
+                    )
+                )
+                name = cached.name
+                print(f"DEBUG: Gemini context cache created {name} ({len(prefix)} chars)")
+            except Exception as e:
+                # e.g. prefix below the model's minimum; fall back to implicit caching
+                print(f"DEBUG: Gemini context cache unavailable: {e}")
+                name = None
+            # Refresh a little before the server-side TTL runs out
+            self._gemini_prefix_caches[digest] = (name, time.monotonic() + GEMINI_EXPLICIT_CACHE_TTL - 60)
+            return name
+
+    async def _gemini_request(self, prompt, max_tokens, temperature, schema=None):
+        from google.genai import types
+        prefix, tail = split_prompt(prompt)
+        config = types.GenerateContentConfig(
+            max_output_tokens=max_tokens,
+            temperature=temperature
+        )
+        if schema is not None:
+            # Structured output: the reply is JSON matching the schema
+            config.response_mime_type = "application/json"
+            config.response_schema = gemini_schema(schema)
+        if prefix:
+            cache_name = await self._gemini_prefix_cache(prefix)
+            if cache_name:
+                config.cached_content = cache_name
+            else:
+                config.system_instruction = prefix
+        return {"model": GEMINI_MODEL, "contents": tail, "config": config}
+
+    def _claude_request(self, prompt, max_tokens, temperature, schema=None):
+        return claude_request(prompt, max_tokens, temperature, schema)
+
+    def _record_usage(self, provider, raw, usage):
+        if usage is None or raw is None:
+            return
+        if provider == "google":
+            usage["input_tokens"] = raw.prompt_token_count or 0
+            usage["output_tokens"] = raw.candidates_token_count or 0
+            usage["cache_read_tokens"] = raw.cached_content_token_count or 0
+            usage["cache_creation_tokens"] = 0
+        else:
+            usage["input_tokens"] = raw.input_tokens or 0
+            usage["output_tokens"] = raw.output_tokens or 0
+            usage["cache_read_tokens"] = getattr(raw, "cache_read_input_tokens", 0) or 0
+            usage["cache_creation_tokens"] = getattr(raw, "cache_creation_input_tokens", 0) or 0
+
+    async def generate(self, provider, prompt, max_tokens=8000, temperature=0.7, usage=None, schema=None):
+        # usage, if given, is filled with token counts (including prompt-cache
+        # reads/creations) and the number of retries the call needed; schema
+        # (JSON Schema) makes the response a JSON document matching it
+        return await self.retry.run(
+            provider,
+            lambda: self._generate_once(provider, prompt, max_tokens, temperature, usage, schema),
+            usage
+        )
+
+    async def stream(self, provider, prompt, max_tokens=8000, temperature=0.7, usage=None, schema=None):
+        # Async generator of text deltas. A stream is only retried while it has
+        # not produced any text yet; once deltas reached the caller, replaying
+        # would duplicate output, so later failures are raised as-is.
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            emitted = False
+            try:
+                async for delta in self._stream_once(provider, prompt, max_tokens, temperature, usage, schema):
+                    emitted = True
+                    yield delta
+                self.retry.record_success(provider)
+                return
+            except Exception as exc:
+                delay = None if emitted else self.retry.next_delay(provider, exc, attempt)
+                if delay is None:
+                    raise
+                note_retry(provider, exc, attempt, delay, time.perf_counter() - started, usage)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _generate_once(self, provider, prompt, max_tokens, temperature, usage, schema=None):
+        await self.wait_ready()
+        async with self._using_http():
+            if provider == "google":
+                response = await self._client(provider).models.generate_content(
+                    **await self._gemini_request(prompt, max_tokens, temperature, schema)
+                )
+                self._record_usage(provider, response.usage_metadata, usage)
+                return response.text or ""
+            response = await self._client(provider).messages.create(**self._claude_request(prompt, max_tokens, temperature, schema))
+            self._record_usage(provider, response.usage, usage)
+            if schema is not None:
+                for block in response.content:
+                    if block.type == "tool_use":
+                        return json.dumps(block.input, ensure_ascii=False)
+                return ""
+            return response.content[0].text if response.content else ""
+
+    async def _stream_once(self, provider, prompt, max_tokens, temperature, usage, schema=None):
+        await self.wait_ready()
+        async with self._using_http():
+            if provider == "google":
+                chunks = await self._client(provider).models.generate_content_stream(
+                    **await self._gemini_request(prompt, max_tokens, temperature, schema)
+                )
+                try:
+                    async for chunk in chunks:
+                        if chunk.usage_metadata:
+                            self._record_usage(provider, chunk.usage_metadata, usage)
+                        if chunk.text:
+                            yield chunk.text
+                finally:
+                    # Close the HTTP stream right away on cancellation / early exit
+                    if hasattr(chunks, "aclose"):
+                        await chunks.aclose()
+                return
+            async with self._client(provider).messages.stream(**self._claude_request(prompt, max_tokens, temperature, schema)) as stream:
+                if schema is None:
+                    async for delta in stream.text_stream:
+                        if delta:
+                            yield delta
+                else:
+                    # The forced tool call's input arrives as partial JSON deltas
+                    async for event in stream:
+                        if event.type == "content_block_delta" and event.delta.type == "input_json_delta" and event.delta.partial_json:
+                            yield event.delta.partial_json
+                final = await stream.get_final_message()
+                self._record_usage(provider, final.usage, usage)
+
+
+class FakeProviders(AsyncProviders):
+    # Offline stand-in with the AsyncProviders interface. Responses are
+    # deterministic per prompt and shaped like the real steps' output (series
+    # table, Nano Banana image prompts), so the service, the pipeline and the
+    # caches can be exercised without keys or network access.
+    def __init__(self, cache=None, latency=0.2, chunk_delay=0.02, chunk_chars=24):
+        super().__init__(cache)
+        self.keys = {"google": "fake", "claude": "fake"}
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_chars = chunk_chars
+
+    def set_keys(self, google_key, claude_key):
+        pass
+
+    async def connect(self, warm=True):
+        self._clients_ready = asyncio.Event()
+        self._clients_ready.set()
+
+    def is_ready(self, provider):
+        return provider in self.keys
+
+    def reply(self, provider, prompt):
+        text = join_prompt(prompt)
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:8]
+        lines = [f"# Fake {provider} response {digest}", "", f"Prompt: {len(text)} chars."]
+        if "Series Planning Table" in text:
+            lines += ["", "| 회차 | 제목 | 핵심 내용 | 오픈 루프 |", "|---|---|---|---|"]
+            lines += [f"| {n}화 | 제목 {n} | 내용 {n} | 다음 화 예고 {n} |" for n in range(1, 5)]
+        if "Nano Banana" in text:
+            for n in range(1, 5):
+                lines += ["", f"## Section {n}", f"**[Image Prompt for Nano Banana]**: fake section {n} illustration"]
+        return "\n".join(lines)
+
+    def reply_json(self, provider, prompt, schema):
+        # A document matching the schema (arrays get minItems elements); also
+        # reads gemini_schema() output, as sent by the batch stand-in's clients
+        digest = hashlib.sha256(join_prompt(prompt).encode("utf-8")).hexdigest()[:8]
+
+        def build(node, name, index=0):
+            kind = (node.get("type") or "").lower()
+            if kind == "object":
+                return {key: build(prop, key, index) for key, prop in node.get("properties", {}).items()}
+            if kind == "array":
+                count = node.get("minItems", node.get("min_items", 2))
+                return [build(node["items"], name, i) for i in range(count)]
+            if "enum" in node:
+                return node["enum"][index % len(node["enum"])]
+            if kind in ("integer", "number"):
+                return index
+            if kind == "boolean":
+                return True
+            return f"fake {provider} {name} {index + 1} {digest}"
+
+        return json.dumps(build(schema, "response"), ensure_ascii=False)
+
+    def _fake_usage(self, prompt, text, usage):
+        if usage is not None:
+            usage["input_tokens"] = len(join_prompt(prompt)) // 4
+            usage["output_tokens"] = len(text) // 4
+            usage["cache_read_tokens"] = 0
+            usage["cache_creation_tokens"] = 0
+
+    async def _generate_once(self, provider, prompt, max_tokens, temperature, usage, schema=None):
+        await asyncio.sleep(self.latency)
+        text = self.reply(provider, prompt) if schema is None else self.reply_json(provider, prompt, schema)
+        self._fake_usage(prompt, text, usage)
+        return text
+
+    async def _stream_once(self, provider, prompt, max_tokens, temperature, usage, schema=None):
+        await asyncio.sleep(self.latency)
+        text = self.reply(provider, prompt) if schema is None else self.reply_json(provider, prompt, schema)
+        for i in range(0, len(text), self.chunk_chars):
+            await asyncio.sleep(self.chunk_delay)
+            yield text[i:i + self.chunk_chars]
+        self._fake_usage(prompt, text, usage)
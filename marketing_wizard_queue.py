@@ -0,0 +1,363 @@
+# Durable job queue on SQLite for batch and service jobs.
+# Jobs (payload = step inputs, result stored alongside) survive restarts.
+# Workers lease jobs for a limited time and keep the lease alive with
+# heartbeats; a lease that runs out (process killed, laptop asleep) makes the
+# job available again, and a job that keeps failing moves to the dead-letter
+# state after max_attempts. Leasing happens inside BEGIN IMMEDIATE, so any
+# number of worker processes on one machine can pull from the same file
+# without double-processing.
+#
+#   python marketing_wizard_queue.py enqueue products.csv --persona persona.md
+#   python marketing_wizard_queue.py work --processes 4
+#   python marketing_wizard_queue.py status
+#   python marketing_wizard_queue.py results > results.jsonl
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+QUEUE_FILE = "job_queue.sqlite3"
+DEFAULT_QUEUE = "pipeline"
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 30
+POLL_SECONDS = 2.0
+
+STATUSES = ("queued", "leased", "done", "dead", "cancelled")
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class JobQueue:
+    def __init__(self, path=QUEUE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        # Autocommit mode; writes open their own BEGIN IMMEDIATE transaction
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " queue TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " max_attempts INTEGER NOT NULL,"
+            " lease_owner TEXT,"
+            " lease_expires REAL,"
+            " available_at REAL NOT NULL,"
+            " progress TEXT,"
+            " result TEXT,"
+            " error TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs(queue, status, available_at)")
+
+    @contextmanager
+    def _write(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def enqueue(self, payload, queue=DEFAULT_QUEUE, job_id=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        # Re-enqueueing an existing id is a no-op, so feeding the same file twice is safe
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self._write() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO jobs (id, queue, payload, status, max_attempts, available_at, created_at, updated_at)"
+                " VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, queue, json.dumps(payload, ensure_ascii=False), max_attempts, now, now, now)
+            )
+        return job_id
+
+    def lease(self, owner, queue=DEFAULT_QUEUE, lease_seconds=DEFAULT_LEASE_SECONDS, limit=1):
+        now = time.time()
+        with self._write() as conn:
+            # Expired leases whose attempts are used up go to the dead letters
+            conn.execute(
+                "UPDATE jobs SET status = 'dead', error = COALESCE(error, 'lease expired'), lease_owner = NULL,"
+                " updated_at = ? WHERE queue = ? AND status = 'leased' AND lease_expires < ? AND attempts >= max_attempts",
+                (now, queue, now)
+            )
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE queue = ? AND ("
+                " (status = 'queued' AND available_at <= ?) OR (status = 'leased' AND lease_expires < ?))"
+                " ORDER BY created_at LIMIT ?",
+                (queue, now, now, limit)
+            ).fetchall()
+            ids = [row["id"] for row in rows]
+            conn.executemany(
+                "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1,"
+                " updated_at = ? WHERE id = ?",
+                [(owner, now + lease_seconds, now, job_id) for job_id in ids]
+            )
+        return [self.get(job_id) for job_id in ids]
+
+    def _update_leased(self, job_id, owner, sql, params):
+        with self._write() as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET {sql}, updated_at = ? WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (*params, time.time(), job_id, owner)
+            )
+            return cursor.rowcount == 1
+
+    def heartbeat(self, job_id, owner, lease_seconds=DEFAULT_LEASE_SECONDS):
+        # False means the lease was lost (expired and taken over, or cancelled)
+        return self._update_leased(job_id, owner, "lease_expires = ?", (time.time() + lease_seconds,))
+
+    def checkpoint(self, job_id, owner, progress):
+        return self._update_leased(job_id, owner, "progress = ?", (json.dumps(progress, ensure_ascii=False),))
+
+    def ack(self, job_id, owner, result):
+        return self._update_leased(
+            job_id, owner, "status = 'done', result = ?, error = NULL, lease_owner = NULL, lease_expires = NULL",
+            (json.dumps(result, ensure_ascii=False),)
+        )
+
+    def fail(self, job_id, owner, error, retry_delay=RETRY_DELAY_SECONDS):
+        # Back to the queue after retry_delay, or dead once attempts are used up
+        with self._write() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'dead' ELSE 'queued' END,"
+                " error = ?, lease_owner = NULL, lease_expires = NULL, available_at = ?, updated_at = ?"
+                " WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (error, time.time() + retry_delay, time.time(), job_id, owner)
+            )
+            return cursor.rowcount == 1
+
+    def cancel(self, job_id):
+        with self._write() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'cancelled', lease_owner = NULL, lease_expires = NULL, updated_at = ?"
+                " WHERE id = ? AND status IN ('queued', 'leased')",
+                (time.time(), job_id)
+            )
+            return cursor.rowcount == 1
+
+    def requeue_dead(self, queue=DEFAULT_QUEUE):
+        with self._write() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued', attempts = 0, available_at = ?, updated_at = ?"
+                " WHERE queue = ? AND status = 'dead'",
+                (time.time(), time.time(), queue)
+            )
+            return cursor.rowcount
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        for field in ("payload", "progress", "result"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        return job
+
+    def list(self, queue=DEFAULT_QUEUE, status=None):
+        sql = "SELECT id FROM jobs WHERE queue = ?"
+        params = [queue]
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        with self._lock:
+            ids = [row["id"] for row in self._conn.execute(sql + " ORDER BY created_at", params)]
+        return [self.get(job_id) for job_id in ids]
+
+    def stats(self, queue=DEFAULT_QUEUE):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs WHERE queue = ? GROUP BY status", (queue,)
+            ).fetchall()
+        counts = {status: 0 for status in STATUSES}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+async def run_leased(queue, job, owner, work, lease_seconds=DEFAULT_LEASE_SECONDS):
+    # Runs work() while heartbeating the lease; acks the result, records the
+    # failure, or abandons the work if another worker took the lease over.
+    task = asyncio.ensure_future(work())
+    lost = False
+    interval = max(1.0, lease_seconds / 3)
+    try:
+        while not task.done():
+            await asyncio.wait({task}, timeout=interval)
+            if not task.done() and not await asyncio.to_thread(queue.heartbeat, job["id"], owner, lease_seconds):
+                print(f"DEBUG: Lost lease on {job['id']}; abandoning it", file=sys.stderr)
+                lost = True
+                task.cancel()
+        result = await task
+    except asyncio.CancelledError:
+        if not lost:
+            task.cancel()
+            raise
+        return None
+    except Exception as e:
+        await asyncio.to_thread(queue.fail, job["id"], owner, f"{type(e).__name__}: {e}")
+        raise
+    await asyncio.to_thread(queue.ack, job["id"], owner, result)
+    return result
+
+
+# --- Pipeline worker CLI ---
+async def work_loop(options):
+    from marketing_wizard_pipeline import Pipeline, create_runtime, load_settings
+
+    queue = JobQueue(options["db"])
+    settings = load_settings(options["config"])
+    providers, scheduler = await create_runtime(settings, options["max_inflight"], options["use_cache"])
+    provider = options["provider"] or settings.get("api_provider", "google")
+    owner = worker_id()
+    slots = asyncio.Semaphore(max(1, options["concurrency"]))
+    running = set()
+
+    async def process(job):
+        payload = job["payload"]
+        pipeline = Pipeline(providers, scheduler, payload.get("provider") or provider, options["use_cache"],
+                            not options["no_image_prompts"])
+
+        async def save_step(step, record):
+            await asyncio.to_thread(queue.checkpoint, job["id"], owner, record["outputs"])
+
+        async def work():
+            item = payload["item"]
+            record = await pipeline.run_item(item, outputs=job["progress"], on_step=save_step)
+            if record["error"]:
+                raise RuntimeError(record["error"])
+            return record
+
+        try:
+            await run_leased(queue, job, owner, work, options["lease_seconds"])
+            print(f"done {job['id']}", file=sys.stderr)
+        except Exception as e:
+            print(f"failed {job['id']} (attempt {job['attempts']}): {e}", file=sys.stderr)
+        finally:
+            slots.release()
+
+    idle_since = time.monotonic()
+    while True:
+        await slots.acquire()
+        jobs = await asyncio.to_thread(queue.lease, owner, options["queue"], options["lease_seconds"], 1)
+        if not jobs:
+            slots.release()
+            if options["exit_when_idle"] and not running and time.monotonic() - idle_since > POLL_SECONDS * 2:
+                return
+            await asyncio.sleep(POLL_SECONDS)
+            continue
+        idle_since = time.monotonic()
+        task = asyncio.create_task(process(jobs[0]))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+
+def worker_main(options):
+    try:
+        asyncio.run(work_loop(options))
+    except KeyboardInterrupt:
+        pass
+
+
+def build_parser():
+    from marketing_wizard_pipeline import CONFIG_FILE
+
+    parser = argparse.ArgumentParser(description="Durable Marketing Captain job queue.")
+    parser.add_argument("--db", default=QUEUE_FILE)
+    parser.add_argument("--queue", default=DEFAULT_QUEUE)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="add one pipeline job per CSV/JSONL row")
+    enqueue.add_argument("input")
+    enqueue.add_argument("--persona", help="Persona .md file applied to every item")
+    enqueue.add_argument("--rules", help="Writing Rules .md file applied to every item")
+    enqueue.add_argument("--provider", choices=["google", "claude"])
+    enqueue.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+
+    work = commands.add_parser("work", help="lease and run jobs until interrupted")
+    work.add_argument("--processes", type=int, default=1)
+    work.add_argument("--concurrency", type=int, default=4, help="jobs in progress per process")
+    work.add_argument("--max-inflight", type=int, help="provider requests in flight per process")
+    work.add_argument("--provider", choices=["google", "claude"], help="default for jobs without one")
+    work.add_argument("--lease-seconds", type=int, default=DEFAULT_LEASE_SECONDS)
+    work.add_argument("--config", default=CONFIG_FILE)
+    work.add_argument("--no-cache", action="store_true")
+    work.add_argument("--no-image-prompts", action="store_true")
+    work.add_argument("--exit-when-idle", action="store_true", help="stop once the queue is drained")
+
+    commands.add_parser("status", help="job counts and dead letters")
+    commands.add_parser("results", help="finished results as JSONL on stdout")
+    commands.add_parser("requeue-dead", help="give dead-lettered jobs another round of attempts")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "work":
+        options = {
+            "db": args.db, "queue": args.queue, "config": args.config, "provider": args.provider,
+            "concurrency": args.concurrency, "max_inflight": args.max_inflight,
+            "lease_seconds": args.lease_seconds, "use_cache": not args.no_cache,
+            "no_image_prompts": args.no_image_prompts, "exit_when_idle": args.exit_when_idle,
+        }
+        JobQueue(args.db).close()
+        processes = [multiprocessing.Process(target=worker_main, args=(options,)) for _ in range(max(1, args.processes))]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            # Leases of unfinished jobs expire and another worker picks them up
+            for process in processes:
+                process.join()
+        return 0
+
+    queue = JobQueue(args.db)
+    if args.command == "enqueue":
+        from marketing_wizard_pipeline import normalize_item, read_items, read_text_file
+
+        base_dir = os.path.dirname(os.path.abspath(args.input))
+        persona_md = read_text_file(args.persona)
+        rules_md = read_text_file(args.rules)
+        rows = read_items(args.input)
+        for i, row in enumerate(rows):
+            item = normalize_item(row, i, base_dir, persona_md, rules_md)
+            queue.enqueue({"item": item, "provider": args.provider}, args.queue, f"{args.queue}:{item['id']}", args.max_attempts)
+        print(f"Enqueued {len(rows)} items; {queue.stats(args.queue)}", file=sys.stderr)
+    elif args.command == "status":
+        print(json.dumps(queue.stats(args.queue)))
+        for job in queue.list(args.queue, "dead"):
+            print(f"dead {job['id']} after {job['attempts']} attempts: {job['error']}")
+    elif args.command == "results":
+        for job in queue.list(args.queue, "done"):
+            sys.stdout.write(json.dumps(job["result"], ensure_ascii=False) + "\n")
+    elif args.command == "requeue-dead":
+        print(f"Requeued {queue.requeue_dead(args.queue)} jobs", file=sys.stderr)
+    queue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
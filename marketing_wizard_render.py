@@ -0,0 +1,94 @@
+# Frame-budgeted text rendering for the output panes.
+# Streaming deltas and the typewriter reveal used to be one root.after
+# callback (insert + see(END)) per few characters, per pane. TextRenderer
+# instead keeps the pending text of every pane and flushes it on a single
+# timer, one insert and one scroll per pane per frame, and stops a frame
+# early once its time budget is used so input events are not starved.
+import time
+import tkinter as tk
+
+FRAME_MS = 16
+FRAME_BUDGET_MS = 6
+# Typewriter reveal: finishes in about ANIMATION_FRAMES frames; longer
+# texts (and cached results) are shown at once
+ANIMATION_FRAMES = 45
+MIN_CHARS_PER_FRAME = 8
+MAX_ANIMATED_CHARS = 4000
+
+
+class TextRenderer:
+    # Only used from the Tk thread
+    def __init__(self, root, frame_ms=FRAME_MS, budget_ms=FRAME_BUDGET_MS):
+        self.root = root
+        self.frame_ms = frame_ms
+        self.budget = budget_ms / 1000
+        # widget -> [text, shown, chars per frame (None = all pending)]
+        self.pending = {}
+        self.timer = None
+
+    def show(self, widget, text, animate=True):
+        # Replace the pane's content, typed out over a few frames if short
+        self.cancel(widget)
+        widget.delete("1.0", tk.END)
+        if not animate or len(text) > MAX_ANIMATED_CHARS:
+            widget.insert(tk.END, text)
+            widget.see(tk.END)
+            return
+        rate = max(MIN_CHARS_PER_FRAME, -(-len(text) // ANIMATION_FRAMES))
+        self.pending[widget] = [text, 0, rate]
+        self._schedule()
+
+    def append(self, widget, text, clear=False):
+        # Streamed delta; everything pending is written on the next frame
+        if clear:
+            self.cancel(widget)
+            widget.delete("1.0", tk.END)
+        entry = self.pending.get(widget)
+        if entry is None:
+            self.pending[widget] = [text, 0, None]
+        else:
+            entry[0] += text
+        self._schedule()
+
+    def finish(self, widget):
+        # Write out whatever is still pending (before inserting a message)
+        entry = self.pending.pop(widget, None)
+        if entry is not None:
+            self._write(widget, entry[0][entry[1]:])
+
+    def cancel(self, widget):
+        self.pending.pop(widget, None)
+
+    def busy(self, widget):
+        # True while text for the pane is still waiting to be written
+        return widget in self.pending
+
+    def _schedule(self):
+        if self.timer is None and self.pending:
+            self.timer = self.root.after(self.frame_ms, self._flush)
+
+    def _flush(self):
+        self.timer = None
+        deadline = time.perf_counter() + self.budget
+        for widget in list(self.pending):
+            if time.perf_counter() > deadline:
+                break
+            # Re-inserted at the end so panes left over share the next frame
+            text, shown, rate = self.pending.pop(widget)
+            end = len(text) if rate is None else min(len(text), shown + rate)
+            if not self._write(widget, text[shown:end]):
+                continue
+            if end < len(text):
+                self.pending[widget] = [text, end, rate]
+        self._schedule()
+
+    def _write(self, widget, text):
+        if not text:
+            return True
+        try:
+            widget.insert(tk.END, text)
+            widget.see(tk.END)
+        except tk.TclError:
+            # Pane was destroyed while text was pending
+            return False
+        return True
@@ -0,0 +1,185 @@
+# Rate-limit-aware retries for Gemini / Claude calls.
+# Errors are classified as retryable (429, overloads, 5xx, transient network
+# failures) or fatal. Retryable calls back off exponentially with full jitter,
+# never sooner than a server-provided Retry-After hint (or, for 429s, the
+# quota-reset time), and draw from a per-provider retry budget so retries
+# cannot amplify an outage.
+import asyncio
+import json
+import random
+import re
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+TRANSIENT_ERROR_NAMES = {
+    "APIConnectionError", "APITimeoutError", "TransportError", "TimeoutException",
+    "NetworkError", "RemoteProtocolError", "ReadError", "WriteError", "ConnectError",
+}
+RESET_HEADERS = (
+    "anthropic-ratelimit-requests-reset",
+    "anthropic-ratelimit-tokens-reset",
+    "anthropic-ratelimit-input-tokens-reset",
+    "anthropic-ratelimit-output-tokens-reset",
+)
+_RETRY_DELAY_RE = re.compile(r"retryDelay['\"]?\s*[:=]\s*['\"]?([\d.]+)s")
+
+
+def error_status(exc):
+    for attr in ("status_code", "code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def _parse_retry_after(value, now):
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - now).total_seconds())
+    except Exception:
+        return None
+
+
+def retry_after_hint(exc):
+    # Seconds the server asked us to wait, if it said so
+    now = datetime.now(timezone.utc)
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        hint = _parse_retry_after(headers.get("retry-after"), now)
+        if hint is not None:
+            return hint
+        resets = []
+        for name in RESET_HEADERS:
+            if headers.get(name):
+                reset = datetime.fromisoformat(headers[name].replace("Z", "+00:00"))
+                resets.append((reset - now).total_seconds())
+        # The reset headers come with every Claude response; they only say when
+        # to retry if the limit was actually hit. 5xx keep the jittered backoff.
+        if resets and error_status(exc) == 429:
+            return max(0.0, min(resets))
+    except Exception:
+        pass
+    # Gemini quota errors carry google.rpc.RetryInfo in the error details
+    details = getattr(exc, "details", None)
+    text = json.dumps(details, ensure_ascii=False, default=str) if details else str(exc)
+    match = _RETRY_DELAY_RE.search(text)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def is_retryable(exc):
+    if isinstance(exc, asyncio.CancelledError):
+        return False
+    status = error_status(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if names & TRANSIENT_ERROR_NAMES:
+        return True
+    return isinstance(exc, (ConnectionError, TimeoutError, asyncio.TimeoutError))
+
+
+class RetryBudget:
+    # Token bucket: every success deposits `ratio` tokens, every retry spends
+    # one. When the bucket is empty, failures surface immediately.
+    def __init__(self, capacity=10.0, ratio=0.2):
+        self.capacity = float(capacity)
+        self.ratio = float(ratio)
+        self.tokens = float(capacity)
+
+    def record_success(self):
+        self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def try_spend(self):
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=30.0, max_hint=120.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_hint = max_hint
+
+    def backoff(self, attempt, hint=None):
+        # Full jitter: uniform(0, min(cap, base * 2^attempt))
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if hint is not None:
+            delay = max(delay, min(hint, self.max_hint) + random.uniform(0, 1))
+        return delay
+
+
+class RetryController:
+    def __init__(self, policy=None):
+        self.policy = policy or RetryPolicy()
+        self.budgets = {}
+        self.stats = {}
+
+    def _stats(self, provider):
+        return self.stats.setdefault(provider, {
+            "calls": 0, "retries": 0, "gave_up": 0, "budget_exhausted": 0, "fatal": 0,
+        })
+
+    def budget(self, provider):
+        return self.budgets.setdefault(provider, RetryBudget())
+
+    def record_success(self, provider):
+        self._stats(provider)["calls"] += 1
+        self.budget(provider).record_success()
+
+    def next_delay(self, provider, exc, attempt):
+        # Returns seconds to sleep before the next attempt, or None to give up
+        stats = self._stats(provider)
+        if not is_retryable(exc):
+            stats["fatal"] += 1
+            return None
+        if attempt + 1 >= self.policy.max_attempts:
+            stats["gave_up"] += 1
+            return None
+        if not self.budget(provider).try_spend():
+            stats["budget_exhausted"] += 1
+            return None
+        stats["retries"] += 1
+        return self.policy.backoff(attempt, retry_after_hint(exc))
+
+    async def run(self, provider, call, telemetry=None):
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                result = await call()
+                self.record_success(provider)
+                return result
+            except Exception as exc:
+                delay = self.next_delay(provider, exc, attempt)
+                if delay is None:
+                    raise
+                note_retry(provider, exc, attempt, delay, time.perf_counter() - started, telemetry)
+                await asyncio.sleep(delay)
+                attempt += 1
+
+
+def note_retry(provider, exc, attempt, delay, elapsed, telemetry=None):
+    status = error_status(exc)
+    print(
+        f"DEBUG: Retry {attempt + 1} for {provider} after {type(exc).__name__}"
+        f"{f' ({status})' if status else ''} in {elapsed:.2f}s; sleeping {delay:.2f}s"
+    )
+    if telemetry is not None:
+        telemetry["retries"] = telemetry.get("retries", 0) + 1
+        telemetry.setdefault("retry_errors", []).append(f"{type(exc).__name__}:{status or ''}")
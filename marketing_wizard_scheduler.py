@@ -0,0 +1,93 @@
+# Bounded, prioritized request scheduler.
+# Every provider call takes a slot before it touches the network, so the
+# number of in-flight requests never exceeds max_inflight. Waiting calls are
+# served by priority class first, then in submission order. A hedged request
+# (marketing_wizard_hedge) counts once although it may have two calls open.
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+PRIORITY_INTERACTIVE = 0   # step text the user is waiting for
+PRIORITY_IMAGE_PROMPT = 1  # image-prompt rewrites
+PRIORITY_BACKGROUND = 2    # batch / speculative work
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_IMAGE_PROMPT: "image_prompt",
+    PRIORITY_BACKGROUND: "background",
+}
+
+DEFAULT_MAX_INFLIGHT = 4
+
+
+class RequestScheduler:
+    # All methods except stats() must be called on the provider loop thread.
+    def __init__(self, max_inflight=DEFAULT_MAX_INFLIGHT):
+        self.max_inflight = max(1, int(max_inflight))
+        self._inflight = 0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._wait_times = deque(maxlen=200)
+        self._completed = 0
+
+    def set_limit(self, max_inflight):
+        self.max_inflight = max(1, int(max_inflight))
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self._inflight < self.max_inflight:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._inflight += 1
+            future.set_result(None)
+
+    async def acquire(self, priority=PRIORITY_INTERACTIVE):
+        queued_at = time.perf_counter()
+        if self._inflight < self.max_inflight and not self._waiters:
+            self._inflight += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiters, (priority, next(self._seq), future))
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # Slot was granted just before cancellation; give it back
+                    self.release()
+                raise
+        self._wait_times.append(time.perf_counter() - queued_at)
+
+    def release(self):
+        self._inflight = max(0, self._inflight - 1)
+        self._completed += 1
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self, priority=PRIORITY_INTERACTIVE, label=""):
+        await self.acquire(priority)
+        if label:
+            print(f"DEBUG: Slot acquired for {label} ({PRIORITY_NAMES.get(priority, priority)}), in-flight={self._inflight}")
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future in list(self._waiters):
+            if not future.done():
+                queued[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        waits = list(self._wait_times)
+        return {
+            "max_inflight": self.max_inflight,
+            "inflight": self._inflight,
+            "queued": sum(queued.values()),
+            "queued_by_priority": queued,
+            "completed": self._completed,
+            "avg_wait": (sum(waits) / len(waits)) if waits else 0.0,
+            "max_wait": max(waits) if waits else 0.0,
+        }
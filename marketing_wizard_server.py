@@ -0,0 +1,661 @@
+# Local HTTP job service for the Marketing Captain prompts.
+# Exposes the same Step 1-5 prompts as the desktop app (marketing_wizard_prompts)
+# as jobs: submit a single step or the full pipeline, poll its status, fetch
+# the result. Requests are served by one asyncio loop (stdlib only, HTTP/1.1
+# keep-alive); jobs go through an internal queue drained by a worker pool and
+# share one provider layer, request scheduler and response cache.
+#
+#   python marketing_wizard_server.py --port 8765            # real providers (config.json)
+#   python marketing_wizard_server.py --port 8765 --fake     # offline fake provider
+#   python marketing_wizard_server.py --queue-db job_queue.sqlite3   # jobs survive restarts
+#
+#   POST   /jobs               {"step": "synopsis" | "pipeline", "inputs": {...}, "outputs": {...}}
+#   GET    /jobs/<id>          status
+#   GET    /jobs/<id>/result   200 when done, 202 while queued/running
+#   GET    /jobs/<id>/stream   server-sent events of the output as it is generated
+#                              (?offset=N or Last-Event-ID to resume; a "retry"
+#                              event means the output starts over)
+#   DELETE /jobs/<id>          cancel
+#   POST   /prompts/<step>     build a prompt without calling a model
+#   GET    /health
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+import uuid
+from bisect import bisect_right
+from urllib.parse import parse_qs, urlsplit
+
+import marketing_wizard_prompts as wizard_prompts
+from marketing_wizard_pipeline import CONFIG_FILE, Pipeline, create_runtime, load_settings
+from marketing_wizard_providers import FakeProviders, split_prompt
+from marketing_wizard_queue import JobQueue, DEFAULT_LEASE_SECONDS, POLL_SECONDS, run_leased, worker_id
+from marketing_wizard_scheduler import (
+    RequestScheduler, DEFAULT_MAX_INFLIGHT, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 16
+MAX_BODY_BYTES = 1024 * 1024
+MAX_PENDING_JOBS = 1000
+JOB_TTL_SECONDS = 3600
+SERVICE_QUEUE = "service"
+# Durable-queue status -> service status
+STORED_STATUS = {"queued": "queued", "leased": "running", "done": "done", "dead": "failed", "cancelled": "cancelled"}
+SSE_HEARTBEAT_SECONDS = 15
+
+STATUS_TEXT = {
+    200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class StreamBuffer:
+    # A job's streamed output, kept once and shared by every subscriber. Each
+    # delta is stored as a ready-to-send SSE frame whose id is the character
+    # offset at the end of that delta; subscribers hold only a read position,
+    # so a reconnect resumes from any offset and fan-out costs no copies.
+    def __init__(self):
+        self.frames = []
+        self.deltas = []
+        self.ends = []
+        self.size = 0
+        self.closed = False
+        self.final_frame = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def append(self, step, text):
+        if self.closed or not text:
+            return
+        self.size += len(text)
+        self.deltas.append((step, text))
+        self.ends.append(self.size)
+        self.frames.append(sse_frame("delta", {"step": step, "text": text}, self.size))
+        self._notify()
+
+    def retry(self, error):
+        # A failed attempt the durable store will run again; the next
+        # attempt's deltas follow this event
+        if self.closed:
+            return
+        self.deltas.append((None, ""))
+        self.ends.append(self.size)
+        self.frames.append(sse_frame("retry", {"error": error, "length": self.size}, self.size))
+        self._notify()
+
+    def close(self, status, error=None):
+        if self.closed:
+            return
+        self.closed = True
+        self.final_frame = sse_frame("done", {"status": status, "error": error, "length": self.size}, self.size)
+        self._notify()
+
+    async def read(self, offset=0, heartbeat=SSE_HEARTBEAT_SECONDS):
+        # Yields encoded frames from `offset` on; b"" is a heartbeat tick
+        index = bisect_right(self.ends, offset)
+        while index and self.ends[index - 1] == offset and self.deltas[index - 1][0] is None:
+            # A retry event at exactly this offset may not have been seen yet
+            index -= 1
+        if index < len(self.ends) and self.ends[index] - len(self.deltas[index][1]) < offset:
+            # Resuming mid-delta: send only the part the client has not seen
+            step, text = self.deltas[index]
+            start = self.ends[index] - len(text)
+            yield sse_frame("delta", {"step": step, "text": text[offset - start:]}, self.ends[index])
+            index += 1
+        while True:
+            while index < len(self.frames):
+                yield self.frames[index]
+                index += 1
+            if self.closed:
+                yield self.final_frame
+                return
+            changed = self._changed
+            try:
+                await asyncio.wait_for(changed.wait(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b""
+
+
+def sse_frame(event, data, event_id):
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode("utf-8")
+
+
+class Job:
+    def __init__(self, kind, step, inputs, outputs, provider, use_cache, item_id=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.step = step
+        self.inputs = inputs
+        self.outputs = outputs
+        self.provider = provider
+        self.use_cache = use_cache
+        self.item_id = item_id or self.id
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.task = None
+        self.stream = StreamBuffer()
+
+    @classmethod
+    def from_stored(cls, row):
+        # Rebuild a job persisted by an earlier run of the service
+        payload = row["payload"]
+        job = cls(payload["kind"], payload["step"], payload["inputs"], payload["outputs"],
+                  payload["provider"], payload["use_cache"], payload["item_id"])
+        job.id = row["id"]
+        job.created = row["created_at"]
+        job.update_stored(row)
+        return job
+
+    def update_stored(self, row):
+        self.status = STORED_STATUS[row["status"]]
+        if self.status == "queued" and row["attempts"] and row["error"]:
+            # Waiting for the store to run a failed attempt again
+            self.status = "retrying"
+        self.result = row["result"]
+        self.error = row["error"] if self.status in ("failed", "retrying") else None
+        if self.done:
+            self.finished = row["updated_at"]
+            self.stream.close(self.status, self.error)
+
+    def to_payload(self):
+        return {
+            "kind": self.kind,
+            "step": self.step,
+            "inputs": self.inputs,
+            "outputs": self.outputs,
+            "provider": self.provider,
+            "use_cache": self.use_cache,
+            "item_id": self.item_id,
+        }
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed", "cancelled")
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "step": self.step,
+            "provider": self.provider,
+            "status": self.status,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class JobService:
+    # With a durable store (JobQueue) jobs are persisted and leased from it, so
+    # queued and interrupted jobs are picked up again after a restart;
+    # without one they live only in memory.
+    def __init__(self, providers, scheduler, provider="google", workers=DEFAULT_WORKERS, store=None,
+                 lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.providers = providers
+        self.scheduler = scheduler
+        self.provider = provider
+        self.workers = workers
+        self.store = store
+        self.lease_seconds = lease_seconds
+        self.owner = worker_id()
+        self.jobs = {}
+        self.queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        self._watchers = set()
+
+    def start(self):
+        if self.store is None:
+            self._tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+        else:
+            self._tasks = [asyncio.create_task(self.lease_loop())]
+        self._tasks.append(asyncio.create_task(self.prune()))
+
+    async def stop(self):
+        for job in self.jobs.values():
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+        tasks = self._tasks + list(self._watchers)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def parse_spec(self, spec):
+        if not isinstance(spec, dict):
+            raise HttpError(400, "body must be a JSON object")
+        step = spec.get("step") or "pipeline"
+        if step != "pipeline" and step not in wizard_prompts.STEP_KEYS:
+            raise HttpError(400, f"unknown step {step!r}; use one of {wizard_prompts.STEP_KEYS + ['pipeline']}")
+        inputs = spec.get("inputs") or {}
+        outputs = spec.get("outputs") or {}
+        if not isinstance(inputs, dict) or not isinstance(outputs, dict):
+            raise HttpError(400, "inputs and outputs must be objects")
+        inputs = {f: str(inputs.get(f) or "") for f in wizard_prompts.INPUT_FIELDS}
+        outputs = {k: str(v or "") for k, v in outputs.items() if k in wizard_prompts.STEP_KEYS}
+        provider = spec.get("provider") or self.provider
+        if provider not in ("google", "claude"):
+            raise HttpError(400, f"unknown provider {provider!r}")
+        return step, inputs, outputs, provider
+
+    async def submit(self, spec):
+        step, inputs, outputs, provider = self.parse_spec(spec)
+        if not self.providers.is_ready(provider):
+            raise HttpError(400, f"no API key configured for {provider}")
+        if step == "customer" and not inputs["product"].strip():
+            raise HttpError(400, "inputs.product is required")
+        if self.store is None and self.queue.qsize() >= MAX_PENDING_JOBS:
+            raise HttpError(503, "job queue is full; retry later")
+        kind = "pipeline" if step == "pipeline" else "step"
+        job = Job(kind, None if kind == "pipeline" else step, inputs, outputs, provider,
+                  bool(spec.get("use_cache", True)), spec.get("id"))
+        self.jobs[job.id] = job
+        if self.store is None:
+            self.queue.put_nowait(job.id)
+        else:
+            await asyncio.to_thread(self.store.enqueue, job.to_payload(), SERVICE_QUEUE, job.id)
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None and self.store is not None:
+            row = await asyncio.to_thread(self.store.get, job_id)
+            if row is not None and row["queue"] == SERVICE_QUEUE:
+                job = self.jobs[job_id] = Job.from_stored(row)
+                self.watch(job)
+        if job is None:
+            raise HttpError(404, f"no job {job_id}")
+        return job
+
+    def watch(self, job):
+        # Follow a job this process is not running (another process holds the
+        # lease, or the store will retry it) until the store finishes it
+        if job.done:
+            return
+        task = asyncio.create_task(self.follow_store(job))
+        self._watchers.add(task)
+        task.add_done_callback(self._watchers.discard)
+
+    async def follow_store(self, job):
+        while not job.done and job.task is None:
+            await asyncio.sleep(POLL_SECONDS)
+            row = await asyncio.to_thread(self.store.get, job.id)
+            if row is None:
+                return
+            if job.task is None:
+                # Picked up by this process meanwhile: execute() owns the job
+                job.update_stored(row)
+
+    async def cancel(self, job_id):
+        job = await self.get(job_id)
+        if job.done:
+            return job
+        if self.store is not None:
+            await asyncio.to_thread(self.store.cancel, job_id)
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+        job.status = "cancelled"
+        job.finished = time.time()
+        job.stream.close(job.status)
+        return job
+
+    async def worker(self):
+        while True:
+            job = self.jobs.get(await self.queue.get())
+            if job is None or job.done:
+                continue
+            await self.execute(job)
+
+    async def lease_loop(self):
+        # Durable mode: lease from the store whenever a worker slot is free
+        slots = asyncio.Semaphore(self.workers)
+        while True:
+            await slots.acquire()
+            rows = await asyncio.to_thread(self.store.lease, self.owner, SERVICE_QUEUE, self.lease_seconds, 1)
+            if not rows:
+                slots.release()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            row = rows[0]
+            job = self.jobs.get(row["id"])
+            if job is None:
+                # Restarted service, or a job submitted through another process
+                job = self.jobs[row["id"]] = Job.from_stored({**row, "status": "queued"})
+            task = asyncio.create_task(self.execute(job, row))
+            task.add_done_callback(lambda _: slots.release())
+
+    async def execute(self, job, leased=None):
+        if job.done:
+            return
+        job.status = "running"
+        job.started = time.time()
+        job.task = asyncio.create_task(self.run_job(job))
+        try:
+            if leased is None:
+                result = await job.task
+            else:
+                result = await run_leased(self.store, leased, self.owner, lambda: job.task, self.lease_seconds)
+            if job.task.cancelled():
+                # Lease lost to another worker or cancelled through the store
+                if leased is not None and await self.hand_back(job):
+                    return
+                job.status = "cancelled"
+            elif job.status == "running":
+                job.result = result
+                job.status = "done"
+        except asyncio.CancelledError:
+            if not job.task.cancelled():
+                raise
+            job.status = "cancelled"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            if leased is not None and leased["attempts"] < leased["max_attempts"]:
+                # run_leased handed it back to the store, which runs it again;
+                # only the dead-lettered outcome is final. Decided without an
+                # await so lease_loop cannot re-lease it in between.
+                job.status = "retrying"
+                job.task = None
+                job.stream.retry(job.error)
+                self.watch(job)
+                return
+            job.status = "failed"
+        job.finished = time.time()
+        job.stream.close(job.status, job.error)
+
+    async def hand_back(self, job):
+        # True if another worker has taken the job over; it is then followed
+        # through the store instead of finished here
+        row = await asyncio.to_thread(self.store.get, job.id)
+        if row is None or row["status"] != "leased" or row["lease_owner"] == self.owner:
+            return False
+        job.task = None
+        job.update_stored(row)
+        self.watch(job)
+        return True
+
+    async def run_job(self, job):
+        if job.kind == "pipeline":
+            pipeline = Pipeline(self.providers, self.scheduler, job.provider, job.use_cache, priority=PRIORITY_BACKGROUND)
+            record = await pipeline.run_item({"id": job.item_id, "inputs": job.inputs}, outputs=job.outputs,
+                                             on_delta=job.stream.append)
+            if record["error"]:
+                raise RuntimeError(record["error"])
+            return record
+        pipeline = Pipeline(self.providers, self.scheduler, job.provider, job.use_cache, priority=PRIORITY_INTERACTIVE)
+        usage = {}
+        text = await pipeline.run_step(job.step, job.inputs, job.outputs, usage, job.stream.append)
+        result = {"step": job.step, "text": text, "usage": usage}
+        if job.step == "final_script":
+            result["image_prompts"] = wizard_prompts.extract_image_prompts(text)
+        return result
+
+    async def prune(self):
+        # Finished jobs are kept for JOB_TTL_SECONDS so clients can fetch results
+        while True:
+            await asyncio.sleep(60)
+            cutoff = time.time() - JOB_TTL_SECONDS
+            for job_id in [j.id for j in self.jobs.values() if j.done and j.finished < cutoff]:
+                del self.jobs[job_id]
+
+    def health(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        health = {"status": "ok", "jobs": counts, "queued": self.queue.qsize(), "scheduler": self.scheduler.stats()}
+        if self.store is not None:
+            health["store"] = self.store.stats(SERVICE_QUEUE)
+        return health
+
+
+class JobServer:
+    max_body = MAX_BODY_BYTES
+
+    def __init__(self, service, cors_origin=None):
+        self.service = service
+        self.cors_origin = cors_origin
+        self.routes = [
+            ("GET", re.compile(r"/health"), self.get_health),
+            ("POST", re.compile(r"/jobs"), self.post_job),
+            ("GET", re.compile(r"/jobs/(\w+)"), self.get_job),
+            ("DELETE", re.compile(r"/jobs/(\w+)"), self.delete_job),
+            ("GET", re.compile(r"/jobs/(\w+)/result"), self.get_result),
+            ("GET", re.compile(r"/jobs/(\w+)/stream"), self.get_stream),
+            ("POST", re.compile(r"/prompts/(\w+)"), self.post_prompt),
+        ]
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader, self.max_body)
+                except HttpError as e:
+                    await send_json(writer, e.status, {"error": str(e)}, False, self.cors_origin)
+                    break
+                if request is None:
+                    break
+                request["writer"] = writer
+                keep_alive = request["headers"].get("connection", "").lower() != "close"
+                try:
+                    response = await self.dispatch(request)
+                except HttpError as e:
+                    response = e.status, {"error": str(e)}
+                except Exception as e:
+                    print(f"DEBUG: Handler error for {request['method']} {request['path']}: {e}")
+                    if request.get("responded"):
+                        # A streaming response is already under way; just end it
+                        break
+                    response = 500, {"error": f"{type(e).__name__}: {e}"}
+                if response is None:
+                    # Streaming handlers write their own response and end the connection
+                    break
+                await send_json(writer, *response, keep_alive, self.cors_origin)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, request):
+        method, path = request["method"], request["path"]
+        allowed = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+            return await handler(request, *match.groups())
+        if allowed:
+            raise HttpError(405, f"{method} not allowed on {path}")
+        raise HttpError(404, f"no route for {path}")
+
+    async def get_health(self, request):
+        return 200, self.service.health()
+
+    async def post_job(self, request):
+        job = await self.service.submit(parse_json(request["body"]))
+        return 202, job.to_dict()
+
+    async def get_job(self, request, job_id):
+        return 200, (await self.service.get(job_id)).to_dict()
+
+    async def delete_job(self, request, job_id):
+        return 200, (await self.service.cancel(job_id)).to_dict()
+
+    async def get_stream(self, request, job_id):
+        job = await self.service.get(job_id)
+        offset = request["headers"].get("last-event-id") or request["query"].get("offset", ["0"])[0]
+        try:
+            offset = max(0, int(offset))
+        except ValueError:
+            raise HttpError(400, f"invalid offset {offset!r}")
+        writer = request["writer"]
+        head = (
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: text/event-stream; charset=utf-8\r\n"
+            "Cache-Control: no-cache\r\n"
+            "X-Accel-Buffering: no\r\n"
+            f"{cors_header(self.cors_origin)}"
+            "Connection: close\r\n\r\n"
+            "retry: 2000\n\n"
+        )
+        writer.write(head.encode("latin-1"))
+        request["responded"] = True
+        try:
+            async for frame in job.stream.read(offset):
+                writer.write(frame or b": ping\n\n")
+                await writer.drain()
+        except ConnectionError:
+            # Subscriber went away; the job and its buffer carry on
+            pass
+        return None
+
+    async def get_result(self, request, job_id):
+        job = await self.service.get(job_id)
+        if not job.done:
+            return 202, job.to_dict()
+        if job.status != "done":
+            return 409, job.to_dict()
+        return 200, {**job.to_dict(), "result": job.result}
+
+    async def post_prompt(self, request, step):
+        if step not in wizard_prompts.STEP_KEYS:
+            raise HttpError(404, f"unknown step {step!r}")
+        spec = parse_json(request["body"]) if request["body"] else {}
+        _, inputs, outputs, _ = self.service.parse_spec({**spec, "step": step})
+        prefix, tail = split_prompt(wizard_prompts.build_prompt(step, inputs, outputs))
+        return 200, {"step": step, "prefix": prefix, "tail": tail}
+
+
+async def read_request(reader, max_body=MAX_BODY_BYTES):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) > 100:
+            raise HttpError(400, "too many headers")
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length") or 0)
+    if length > max_body:
+        raise HttpError(413, f"body larger than {max_body} bytes")
+    body = await reader.readexactly(length) if length else b""
+    url = urlsplit(target)
+    return {
+        "method": method.upper(),
+        "path": url.path.rstrip("/") or "/",
+        "query": parse_qs(url.query),
+        "headers": headers,
+        "body": body,
+    }
+
+
+def parse_json(body):
+    try:
+        return json.loads(body.decode("utf-8") or "{}")
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HttpError(400, f"invalid JSON body: {e}")
+
+
+def cors_header(origin):
+    return f"Access-Control-Allow-Origin: {origin}\r\n" if origin else ""
+
+
+async def send_json(writer, status, payload, keep_alive=True, cors_origin=None):
+    body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"{cors_header(cors_origin)}"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+async def create_service(args):
+    if args.fake:
+        providers = FakeProviders()
+        await providers.connect()
+        scheduler = RequestScheduler(args.max_inflight or DEFAULT_MAX_INFLIGHT)
+        provider = args.provider or "google"
+    else:
+        settings = load_settings(args.config)
+        providers, scheduler = await create_runtime(settings, args.max_inflight, not args.no_cache)
+        provider = args.provider or settings.get("api_provider", "google")
+    store = JobQueue(args.queue_db) if args.queue_db else None
+    return JobService(providers, scheduler, provider, args.workers, store)
+
+
+async def serve(args):
+    service = await create_service(args)
+    service.start()
+    server = await asyncio.start_server(JobServer(service, args.cors_origin).handle, args.host, args.port)
+    print(f"Marketing Captain job service on http://{args.host}:{args.port}{' (fake provider)' if args.fake else ''}", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve the Marketing Captain prompts as an HTTP job API.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="jobs processed at once")
+    parser.add_argument("--max-inflight", type=int, help="provider requests in flight (default from config.json)")
+    parser.add_argument("--provider", choices=["google", "claude"], help="default provider for jobs")
+    parser.add_argument("--config", default=CONFIG_FILE)
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the response cache")
+    parser.add_argument("--fake", action="store_true", help="answer with the offline fake provider (no keys needed)")
+    parser.add_argument("--queue-db", help="persist jobs in this SQLite queue so they survive restarts")
+    parser.add_argument("--cors-origin", help="allow this web origin (e.g. http://localhost:3000) to call the API")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+# Startup timing for the desktop apps.
+# The entry scripts import this module first. Run one with --startup-profile
+# and every import after that point is timed per thread (cumulative and self
+# time, like python -X importtime). The report, printed once the window has
+# painted, lists the app's phases (imports, window, app construction, first
+# paint), the import time of each top-level package on the Tk thread and the
+# slowest modules, and checks first paint against STARTUP_BUDGET_SECONDS.
+#
+#   python marketing_wizard_Persona_Rule_API.py --startup-profile
+#
+# after_first_paint() is also how the apps defer heavy work (provider SDK
+# imports, client setup) until the window is on screen; GenaiClientLoader builds
+# the google.genai client on a background thread once it is.
+import builtins
+import sys
+import threading
+import time
+
+STARTED = time.perf_counter()
+PROFILE_FLAG = "--startup-profile"
+STARTUP_BUDGET_SECONDS = 1.0
+FIRST_PAINT_FALLBACK_MS = 2000
+CLIENT_POLL_MS = 100
+REPORT_MODULES = 12
+
+
+class ImportProfiler:
+    def __init__(self):
+        # (thread kind, module) -> [cumulative, self]
+        self.timings = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self._import = builtins.__import__
+
+    def install(self):
+        builtins.__import__ = self.timed_import
+
+    def uninstall(self):
+        builtins.__import__ = self._import
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # Relative and repeated imports count toward the importing module
+        if level or name in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            kind = "main" if threading.current_thread() is threading.main_thread() else "background"
+            with self.lock:
+                entry = self.timings.setdefault((kind, name), [0.0, 0.0])
+                entry[0] += elapsed
+                entry[1] += elapsed - children
+
+    def packages(self, kind):
+        # Self time summed per top-level package (these add up to the total)
+        totals = {}
+        with self.lock:
+            for (entry_kind, name), (_, own) in self.timings.items():
+                if entry_kind == kind:
+                    top = name.split(".")[0]
+                    totals[top] = totals.get(top, 0.0) + own
+        return sorted(totals.items(), key=lambda item: -item[1])
+
+    def slowest(self, kind, limit=REPORT_MODULES):
+        with self.lock:
+            rows = [(name, total, own) for (entry_kind, name), (total, own) in self.timings.items() if entry_kind == kind]
+        return sorted(rows, key=lambda row: -row[1])[:limit]
+
+
+profiler = None
+phases = []
+
+
+def enabled():
+    return profiler is not None
+
+
+def mark(phase):
+    # Seconds since this module was imported (the top of the entry script)
+    if profiler is not None:
+        phases.append((phase, time.perf_counter() - STARTED))
+
+
+def after_first_paint(root, func, *args):
+    # Runs func once the window has been drawn (first Expose of any widget,
+    # then idle), or after FIRST_PAINT_FALLBACK_MS if it never is.
+    state = {"done": False}
+
+    def fire(*_):
+        if state["done"]:
+            return
+        state["done"] = True
+        root.after_idle(func, *args)
+
+    root.bind("<Expose>", fire, add="+")
+    root.after(FIRST_PAINT_FALLBACK_MS, fire)
+
+
+class GenaiClientLoader:
+    # google.genai (and its types) are imported in load(), off the Tk thread.
+    # Work that needs the client before it is ready goes through defer().
+    def __init__(self, root):
+        self.root = root
+        self.api_key = ""
+        self.client = None
+        self.types = None
+        self.thread = None
+        self.waiting = {}
+
+    def start(self, api_key):
+        self.api_key = api_key
+        self.client = None
+        self.thread = None
+        if api_key:
+            self.thread = threading.Thread(target=self.load, args=(api_key,), daemon=True)
+            self.thread.start()
+
+    def load(self, api_key):
+        try:
+            from google import genai
+            from google.genai import types
+            client = genai.Client(api_key=api_key)
+        except Exception as e:
+            print(f"Client Init Error: {e}")
+            return
+        if api_key == self.api_key:
+            self.types = types
+            self.client = client
+
+    def loading(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def defer(self, name, func, api_key):
+        # Clicked before the deferred client setup finished (or started): run
+        # func once it has, without blocking the Tk thread. True if deferred.
+        if self.thread is None and self.client is None and api_key:
+            self.start(api_key)
+        if not self.loading():
+            return False
+        if not self.waiting:
+            self.root.after(CLIENT_POLL_MS, self.poll)
+        self.waiting[name] = func
+        return True
+
+    def poll(self):
+        if self.loading():
+            self.root.after(CLIENT_POLL_MS, self.poll)
+            return
+        waiting, self.waiting = self.waiting, {}
+        for func in waiting.values():
+            func()
+
+
+def report_after_paint(root, budget=STARTUP_BUDGET_SECONDS):
+    if profiler is None:
+        return
+
+    def painted():
+        mark("first paint")
+        print_report(budget)
+
+    after_first_paint(root, painted)
+    # Background imports (deferred SDKs) are reported when the app closes
+    root.bind("<Destroy>", lambda e: e.widget is root and print_background(), add="+")
+
+
+def print_report(budget=STARTUP_BUDGET_SECONDS, out=None):
+    out = out or sys.stderr
+    print("Startup profile (seconds since the entry script started)", file=out)
+    for phase, at in phases:
+        print(f"  {phase:<14}{at:7.3f}", file=out)
+    painted = dict(phases).get("first paint")
+    if painted is not None:
+        verdict = "ok" if painted <= budget else "OVER BUDGET"
+        print(f"  first paint budget {budget:.2f}s: {verdict}", file=out)
+    print("Imports on the Tk thread, self time per package:", file=out)
+    for package, own in profiler.packages("main")[:REPORT_MODULES]:
+        print(f"  {package:<28}{own:7.3f}", file=out)
+    print("Slowest modules on the Tk thread (cumulative / self):", file=out)
+    for name, total, own in profiler.slowest("main"):
+        print(f"  {name:<28}{total:7.3f} / {own:.3f}", file=out)
+    out.flush()
+
+
+def print_background(out=None):
+    out = out or sys.stderr
+    rows = profiler.packages("background")
+    if not rows:
+        return
+    print("Imports deferred to background threads, self time per package:", file=out)
+    for package, own in rows[:REPORT_MODULES]:
+        print(f"  {package:<28}{own:7.3f}", file=out)
+    out.flush()
+
+
+if PROFILE_FLAG in sys.argv:
+    sys.argv.remove(PROFILE_FLAG)
+    profiler = ImportProfiler()
+    profiler.install()
@@ -0,0 +1,235 @@
+# Structured (JSON) output mode for Step 5.
+# The model returns the post as typed fields instead of free markdown:
+# titles, TL;DR, four body sections each with its image prompt, the
+# conclusion and the hashtags. Gemini enforces STEP5_SCHEMA through
+# response_schema and Claude through a forced tool call (see
+# claude_request in marketing_wizard_providers). StreamParser reports each
+# field and each section as soon as its JSON value is complete, so the app
+# can render the post and fill the image boxes while it is still streaming.
+import json
+
+SECTION_KEYS = ("intro", "wall", "epiphany", "offer")
+SECTION_HEADINGS = {
+    "intro": "Intro: The Hook",
+    "wall": "Body 1: The Wall (Problem Deep Dive)",
+    "epiphany": "Body 2: The Epiphany (The Solution)",
+    "offer": "Body 3: The Offer (Benefit & Result)",
+}
+
+# Canonical JSON Schema (lowercase types); providers translate it as needed
+STEP5_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "titles": {"type": "array", "items": {"type": "string"}, "minItems": 3, "maxItems": 3},
+        "tldr": {"type": "string"},
+        "sections": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "key": {"type": "string", "enum": list(SECTION_KEYS)},
+                    "heading": {"type": "string"},
+                    "body": {"type": "string"},
+                    "image_prompt": {"type": "string"},
+                },
+                "required": ["key", "heading", "body", "image_prompt"],
+            },
+            "minItems": 4,
+            "maxItems": 4,
+        },
+        "conclusion": {"type": "string"},
+        "hashtags": {"type": "array", "items": {"type": "string"}, "minItems": 10, "maxItems": 10},
+    },
+    "required": ["titles", "tldr", "sections", "conclusion", "hashtags"],
+}
+
+
+class StreamParser:
+    # Incremental scanner over a streamed JSON object. feed() returns the
+    # values that became complete: ("field", name, value) for top-level
+    # fields and ("item", name, index, value) for elements of top-level
+    # arrays. Each character is scanned once.
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.key = None
+        self.expect_key = False
+        self.value_start = None
+        self.item_start = None
+        self.item_index = 0
+        self.post = {}
+
+    def feed(self, delta):
+        self.text += delta
+        events = []
+        text = self.text
+        while self.pos < len(text):
+            ch = text[self.pos]
+            depth = len(self.stack)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    self.pos += 1
+                    self._closed(depth, events)
+                    continue
+            elif ch == '"':
+                self.in_string = True
+                self._opened(depth)
+            elif ch in "{[":
+                self._opened(depth)
+                self.stack.append(ch)
+                if depth == 0 and ch == "{":
+                    self.expect_key = True
+            elif ch in "}]":
+                if depth in (1, 2):
+                    # Scalars (numbers, literals) end at the container's close
+                    self._scalar_end(depth, self.pos, events)
+                if self.stack:
+                    self.stack.pop()
+                self.pos += 1
+                self._closed(len(self.stack), events)
+                continue
+            elif ch == ",":
+                self._scalar_end(depth, self.pos, events)
+                if depth == 1:
+                    self.expect_key = True
+                elif depth == 2:
+                    self.item_start = None
+            elif ch == ":" and depth == 1:
+                self.expect_key = False
+            elif not ch.isspace():
+                self._opened(depth)
+            self.pos += 1
+        return events
+
+    def _opened(self, depth):
+        # A value (or key) starts at self.pos
+        if depth == 1 and self.expect_key:
+            if self.value_start is None:
+                self.value_start = ("key", self.pos)
+        elif depth == 1 and self.value_start is None:
+            self.value_start = ("value", self.pos)
+        elif depth == 2 and self.stack[-1] == "[" and self.item_start is None:
+            self.item_start = self.pos
+
+    def _closed(self, depth, events):
+        # A string or container just ended; depth is the depth after closing
+        if depth == 1 and self.value_start is not None:
+            kind, start = self.value_start
+            raw = self.text[start:self.pos]
+            if kind == "key":
+                self.key = self._load(raw)
+                self.value_start = None
+            elif raw[:1] in '"{[':
+                self._field(raw, events)
+        elif depth == 2 and self.stack[-1] == "[" and self.item_start is not None:
+            self._item(self.text[self.item_start:self.pos], events)
+
+    def _scalar_end(self, depth, end, events):
+        if depth == 1 and self.value_start is not None and self.value_start[0] == "value":
+            raw = self.text[self.value_start[1]:end].strip()
+            if raw and raw[0] not in '"{[':
+                self._field(raw, events)
+            self.value_start = None
+        elif depth == 2 and self.item_start is not None:
+            raw = self.text[self.item_start:end].strip()
+            if raw and raw[0] not in '"{[':
+                self._item(raw, events)
+
+    def _field(self, raw, events):
+        self.value_start = None
+        value = self._load(raw)
+        self.item_index = 0
+        if value is not None and self.key is not None:
+            self.post[self.key] = value
+            events.append(("field", self.key, value))
+
+    def _item(self, raw, events):
+        self.item_start = None
+        value = self._load(raw)
+        if value is not None and self.key is not None:
+            events.append(("item", self.key, self.item_index, value))
+        self.item_index += 1
+
+    @staticmethod
+    def _load(raw):
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+
+def parse_post(text):
+    # Completed fields of a Step 5 JSON response (partial if it was cut off);
+    # tolerates a markdown code fence around the object
+    text = (text or "").strip()
+    start = text.find("{")
+    if start == -1:
+        return {}
+    parser = StreamParser()
+    parser.feed(text[start:])
+    return parser.post
+
+
+def missing_fields(post):
+    # Names of required fields that are absent or malformed
+    missing = [name for name in STEP5_SCHEMA["required"] if not post.get(name)]
+    sections = post.get("sections") or []
+    if "sections" not in missing and (
+        len(sections) != len(SECTION_KEYS)
+        or not all(isinstance(s, dict) and s.get("body") and s.get("image_prompt") for s in sections)
+    ):
+        missing.append("sections")
+    return missing
+
+
+def style_image_prompt(prompt):
+    # Same base styling extract_image_prompts adds to markdown-mode prompts
+    prompt = (prompt or "").strip()
+    if prompt and "Pixar" not in prompt:
+        prompt += ", 3D Pixar animation style, high quality render"
+    return prompt
+
+
+def section_image_prompts(post):
+    return [style_image_prompt(s.get("image_prompt")) for s in post.get("sections") or [] if isinstance(s, dict)]
+
+
+def render_section(section, index=0):
+    key = section.get("key") or (SECTION_KEYS[index] if index < len(SECTION_KEYS) else "")
+    heading = section.get("heading") or SECTION_HEADINGS.get(key, "")
+    return (
+        f"**[{SECTION_HEADINGS.get(key, key)}]** {heading}\n\n"
+        f"{(section.get('body') or '').strip()}\n\n"
+        f"**[Image Prompt for Nano Banana]**: {(section.get('image_prompt') or '').strip()}\n\n"
+    )
+
+
+def render_part(name, value):
+    # Markdown for one completed top-level field, in the markdown-mode layout
+    if name == "titles":
+        return "## 1. Title Options\n" + "".join(f"- {title}\n" for title in value) + "\n## 2. Blog Post Body\n\n"
+    if name == "tldr":
+        return f"**[TL;DR Summary]**\n{value.strip()}\n\n"
+    if name == "sections":
+        return "".join(render_section(section, i) for i, section in enumerate(value) if isinstance(section, dict))
+    if name == "conclusion":
+        return f"**[Conclusion & CTA]**\n{value.strip()}\n\n"
+    if name == "hashtags":
+        return "## 3. Recommended Hashtags (10 Tags)\n" + " ".join(
+            tag if tag.startswith("#") else f"#{tag}" for tag in value
+        ) + "\n"
+    return ""
+
+
+def render_markdown(post):
+    # The post as markdown, so saving, copying and the image-prompt markers
+    # work the same as in markdown mode
+    return "".join(render_part(name, post[name]) for name in STEP5_SCHEMA["properties"] if post.get(name)).strip()
@@ -0,0 +1,61 @@
+import marketing_wizard_cache
+from marketing_wizard_cache import ResponseCache, make_key, normalize_prompt
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_drops_indentation_and_skip_text():
+    a = "\n    # Role\n    Product: (User Skipped: AI MUST invent one. 예: A)\n"
+    b = "\n        # Role\n        Product: (User Skipped: AI MUST invent one. 예: B)\n"
+    assert normalize_prompt(a) == normalize_prompt(b)
+
+
+def test_normalize_keeps_user_content():
+    assert normalize_prompt("a  b") != normalize_prompt("a b")
+    assert normalize_prompt("para 1\n\npara 2") != normalize_prompt("para 1\npara 2")
+    assert make_key("google", "m", "x  y", 0.7, 8000) != make_key("google", "m", "x y", 0.7, 8000)
+
+
+def test_schema_is_part_of_the_key():
+    schema = {"type": "array", "items": {"type": "string"}}
+    plain = make_key("google", "m", "prompt", 0.6, 800)
+    assert make_key("google", "m", "prompt", 0.6, 800, schema) != plain
+    assert make_key("google", "m", "prompt", 0.6, 800, None) == plain
+
+
+def test_expired_entries_are_dropped(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(marketing_wizard_cache.time, "time", clock)
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), ttl_hours=1)
+    cache.put("a", "google", "m", "old")
+    clock.now += 1800
+    assert cache.get("a") == "old"
+    clock.now += 1801
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted_over_the_size_limit(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(marketing_wizard_cache.time, "time", clock)
+    # Room for two 10-byte responses
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), max_mb=25 / (1024 * 1024))
+    for key in ("a", "b"):
+        clock.now += 1
+        cache.put(key, "google", "m", key * 10)
+    clock.now += 1
+    assert cache.get("a") == "a" * 10
+    clock.now += 1
+    cache.put("c", "google", "m", "c" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") == "a" * 10
+    assert cache.get("c") == "c" * 10
+    assert cache.stats()["bytes"] == 20
+    cache.close()
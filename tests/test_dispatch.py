@@ -0,0 +1,43 @@
+from marketing_wizard_dispatch import UiDispatcher
+
+
+class FakeRoot:
+    # Records timers instead of running a Tk main loop
+    def __init__(self):
+        self.timers = []
+        self.errors = []
+
+    def after(self, ms, func, *args):
+        self.timers.append((ms, func))
+
+    def report_callback_exception(self, *exc_info):
+        self.errors.append(exc_info[1])
+
+
+def test_coalesced_posts_keep_only_the_newest_at_its_position():
+    root = FakeRoot()
+    dispatcher = UiDispatcher(root)
+    calls = []
+    dispatcher.post(calls.append, "progress 1", coalesce="progress")
+    dispatcher.post(calls.append, "log a")
+    dispatcher.post(calls.append, "progress 2", coalesce="progress")
+    dispatcher.post(calls.append, "log b")
+    dispatcher.post(calls.append, "status", coalesce="status")
+    dispatcher._drain()
+    assert calls == ["log a", "progress 2", "log b", "status"]
+    assert dispatcher.stats["coalesced"] == 1
+    assert dispatcher.stats["run"] == 4
+
+
+def test_failing_callback_does_not_stop_the_drain():
+    root = FakeRoot()
+    dispatcher = UiDispatcher(root)
+    calls = []
+    dispatcher.post(lambda: 1 / 0)
+    dispatcher.post(calls.append, "after")
+    dispatcher._drain()
+    assert calls == ["after"]
+    assert isinstance(root.errors[0], ZeroDivisionError)
+    # Keeps polling, more slowly once the queue is empty
+    dispatcher._drain()
+    assert [ms for ms, _ in root.timers] == [dispatcher.interval_ms, dispatcher.idle_ms]
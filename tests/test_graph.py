@@ -0,0 +1,50 @@
+from marketing_wizard_graph import StepGraph, usable_output
+from marketing_wizard_prompts import STEP_KEYS
+
+INPUTS = {"product": "두유", "pain": "아침", "role": "직장인"}
+OUTPUTS = {step: f"{step} text" for step in STEP_KEYS}
+
+
+def run_all(graph, inputs, outputs):
+    for step in STEP_KEYS:
+        graph.record(step, graph.signature(step, inputs, outputs), outputs[step])
+
+
+def test_nothing_is_stale_right_after_a_run():
+    graph = StepGraph()
+    run_all(graph, INPUTS, OUTPUTS)
+    assert graph.stale_steps(lambda step: INPUTS, OUTPUTS) == {}
+
+
+def test_changed_input_marks_its_step_and_everything_downstream():
+    graph = StepGraph()
+    run_all(graph, INPUTS, OUTPUTS)
+    edited = {**INPUTS, "role": "대학생"}
+    stale = graph.stale_steps(lambda step: edited, OUTPUTS)
+    assert list(stale) == ["character", "synopsis", "draft", "final_script"]
+    assert stale["character"] == ["role"]
+    assert stale["synopsis"] == ["character (stale)"]
+    # final_script does not read character itself; it follows synopsis and draft
+    assert stale["final_script"] == ["synopsis (stale)", "draft (stale)"]
+
+
+def test_changed_upstream_output_is_reported_by_name():
+    graph = StepGraph()
+    run_all(graph, INPUTS, OUTPUTS)
+    stale = graph.stale_steps(lambda step: INPUTS, {**OUTPUTS, "customer": "edited by hand"})
+    assert stale["character"] == ["customer"]
+    assert "customer" in stale["synopsis"] and "customer" in stale["final_script"]
+
+
+def test_steps_never_run_are_not_stale():
+    graph = StepGraph()
+    graph.record("customer", graph.signature("customer", INPUTS, OUTPUTS), OUTPUTS["customer"])
+    assert graph.changes("draft", INPUTS, OUTPUTS) is None
+    assert graph.stale_steps(lambda step: {**INPUTS, "product": "커피"}, OUTPUTS) == {"customer": ["product"]}
+
+
+def test_placeholders_and_failures_are_not_usable_output():
+    assert usable_output("결과")
+    assert not usable_output("   ")
+    assert not usable_output("⏳ AI 캡틴이 열심히 글을 쓰고 있습니다...")
+    assert not usable_output("[Error]: quota")
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+from marketing_wizard_hedge import HedgedRouter
+from marketing_wizard_scheduler import RequestScheduler
+
+
+class StallingProviders:
+    # google never produces a token; claude answers at once
+    def __init__(self):
+        self.started = []
+
+    def is_ready(self, provider):
+        return True
+
+    async def stream(self, provider, prompt, max_tokens=8000, temperature=0.7, usage=None, schema=None):
+        self.started.append(provider)
+        if provider == "google":
+            await asyncio.Event().wait()
+        yield f"{provider} answer"
+
+
+def test_hedge_starts_while_primary_holds_the_only_slot():
+    async def run():
+        providers = StallingProviders()
+        scheduler = RequestScheduler(1)
+        router = HedgedRouter(providers)
+        router.hedge_threshold = lambda provider: 0.05
+        usage = {}
+        async with scheduler.slot():
+            parts = [delta async for delta in router.stream("google", "prompt", usage=usage)]
+        return providers, router, usage, parts
+
+    providers, router, usage, parts = asyncio.run(asyncio.wait_for(run(), 5))
+    assert providers.started == ["google", "claude"]
+    assert parts == ["claude answer"]
+    assert usage["provider"] == "claude"
+    assert router.stats["hedges"] == 1
+    assert router.stats["hedge_wins"] == 1
+
+
+def test_cancelled_half_open_trial_releases_the_breaker():
+    async def run():
+        providers = StallingProviders()
+        router = HedgedRouter(providers)
+        breaker = router.breakers["google"]
+        breaker.opened_at = time.monotonic() - breaker.cooldown
+        assert breaker.state == "half-open"
+
+        async def consume():
+            return [delta async for delta in router.stream("google", "prompt")]
+
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.01)
+        assert breaker.trial_in_flight
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return breaker
+
+    breaker = asyncio.run(run())
+    assert not breaker.trial_in_flight
+    assert breaker.allow()
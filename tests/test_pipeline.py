@@ -0,0 +1,50 @@
+import asyncio
+
+from marketing_wizard_pipeline import Pipeline, normalize_item
+from marketing_wizard_providers import FakeProviders, join_prompt
+from marketing_wizard_scheduler import RequestScheduler
+
+
+class FlakyImageProviders(FakeProviders):
+    # The poster rewrite (Step 3 image) fails while `broken` is set
+    def __init__(self):
+        super().__init__(latency=0, chunk_delay=0)
+        self.broken = True
+        self.poster_calls = 0
+
+    async def _generate_once(self, provider, prompt, max_tokens, temperature, usage, schema=None):
+        if "movie poster" in join_prompt(prompt):
+            self.poster_calls += 1
+            if self.broken:
+                raise ValueError("rewrite rejected")
+        return await super()._generate_once(provider, prompt, max_tokens, temperature, usage, schema)
+
+
+def test_failed_image_rewrite_fails_the_item_and_is_retried_on_resume():
+    async def run():
+        providers = FlakyImageProviders()
+        await providers.connect()
+        pipeline = Pipeline(providers, RequestScheduler(4), use_cache=False)
+        item = normalize_item({"product": "두유", "pain": "아침"}, 0)
+        saved = []
+
+        async def on_step(step, record):
+            saved.append(step)
+
+        first = await pipeline.run_item(item, on_step=on_step)
+        providers.broken = False
+        resumed = await pipeline.run_item(item, outputs=first["outputs"], on_step=on_step,
+                                          image_prompts=first["image_prompts"])
+        return first, resumed, saved, providers.poster_calls
+
+    first, resumed, saved, poster_calls = asyncio.run(run())
+    assert first["error"].startswith("image:synopsis:")
+    assert "synopsis" not in first["image_prompts"]
+    assert {"customer", "final_script"} <= set(first["image_prompts"])
+    assert first["metrics"]["image:synopsis"]["error"] == "ValueError: rewrite rejected"
+    assert "image:synopsis" in saved
+    # Only the failed rewrite runs again
+    assert resumed["error"] is None
+    assert resumed["image_prompts"]["synopsis"]
+    assert saved[-1] == "image:synopsis" and saved.count("image:customer") == 1
+    assert poster_calls == 2
@@ -0,0 +1,58 @@
+from concurrent.futures import Future
+
+from marketing_wizard_prefetch import PrefetchTracker, prefetch_target
+
+
+def add(tracker, step, key, running=True):
+    entry = tracker.add(step, key)
+    entry["future"] = Future()
+    if running:
+        tracker.mark_running(entry)
+    return entry
+
+
+def test_prefetch_target_only_when_the_next_questions_are_blank():
+    assert prefetch_target("customer", {}) == "character"
+    assert prefetch_target("customer", {"role": "직장인"}) is None
+    assert prefetch_target("final_script", {}) is None
+
+
+def test_identical_request_is_a_hit():
+    tracker = PrefetchTracker()
+    entry = add(tracker, "character", "k1")
+    assert tracker.claim("character", "k1") is entry
+    assert entry["state"] == "hit"
+    assert not entry["future"].cancelled()
+    assert tracker.claim("character", "k1") is None
+    assert tracker.hit_rate() == 1.0
+
+
+def test_changed_request_discards_and_cancels_the_prefetch():
+    tracker = PrefetchTracker()
+    entry = add(tracker, "character", "k1")
+    tracker.record_tokens(entry, {"input_tokens": 10, "output_tokens": 5})
+    assert tracker.claim("character", "k2") is None
+    assert entry["future"].cancelled()
+    assert (tracker.stats["discarded"], tracker.stats["wasted_tokens"]) == (1, 15)
+
+
+def test_prefetch_still_queued_is_late():
+    tracker = PrefetchTracker()
+    entry = add(tracker, "character", "k1", running=False)
+    assert tracker.claim("character", "k1") is None
+    assert entry["state"] == "late"
+    # A finished one is reused even if it never reported running
+    entry = add(tracker, "character", "k1", running=False)
+    entry["future"].set_result("text")
+    assert tracker.claim("character", "k1") is entry
+
+
+def test_replaced_prefetch_counts_as_unused_and_late_tokens_as_wasted():
+    tracker = PrefetchTracker()
+    first = add(tracker, "character", "k1")
+    add(tracker, "character", "k2")
+    assert first["state"] == "unused"
+    # Tokens reported after the entry was dropped are still counted as wasted
+    tracker.record_tokens(first, {"input_tokens": 3, "output_tokens": 4})
+    assert tracker.stats["wasted_tokens"] == 7
+    assert tracker.stats["unused"] == 1
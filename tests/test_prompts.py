@@ -0,0 +1,34 @@
+from marketing_wizard_prompts import parse_episodes
+
+
+def test_series_table_gives_one_description_per_episode():
+    synopsis = (
+        "## 4-part Series Planning Table\n"
+        "| 회차 | 제목 | 핵심 내용 |\n"
+        "|---|---|---|\n"
+        "| 1화 | **시작** | 아침이 괴롭다 |\n"
+        "| 2화 | 벽 | 포기하고 싶다 |\n"
+        "| 3화 | 깨달음 | 두유를 만나다 |\n"
+        "| 4화 | 제안 | 함께 하자 |\n"
+    )
+    episodes = parse_episodes(synopsis)
+    assert len(episodes) == 4
+    assert episodes[0] == "회차: 1화 / 제목: 시작 / 핵심 내용: 아침이 괴롭다"
+    assert episodes[3].endswith("핵심 내용: 함께 하자")
+
+
+def test_episode_headings_are_grouped_with_their_lines():
+    synopsis = (
+        "intro line\n"
+        "### 제1화: 시작\n- 아침이 괴롭다\n"
+        "### 제2화: 벽\n- 포기\n"
+        "**Episode 3** 깨달음\n"
+        "- 4화 제안\n"
+    )
+    episodes = parse_episodes(synopsis)
+    assert episodes == ["### 제1화: 시작 - 아침이 괴롭다", "### 제2화: 벽 - 포기", "**Episode 3** 깨달음", "- 4화 제안"]
+
+
+def test_unstructured_synopsis_falls_back_to_episode_numbers():
+    assert parse_episodes("그냥 긴 줄거리") == ["제1화", "제2화", "제3화", "제4화"]
+    assert parse_episodes("") == ["제1화", "제2화", "제3화", "제4화"]
@@ -0,0 +1,75 @@
+import asyncio
+from types import SimpleNamespace
+
+import marketing_wizard_providers
+from marketing_wizard_providers import AsyncProviders
+
+
+class FakePool:
+    def __init__(self):
+        self.closed = False
+
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeMessages:
+    def __init__(self, pool, release):
+        self.pool = pool
+        self.release = release
+
+    async def create(self, **request):
+        await self.release.wait()
+        if self.pool.closed:
+            raise RuntimeError("pool closed under an in-flight call")
+        return SimpleNamespace(content=[SimpleNamespace(text="answer")], usage=None)
+
+
+class FakeProviders(AsyncProviders):
+    def __init__(self, release):
+        super().__init__()
+        self.release = release
+
+    def _build_gemini(self, api_key):
+        return None
+
+    def _build_claude(self, api_key):
+        return SimpleNamespace(messages=FakeMessages(self.http, self.release))
+
+
+def test_reconnect_closes_the_old_pool_after_in_flight_calls(monkeypatch):
+    monkeypatch.setattr(marketing_wizard_providers, "build_http_client", FakePool)
+
+    async def run():
+        release = asyncio.Event()
+        providers = FakeProviders(release)
+        providers.set_keys("", "key")
+        await providers.connect(warm=False)
+        first = providers.http
+        call = asyncio.create_task(providers._generate_once("claude", "prompt", 100, 0.7, None))
+        await asyncio.sleep(0)
+        await providers.connect(warm=False)
+        closed_while_running = first.closed
+        release.set()
+        text = await call
+        return first, providers.http, closed_while_running, text
+
+    first, second, closed_while_running, text = asyncio.run(asyncio.wait_for(run(), 5))
+    assert not closed_while_running
+    assert text == "answer"
+    assert first.closed
+    assert not second.closed
+
+
+def test_reconnect_closes_an_idle_pool_at_once(monkeypatch):
+    monkeypatch.setattr(marketing_wizard_providers, "build_http_client", FakePool)
+
+    async def run():
+        providers = FakeProviders(asyncio.Event())
+        providers.set_keys("", "key")
+        await providers.connect(warm=False)
+        first = providers.http
+        await providers.connect(warm=False)
+        return first
+
+    assert asyncio.run(run()).closed
@@ -0,0 +1,45 @@
+import marketing_wizard_queue
+from marketing_wizard_queue import JobQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_queue(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(marketing_wizard_queue.time, "time", clock)
+    return JobQueue(str(tmp_path / "queue.sqlite3")), clock
+
+
+def test_expired_lease_is_taken_over(tmp_path, monkeypatch):
+    queue, clock = make_queue(tmp_path, monkeypatch)
+    job_id = queue.enqueue({"n": 1})
+    assert [job["id"] for job in queue.lease("a", lease_seconds=60)] == [job_id]
+    clock.now += 30
+    assert queue.lease("b", lease_seconds=60) == []
+    assert queue.heartbeat(job_id, "a", lease_seconds=60)
+    clock.now += 61
+    [job] = queue.lease("b", lease_seconds=60)
+    assert (job["lease_owner"], job["attempts"]) == ("b", 2)
+    # The first worker lost the lease and can no longer report
+    assert not queue.heartbeat(job_id, "a")
+    assert not queue.ack(job_id, "a", {"ok": True})
+    assert queue.ack(job_id, "b", {"ok": True})
+    assert queue.get(job_id)["status"] == "done"
+    queue.close()
+
+
+def test_expired_lease_without_attempts_left_is_dead(tmp_path, monkeypatch):
+    queue, clock = make_queue(tmp_path, monkeypatch)
+    job_id = queue.enqueue({"n": 1}, max_attempts=1)
+    queue.lease("a", lease_seconds=60)
+    clock.now += 61
+    assert queue.lease("b") == []
+    job = queue.get(job_id)
+    assert (job["status"], job["error"]) == ("dead", "lease expired")
+    queue.close()
@@ -0,0 +1,65 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from marketing_wizard_retry import RetryBudget, RetryController, is_retryable, retry_after_hint
+
+
+class FakeResponse:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class FakeStatusError(Exception):
+    def __init__(self, status_code, headers):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = FakeResponse(headers)
+
+
+def reset_headers(seconds):
+    reset = datetime.now(timezone.utc) + timedelta(seconds=seconds)
+    return {"anthropic-ratelimit-requests-reset": reset.isoformat().replace("+00:00", "Z")}
+
+
+def test_reset_headers_apply_to_429():
+    hint = retry_after_hint(FakeStatusError(429, reset_headers(30)))
+    assert 25 < hint <= 30
+
+
+def test_reset_headers_ignored_for_5xx():
+    assert retry_after_hint(FakeStatusError(529, reset_headers(30))) is None
+    assert retry_after_hint(FakeStatusError(503, {"retry-after": "2"})) == 2.0
+
+
+class APIConnectionError(Exception):
+    pass
+
+
+def test_retryable_classification():
+    assert is_retryable(FakeStatusError(429, {}))
+    assert is_retryable(FakeStatusError(503, {}))
+    assert is_retryable(APIConnectionError("reset"))
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(FakeStatusError(400, {}))
+    assert not is_retryable(FakeStatusError(401, {}))
+    assert not is_retryable(ValueError("bad prompt"))
+    assert not is_retryable(asyncio.CancelledError())
+
+
+def test_budget_stops_retries_once_spent():
+    budget = RetryBudget(capacity=2, ratio=0.5)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    budget.record_success()
+    budget.record_success()
+    assert budget.try_spend()
+
+
+def test_controller_gives_up_on_fatal_errors_and_after_max_attempts():
+    controller = RetryController()
+    assert controller.next_delay("google", FakeStatusError(400, {}), 0) is None
+    assert controller.next_delay("google", FakeStatusError(503, {}), 0) is not None
+    last = controller.policy.max_attempts - 1
+    assert controller.next_delay("google", FakeStatusError(503, {}), last) is None
+    stats = controller.stats["google"]
+    assert (stats["fatal"], stats["retries"], stats["gave_up"]) == (1, 1, 1)
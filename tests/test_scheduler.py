@@ -0,0 +1,63 @@
+import asyncio
+
+from marketing_wizard_scheduler import (
+    PRIORITY_BACKGROUND, PRIORITY_IMAGE_PROMPT, PRIORITY_INTERACTIVE, RequestScheduler
+)
+
+
+def test_waiters_are_served_by_priority_then_in_order():
+    async def run():
+        scheduler = RequestScheduler(1)
+        order = []
+
+        async def call(name, priority):
+            async with scheduler.slot(priority):
+                order.append(name)
+
+        await scheduler.acquire()
+        tasks = [
+            asyncio.create_task(call("background", PRIORITY_BACKGROUND)),
+            asyncio.create_task(call("image", PRIORITY_IMAGE_PROMPT)),
+            asyncio.create_task(call("interactive 1", PRIORITY_INTERACTIVE)),
+            asyncio.create_task(call("interactive 2", PRIORITY_INTERACTIVE)),
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queued"] == 4
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["interactive 1", "interactive 2", "image", "background"]
+
+
+def test_cancelled_waiter_does_not_keep_a_slot():
+    async def run():
+        scheduler = RequestScheduler(1)
+        await scheduler.acquire()
+        waiter = asyncio.create_task(scheduler.acquire(PRIORITY_BACKGROUND))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        scheduler.release()
+        # The slot is free again, not held by the cancelled waiter
+        await asyncio.wait_for(scheduler.acquire(), timeout=1)
+        return scheduler.stats()
+
+    stats = asyncio.run(run())
+    assert stats["inflight"] == 1
+    assert stats["queued"] == 0
+
+
+def test_slot_granted_during_cancellation_is_given_back():
+    async def run():
+        scheduler = RequestScheduler(1)
+        await scheduler.acquire()
+        waiter = asyncio.create_task(scheduler.acquire())
+        await asyncio.sleep(0)
+        # Grant the slot, then cancel before the waiter gets to run
+        scheduler.release()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        return scheduler.stats()
+
+    assert asyncio.run(run())["inflight"] == 0
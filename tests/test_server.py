@@ -0,0 +1,240 @@
+import asyncio
+import re
+
+import marketing_wizard_server
+from marketing_wizard_providers import FakeProviders
+from marketing_wizard_queue import JobQueue
+from marketing_wizard_scheduler import RequestScheduler
+from marketing_wizard_server import HttpError, JobServer, JobService, StreamBuffer
+
+
+class FakeWriter:
+    def __init__(self, fail_after=None):
+        self.chunks = []
+        self.fail_after = fail_after
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    async def drain(self):
+        if self.fail_after is not None and len(self.chunks) > self.fail_after:
+            raise ConnectionResetError("client went away")
+
+    def close(self):
+        self.closed = True
+
+    def text(self):
+        return b"".join(self.chunks).decode("utf-8")
+
+
+def request(method, path, body=b"", headers=None, query=None, writer=None):
+    return {"method": method, "path": path, "query": query or {}, "headers": headers or {},
+            "body": body, "writer": writer}
+
+
+def make_service(**kwargs):
+    providers = FakeProviders(latency=0, chunk_delay=0)
+    return JobService(providers, RequestScheduler(4), **kwargs)
+
+
+async def read_all(buffer, offset=0):
+    return [frame async for frame in buffer.read(offset)]
+
+
+def test_stream_buffer_resumes_from_any_offset():
+    async def run():
+        buffer = StreamBuffer()
+        buffer.append("draft", "hello ")
+        buffer.append("draft", "world")
+        buffer.close("done")
+        return await read_all(buffer), await read_all(buffer, 8)
+
+    whole, resumed = asyncio.run(run())
+    assert [frame.split(b"\n")[1] for frame in whole] == [b"event: delta", b"event: delta", b"event: done"]
+    # Offset 8 is inside the second delta: only its unseen part is resent
+    assert b'"text": "rld"' in resumed[0]
+    assert resumed[0].startswith(b"id: 11\n")
+    assert b"event: done" in resumed[-1]
+
+
+def test_disconnected_subscriber_ends_quietly():
+    async def run():
+        service = make_service()
+        server = JobServer(service)
+        job = await service.submit({"step": "customer", "inputs": {"product": "두유"}})
+        job.stream.append("customer", "a")
+        job.stream.append("customer", "b")
+        writer = FakeWriter(fail_after=1)
+        response = await server.get_stream(request("GET", f"/jobs/{job.id}/stream", writer=writer), job.id)
+        return response, writer
+
+    response, writer = asyncio.run(run())
+    assert response is None
+    assert writer.text().startswith("HTTP/1.1 200 OK")
+
+
+def test_no_error_response_after_stream_headers():
+    async def run():
+        service = make_service()
+        server = JobServer(service)
+
+        async def broken_stream(request, job_id):
+            request["writer"].write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n\r\n")
+            request["responded"] = True
+            raise RuntimeError("boom")
+
+        server.routes = [("GET", re.compile(r"/jobs/(\w+)/stream"), broken_stream)]
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"GET /jobs/abc/stream HTTP/1.1\r\nHost: x\r\n\r\n")
+        reader.feed_eof()
+        writer = FakeWriter()
+        await server.handle(reader, writer)
+        return writer
+
+    writer = asyncio.run(run())
+    assert writer.closed
+    assert "500" not in writer.text()
+
+
+def make_durable_service(tmp_path, monkeypatch):
+    monkeypatch.setattr(marketing_wizard_server, "POLL_SECONDS", 0.02)
+    store = JobQueue(str(tmp_path / "queue.sqlite3"))
+    # Retry failed attempts right away instead of after RETRY_DELAY_SECONDS
+    fail = store.fail
+    store.fail = lambda job_id, owner, error: fail(job_id, owner, error, retry_delay=0)
+    return make_service(store=store), store
+
+
+async def wait_done(job, timeout=5):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not job.done:
+        assert loop.time() < deadline, f"job still {job.status}"
+        await asyncio.sleep(0.01)
+
+
+def test_failed_attempt_is_retried_not_reported_failed(tmp_path, monkeypatch):
+    service, store = make_durable_service(tmp_path, monkeypatch)
+    statuses = set()
+
+    async def run():
+        run_job = service.run_job
+        attempts = []
+
+        async def flaky(job):
+            attempts.append(job.id)
+            if len(attempts) == 1:
+                raise RuntimeError("upstream 503")
+            return await run_job(job)
+
+        service.run_job = flaky
+        service.start()
+        job = await service.submit({"step": "customer", "inputs": {"product": "두유"}})
+        while not job.done:
+            statuses.add(job.status)
+            await asyncio.sleep(0)
+        frames = await read_all(job.stream)
+        await service.stop()
+        return job, frames
+
+    job, frames = asyncio.run(run())
+    assert "failed" not in statuses
+    assert job.status == "done"
+    events = [frame.split(b"\n")[1] for frame in frames]
+    assert events.count(b"event: retry") == 1
+    assert events[-1] == b"event: done"
+    assert store.get(job.id)["attempts"] == 2
+
+
+def test_job_fails_once_attempts_are_used_up(tmp_path, monkeypatch):
+    service, store = make_durable_service(tmp_path, monkeypatch)
+
+    async def run():
+        async def broken(job):
+            raise RuntimeError("bad request")
+
+        service.run_job = broken
+        service.start()
+        job = await service.submit({"step": "customer", "inputs": {"product": "두유"}})
+        await wait_done(job)
+        frames = await read_all(job.stream)
+        await service.stop()
+        return job, frames
+
+    job, frames = asyncio.run(run())
+    assert job.status == "failed"
+    assert store.get(job.id)["status"] == "dead"
+    assert [frame.split(b"\n")[1] for frame in frames].count(b"event: retry") == 2
+    assert b'"status": "failed"' in frames[-1]
+
+
+def test_job_leased_elsewhere_follows_the_store(tmp_path, monkeypatch):
+    service, store = make_durable_service(tmp_path, monkeypatch)
+    job_id = store.enqueue({"kind": "step", "step": "customer", "inputs": {"product": "두유"}, "outputs": {},
+                            "provider": "google", "use_cache": False, "item_id": "x"}, "service")
+    [row] = store.lease("other-process", "service")
+
+    async def run():
+        job = await service.get(job_id)
+        assert job.status == "running"
+        store.ack(job_id, "other-process", {"text": "done elsewhere"})
+        await wait_done(job)
+        frames = await read_all(job.stream)
+        await service.stop()
+        return job, frames
+
+    job, frames = asyncio.run(run())
+    assert (job.status, job.result) == ("done", {"text": "done elsewhere"})
+    assert b"event: done" in frames[-1]
+
+
+def test_step_job_runs_to_a_result():
+    async def run():
+        service = make_service()
+        server = JobServer(service)
+        service.start()
+        status, job = await server.dispatch(request("POST", "/jobs", b'{"step": "customer", "inputs": {"product": "soy milk"}}'))
+        assert status == 202
+        pending = await server.dispatch(request("GET", f"/jobs/{job['id']}/result"))
+        await wait_done(service.jobs[job["id"]])
+        done = await server.dispatch(request("GET", f"/jobs/{job['id']}/result"))
+        await service.stop()
+        return pending, done
+
+    pending, (status, body) = asyncio.run(run())
+    assert pending[0] in (200, 202)
+    assert status == 200 and body["status"] == "done"
+    assert body["result"]["step"] == "customer" and body["result"]["text"]
+
+
+def test_invalid_requests_are_rejected():
+    async def run():
+        server = JobServer(make_service())
+        results = []
+        for method, path, body in [
+            ("POST", "/jobs", b'{"step": "nope"}'),
+            ("POST", "/jobs", b'{"step": "customer", "inputs": {}}'),
+            ("POST", "/jobs", b"not json"),
+            ("GET", "/jobs/missing", b""),
+            ("PUT", "/jobs", b""),
+            ("GET", "/nothing", b""),
+        ]:
+            try:
+                await server.dispatch(request(method, path, body))
+                results.append(200)
+            except HttpError as e:
+                results.append(e.status)
+        return results
+
+    assert asyncio.run(run()) == [400, 400, 400, 404, 405, 404]
+
+
+def test_prompt_endpoint_builds_without_calling_a_model():
+    async def run():
+        server = JobServer(make_service())
+        return await server.dispatch(request("POST", "/prompts/customer", b'{"inputs": {"product": "soy milk"}}'))
+
+    status, body = asyncio.run(run())
+    assert status == 200
+    assert "soy milk" in body["prefix"] + body["tail"]
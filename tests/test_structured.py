@@ -0,0 +1,51 @@
+import json
+
+from marketing_wizard_structured import SECTION_KEYS, StreamParser, missing_fields, parse_post
+
+POST = {
+    "titles": ["제목 A", "Title \"B\""],
+    "tldr": "한 줄 요약, with {braces} and [brackets]",
+    "sections": [
+        {"key": key, "heading": f"heading {key}", "body": f"body\nof {key}", "image_prompt": f"prompt {key}"}
+        for key in SECTION_KEYS
+    ],
+    "conclusion": "끝",
+    "hashtags": ["#a", "#b"],
+}
+TEXT = json.dumps(POST, ensure_ascii=False, indent=2)
+
+
+def feed_in_chunks(size):
+    parser = StreamParser()
+    events = []
+    for i in range(0, len(TEXT), size):
+        events.extend(parser.feed(TEXT[i:i + size]))
+    return parser, events
+
+
+def test_events_do_not_depend_on_chunking():
+    whole, expected = feed_in_chunks(len(TEXT))
+    for size in (1, 2, 7, 64):
+        parser, events = feed_in_chunks(size)
+        assert events == expected
+        assert parser.post == POST
+    assert whole.post == POST
+
+
+def test_fields_and_items_arrive_as_they_close():
+    _, events = feed_in_chunks(5)
+    assert [event[:3] for event in events if event[0] == "item" and event[1] == "sections"] == [
+        ("item", "sections", i) for i in range(len(SECTION_KEYS))
+    ]
+    assert ("field", "tldr", POST["tldr"]) in events
+    # Each section is reported before the sections field itself
+    last_item = max(i for i, event in enumerate(events) if event[:2] == ("item", "sections"))
+    field = next(i for i, event in enumerate(events) if event[:2] == ("field", "sections"))
+    assert last_item < field
+
+
+def test_truncated_reply_keeps_completed_fields():
+    post = parse_post("```json\n" + TEXT[:TEXT.index('"conclusion"')])
+    assert post["tldr"] == POST["tldr"]
+    assert "conclusion" not in post
+    assert missing_fields(post) == ["conclusion", "hashtags"]